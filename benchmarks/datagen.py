@@ -0,0 +1,162 @@
+"""
+Genera un dataset sintético y determinista en el backend local
+(src/data/local_backend.py) con la forma de los datos de producción.
+
+Volúmenes a scale=1.0: 50k partícipes, 200k propuestas, 2M eventos de
+liquidación. La escala reduce todo proporcionalmente (mínimos fijos para
+los catálogos pequeños).
+"""
+import datetime as dt
+import json
+import random
+from typing import Any, Dict, List
+
+from src.data.local_backend import LocalBackend
+
+FULL_VOLUMES = {
+    'participes': 50_000,
+    'propuestas': 200_000,
+    'liquidacion_eventos': 2_000_000,
+    'emisores': 5_000,
+    'usuarios': 200,
+    'modulos': 20,
+}
+# Fracción de propuestas desembolsadas que ya tienen liquidación en curso
+_LIQUIDATED_SHARE = 0.5
+_PROPOSALS_PER_LOTE = 25
+_ESTADOS = ('ACTIVO', 'APROBADO', 'DESEMBOLSADA', 'EN PROCESO DE LIQUIDACION', 'LIQUIDADO', 'RECHAZADO')
+_ESTADO_WEIGHTS = (10, 10, 40, 20, 15, 5)
+_NOMBRES = ('ANA', 'LUIS', 'MARIA', 'JOSE', 'CARMEN', 'JORGE', 'ROSA', 'CARLOS', 'ELENA', 'PEDRO')
+_APELLIDOS = ('QUISPE', 'FLORES', 'SANCHEZ', 'RAMIREZ', 'TORRES', 'GARCIA', 'ROJAS', 'VARGAS', 'MENDOZA', 'CASTILLO')
+_RUBROS = ('INVERSIONES', 'DISTRIBUIDORA', 'CONSTRUCTORA', 'AGROINDUSTRIAL', 'COMERCIAL', 'TEXTIL', 'LOGISTICA', 'MINERA')
+_ROLES = ('super_user', 'principal', 'secondary')
+
+
+def volumes_for(scale: float) -> Dict[str, int]:
+    """Row counts for a given scale."""
+    minimums = {'emisores': 50, 'usuarios': 20, 'modulos': 20}
+    return {name: max(minimums.get(name, 1), int(count * scale)) for name, count in FULL_VOLUMES.items()}
+
+def _razon_social(rng: random.Random) -> str:
+    return f"{rng.choice(_RUBROS)} {rng.choice(_APELLIDOS)} {rng.choice(_APELLIDOS)} S.A.C."
+
+def generate(backend: LocalBackend, scale: float, seed: int = 42) -> Dict[str, Any]:
+    """
+    Seeds `backend` and returns the sample keys the flows work on:
+        {'volumes', 'lotes', 'liquidated_ids', 'search_terms', 'user_emails', 'module_names'}
+    """
+    rng = random.Random(seed)
+    volumes = volumes_for(scale)
+    today = dt.date(2026, 10, 1)
+
+    # EMISORES.ACEPTANTES
+    emisores = []
+    for i in range(volumes['emisores']):
+        emisores.append({
+            'RUC': str(20100000000 + i * 7),
+            'Razon Social': _razon_social(rng),
+            'tipo': 'EMISOR' if i % 3 else 'ACEPTANTE',
+            'tasa_avance': 0.9,
+            'interes_mensual': rng.choice((1.5, 1.8, 2.0, 2.5)),
+        })
+    backend.seed('EMISORES.ACEPTANTES', emisores)
+
+    # crm_participes
+    backend.seed('crm_participes', (
+        {
+            'tipo_doc': 'DNI',
+            'documento_identidad': f"{40000000 + i}",
+            'nombre_completo': f"{rng.choice(_NOMBRES)} {rng.choice(_APELLIDOS)} {rng.choice(_APELLIDOS)}",
+            'email': f"participe{i}@correo.pe",
+            'telefono': f"9{rng.randrange(10**8):08d}",
+            'perfil_riesgo': rng.choice(('Conservador', 'Moderado', 'Audaz')),
+            'banco_nombre': rng.choice(('BCP', 'BBVA', 'INTERBANK', 'SCOTIABANK')),
+            'moneda_cuenta': rng.choice(('PEN', 'USD')),
+            'asesor_email': f"asesor{i % 15}@empresa.pe",
+        }
+        for i in range(volumes['participes'])
+    ))
+
+    # propuestas
+    propuestas = []
+    lotes: List[str] = []
+    for i in range(volumes['propuestas']):
+        if i % _PROPOSALS_PER_LOTE == 0:
+            lotes.append(f"LOTE-{today:%Y%m%d}-{len(lotes):05d}")
+        emisor, aceptante = rng.choice(emisores), rng.choice(emisores)
+        fecha = today - dt.timedelta(days=rng.randrange(720))
+        monto = round(rng.uniform(5_000, 250_000), 2)
+        propuestas.append({
+            'proposal_id': f"{emisor['RUC']}-F{i:07d}-{fecha:%Y%m%d}",
+            'identificador_lote': lotes[-1],
+            'estado': rng.choices(_ESTADOS, _ESTADO_WEIGHTS)[0],
+            'emisor_nombre': emisor['Razon Social'],
+            'emisor_ruc': emisor['RUC'],
+            'aceptante_nombre': aceptante['Razon Social'],
+            'aceptante_ruc': aceptante['RUC'],
+            'numero_factura': f"F{i:07d}",
+            'monto_total_factura': monto,
+            'monto_neto_factura': round(monto * 0.82, 2),
+            'moneda_factura': rng.choice(('PEN', 'USD')),
+            'fecha_propuesta': fecha.isoformat(),
+            'fecha_desembolso_factoring': (fecha + dt.timedelta(days=3)).isoformat(),
+            'interes_mensual': emisor['interes_mensual'],
+            'capital_calculado': round(monto * 0.75, 2),
+        })
+    backend.seed('propuestas', propuestas)
+
+    # liquidaciones_resumen + liquidacion_eventos (acumulados consistentes con el historial)
+    desembolsadas = [p for p in propuestas if p['estado'] in ('DESEMBOLSADA', 'EN PROCESO DE LIQUIDACION', 'LIQUIDADO')]
+    liquidadas = desembolsadas[:max(1, int(len(desembolsadas) * _LIQUIDATED_SHARE))]
+    eventos_por_resumen = max(1, volumes['liquidacion_eventos'] // len(liquidadas))
+    resumenes, eventos = [], []
+    for n, propuesta in enumerate(liquidadas):
+        resumen_id = f"00000000-0000-4000-8000-{n:012d}"
+        desembolso = dt.date.fromisoformat(propuesta['fecha_desembolso_factoring'])
+        saldo_favor, fechas = 0.0, []
+        for orden in range(1, eventos_por_resumen + 1):
+            fecha_evento = desembolso + dt.timedelta(days=rng.randrange(5, 120))
+            generado = round(rng.uniform(0, 50), 2) if rng.random() < 0.2 else 0.0
+            saldo_favor += generado
+            fechas.append(fecha_evento.isoformat())
+            eventos.append({
+                'liquidacion_resumen_id': resumen_id,
+                'orden_evento': orden,
+                'tipo_evento': 'PAGO',
+                'fecha_evento': fecha_evento.isoformat(),
+                'monto_recibido': round(propuesta['capital_calculado'] / eventos_por_resumen, 2),
+                'dias_diferencia': rng.randrange(-10, 30),
+                'resultado_json': json.dumps({'saldo_favor_generado': generado, 'saldo_favor_aplicado': 0.0}),
+            })
+        primer = min(fechas)
+        resumenes.append({
+            'id': resumen_id,
+            'proposal_id': propuesta['proposal_id'],
+            'saldo_actual': propuesta['capital_calculado'],
+            'capital_original': propuesta['capital_calculado'],
+            'saldo_favor_acumulado': round(saldo_favor, 2),
+            'fecha_primer_evento': primer,
+        })
+    backend.seed('liquidaciones_resumen', resumenes)
+    backend.seed('liquidacion_eventos', eventos)
+
+    # Permisos
+    users = [{'id': i + 1, 'email': f"usuario{i}@empresa.pe"} for i in range(volumes['usuarios'])]
+    modules = [{'id': i + 1, 'name': f"modulo_{i}", 'description': f"Módulo {i}"} for i in range(volumes['modulos'])]
+    backend.seed('authorized_users', users)
+    backend.seed('modules', modules)
+    backend.seed('user_module_access', (
+        {'user_id': user['id'], 'module_id': module['id'], 'hierarchy_level': rng.choice(_ROLES)}
+        for module in modules[::2]  # La mitad de los módulos es de acceso abierto
+        for user in rng.sample(users, 5)
+    ))
+
+    sample = rng.sample(liquidadas, min(200, len(liquidadas)))
+    return {
+        'volumes': {**volumes, 'liquidacion_eventos': len(eventos), 'liquidaciones_resumen': len(resumenes)},
+        'lotes': rng.sample(lotes, min(5, len(lotes))),
+        'liquidated_ids': [p['proposal_id'] for p in sample],
+        'search_terms': ['constructora', 'quispe flores', 'distribuidora rojas', emisores[len(emisores) // 2]['RUC'][:8], 'agroindustrail'],
+        'user_emails': [user['email'] for user in users[:50]],
+        'module_names': [module['name'] for module in modules],
+    }
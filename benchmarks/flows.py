@@ -0,0 +1,72 @@
+"""
+Flujos medidos por run_benchmarks.py. Cada flujo recibe el dataset de
+datagen.generate() y ejecuta las funciones reales del repositorio contra
+el backend local. `reset_caches()` corre antes de cada medición para que
+todas empiecen en frío, como la primera carga de una página.
+"""
+import datetime as dt
+import os
+from typing import Any, Callable, Dict
+
+from src.data import supabase_repository as repo
+from src.data.export import export_table
+
+
+def reset_caches() -> None:
+    """Drops every in-process cache of the repository."""
+    repo.invalidate_permission_cache()
+    repo.EMISOR_CACHE.invalidate()
+    repo._emisor_search = None
+
+
+def lote_listing(data: Dict[str, Any]) -> None:
+    """Bandeja de desembolso: propuestas aprobadas agrupadas por lote + detalle de lotes."""
+    por_lote: Dict[str, int] = {}
+    for proposal in repo.get_approved_proposals_for_disbursement(projection='list'):
+        por_lote[proposal['identificador_lote']] = por_lote.get(proposal['identificador_lote'], 0) + 1
+    for lote in data['lotes']:
+        repo.get_proposals_by_lote(lote)
+        repo.search_proposals_advanced(lote_filter=lote, fecha_inicio=dt.date(2024, 1, 1), fecha_fin=dt.date(2026, 12, 31), projection='list')
+
+def ledger_load(data: Dict[str, Any]) -> None:
+    """Carga de resúmenes + eventos de liquidación de 200 propuestas."""
+    ledgers = repo.get_liquidation_ledgers(data['liquidated_ids'])
+    assert all(ledger['resumen'] for ledger in ledgers.values())
+
+def saldo_favor(data: Dict[str, Any]) -> None:
+    """Saldo a favor e Int.Min por propuesta, como en el cálculo de cronogramas."""
+    ids = data['liquidated_ids']
+    with repo.liquidation_ledger_scope(ids):
+        for proposal_id in ids:
+            repo.get_saldo_favor_acumulado(proposal_id)
+            repo.check_if_int_min_already_charged(proposal_id, dt.date(2025, 1, 1))
+
+def permission_checks(data: Dict[str, Any]) -> None:
+    """Chequeo de acceso y rol de cada usuario en cada módulo."""
+    for email in data['user_emails']:
+        for module in data['module_names']:
+            repo.check_user_access(module, email)
+            repo.get_user_role(module, email)
+
+def emisor_search(data: Dict[str, Any]) -> None:
+    """Búsqueda de emisores (incluye la construcción del índice en frío)."""
+    for term in data['search_terms']:
+        for page in range(3):
+            repo.search_emisores_ranked(term, page=page)
+
+def participe_export(data: Dict[str, Any]) -> None:
+    """Exportación completa de crm_participes a CSV, con progreso como en Gestión de Partícipes."""
+    progreso = []
+    path = export_table('crm_participes', 'csv', key='id', on_progress=lambda escritos, total: progreso.append((escritos, total)))
+    assert progreso and progreso[-1][0] == progreso[-1][1]
+    os.remove(path)
+
+
+FLOWS: Dict[str, Callable[[Dict[str, Any]], None]] = {
+    'lote_listing': lote_listing,
+    'ledger_load': ledger_load,
+    'saldo_favor': saldo_favor,
+    'permission_checks': permission_checks,
+    'emisor_search': emisor_search,
+    'participe_export': participe_export,
+}
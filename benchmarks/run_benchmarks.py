@@ -0,0 +1,185 @@
+"""
+Benchmarks de los flujos críticos del repositorio contra el backend local
+en memoria (src/data/local_backend.py), con datos sintéticos (datagen.py).
+
+Por flujo mide round trips a Supabase, tiempo de pared (mediana de
+--repeat corridas) y pico de memoria (tracemalloc), y los compara con
+benchmarks/baseline.json. Sale con código 1 si algún flujo empeora más
+que el umbral.
+
+Por defecto solo se controlan round trips y memoria: el tiempo de pared
+absoluto depende de la máquina. Con --gate-wall también se controla el
+tiempo, normalizado contra un bucle de calibración que se corre en el
+mismo proceso intercalado con cada flujo (wall_units = tiempo del flujo /
+tiempo del bucle), así una máquina más lenta o cargada no cuenta como
+regresión.
+
+Uso:
+    python benchmarks/run_benchmarks.py                        # Compara con la línea base
+    python benchmarks/run_benchmarks.py --update-baseline      # Reescribe la línea base
+    python benchmarks/run_benchmarks.py --gate-wall            # Controla también el tiempo normalizado
+    python benchmarks/run_benchmarks.py --scale 1 --latency-ms 20 --flows ledger_load saldo_favor
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Optional
+
+# Asegurar que podemos importar desde src y benchmarks
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from src.data.local_backend import LocalBackend, LocalSupabaseClient
+from src.data.supabase_client import set_supabase_client
+from src.utils.query_stats import QueryStats, bind_query_stats, _bound_stats
+from benchmarks import datagen
+from benchmarks.flows import FLOWS, reset_caches
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Holgura absoluta para que flujos muy cortos no fallen por ruido
+_MIN_WALL_SLACK_UNITS = 0.5
+_MIN_MEMORY_SLACK_KB = 256.0
+_CALIBRATION_ROWS = 20000
+
+
+def _calibration_loop() -> float:
+    """Fixed pure-Python workload (build, filter, sort and sum dict rows, like the flows); returns ms."""
+    gc.collect()
+    started = time.perf_counter()
+    rows = [{'id': i, 'monto': i * 1.5, 'estado': 'ACTIVO' if i % 3 else 'ANULADO'} for i in range(_CALIBRATION_ROWS)]
+    activos = sorted((row for row in rows if row['estado'] == 'ACTIVO'), key=lambda row: -row['monto'])
+    sum(row['monto'] for row in activos)
+    return (time.perf_counter() - started) * 1000
+
+
+def _run_once(flow, data, verbose: bool, trace_memory: bool):
+    reset_caches()
+    gc.collect()  # Start every run from the same heap state (the dataset is large)
+    stats = QueryStats()
+    token = bind_query_stats(stats)
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        with output:
+            if trace_memory:
+                tracemalloc.start()
+            started = time.perf_counter()
+            flow(data)
+            wall_ms = (time.perf_counter() - started) * 1000
+            peak_kb = tracemalloc.get_traced_memory()[1] / 1024 if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        _bound_stats.reset(token)
+    return stats, wall_ms, peak_kb
+
+def measure(name: str, data, repeat: int, verbose: bool):
+    """Round trips, median wall time (absolute and normalized) and peak memory of one flow."""
+    flow = FLOWS[name]
+    runs, calibration = [], []
+    for _ in range(repeat):
+        # Interleaved, so both medians see the same machine load
+        calibration.append(_calibration_loop())
+        runs.append(_run_once(flow, data, verbose, trace_memory=False))
+    stats = runs[0][0]
+    _, _, peak_kb = _run_once(flow, data, verbose, trace_memory=True)  # tracemalloc distorts timings
+    wall_ms = statistics.median(run[1] for run in runs)
+    return {
+        'round_trips': stats.round_trips,
+        'wall_ms': round(wall_ms, 2),
+        'wall_units': round(wall_ms / statistics.median(calibration), 3),
+        'peak_kb': round(peak_kb, 1),
+        'findings': stats.findings(),
+    }
+
+def compare(name: str, result, baseline, threshold: Optional[float], memory_threshold: float):
+    """Regression messages of one flow (empty when within budget); `threshold` None skips the time gate."""
+    if baseline is None:
+        return []
+    problems = []
+    if result['round_trips'] > baseline['round_trips']:
+        problems.append(f"round trips {baseline['round_trips']} -> {result['round_trips']}")
+    if threshold is not None:
+        wall_limit = max(baseline['wall_units'] * (1 + threshold), baseline['wall_units'] + _MIN_WALL_SLACK_UNITS)
+        if result['wall_units'] > wall_limit:
+            problems.append(f"tiempo normalizado {baseline['wall_units']:.2f} -> {result['wall_units']:.2f} (límite {wall_limit:.2f})")
+    memory_limit = max(baseline['peak_kb'] * (1 + memory_threshold), baseline['peak_kb'] + _MIN_MEMORY_SLACK_KB)
+    if result['peak_kb'] > memory_limit:
+        problems.append(f"memoria {baseline['peak_kb']:.0f} -> {result['peak_kb']:.0f} KB (límite {memory_limit:.0f})")
+    return [f"{name}: {problem}" for problem in problems]
+
+def _quiet_streamlit() -> None:
+    # measure_latency usa st.session_state; fuera de `streamlit run` solo genera advertencias
+    try:
+        from streamlit.logger import set_log_level
+        set_log_level('error')
+    except Exception:
+        pass
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=0.02, help='Fracción de los volúmenes completos (1.0 = 200k propuestas, 2M eventos)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Latencia simulada por round trip')
+    parser.add_argument('--repeat', type=int, default=15, help='Corridas cronometradas por flujo (se usa la mediana; más corridas estabilizan la mediana)')
+    parser.add_argument('--gate-wall', action='store_true', help='Controla también el tiempo normalizado contra el bucle de calibración')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Empeoramiento relativo tolerado en tiempo normalizado (con --gate-wall)')
+    parser.add_argument('--memory-threshold', type=float, default=0.25, help='Empeoramiento relativo tolerado en memoria')
+    parser.add_argument('--flows', nargs='*', choices=sorted(FLOWS), help='Subconjunto de flujos')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--verbose', action='store_true', help='Muestra la salida de los flujos')
+    args = parser.parse_args(argv)
+    _quiet_streamlit()
+
+    config = {'scale': args.scale, 'latency_ms': args.latency_ms}
+    print(f"Generando datos (scale={args.scale})...")
+    started = time.perf_counter()
+    backend = LocalBackend(latency_ms=args.latency_ms)
+    data = datagen.generate(backend, args.scale)
+    set_supabase_client(LocalSupabaseClient(backend))
+    print(f"  {data['volumes']} en {time.perf_counter() - started:.1f}s\n")
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+        if baseline.get('config') != config:
+            print(f"[ERROR] La línea base se generó con {baseline.get('config')}; esta corrida usa {config}.")
+            return 2
+
+    results, regressions = {}, []
+    print(f"{'flujo':<20}{'round trips':>12}{'tiempo ms':>12}{'normalizado':>12}{'pico KB':>12}")
+    for name in args.flows or list(FLOWS):
+        result = results[name] = measure(name, data, max(1, args.repeat), args.verbose)
+        print(f"{name:<20}{result['round_trips']:>12}{result['wall_ms']:>12.1f}{result['wall_units']:>12.2f}{result['peak_kb']:>12.0f}")
+        for finding in result['findings']:
+            print(f"    [QUERY STATS] {finding}")
+        threshold = args.threshold if args.gate_wall else None
+        regressions += compare(name, result, (baseline or {}).get('flows', {}).get(name), threshold, args.memory_threshold)
+
+    if args.update_baseline:
+        flows = {name: {k: v for k, v in result.items() if k != 'findings'} for name, result in results.items()}
+        with open(args.baseline, 'w', encoding='utf-8') as handle:
+            json.dump({'config': config, 'flows': flows}, handle, indent=2, sort_keys=True)
+            handle.write('\n')
+        print(f"\n[OK] Línea base actualizada: {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"\n--- {len(regressions)} REGRESIONES ---")
+        for regression in regressions:
+            print(regression)
+        return 1
+    print("\n[OK] Ningún flujo superó el umbral." if baseline else "\n[ALERTA] Sin línea base: usar --update-baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
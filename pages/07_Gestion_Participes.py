@@ -2,8 +2,7 @@ import streamlit as st
 import sys
 import os
 import datetime as dt
-import pandas as pd
-import io
+import math
 
 # Path setup
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -11,10 +10,14 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from src.data.supabase_client import get_supabase_client
+from src.data.participes_search import participes_search_engine
+from src.data.export import export_table, EXPORT_FORMATS
 from src.ui.header import render_header
 
 # Constants
 TABLE_NAME = "crm_participes"
+MIN_QUERY_LENGTH = 2
+RESULTS_PAGE_SIZE = 25
 
 # Page config
 st.set_page_config(
@@ -29,6 +32,8 @@ if 'vista_participes' not in st.session_state:
     st.session_state.vista_participes = 'busqueda'
 if 'participe_seleccionado' not in st.session_state:
     st.session_state.participe_seleccionado = None
+if 'participes_search_page' not in st.session_state:
+    st.session_state.participes_search_page = 0
 
 # CSS
 st.markdown('''<style>
@@ -40,20 +45,27 @@ st.markdown('''<style>
 render_header("Gestión de Partícipes")
 
 # --- Database Functions ---
-def buscar_participes_db(query=""):
-    """Busca en crm_participes por nombre o documento"""
-    supabase = get_supabase_client()
+def buscar_participes_db(query="", page=0):
+    """Busca en el índice en memoria de crm_participes por nombre (prefijo/aproximado) o documento.
+    Devuelve (resultados de la página, total de coincidencias)"""
     try:
-        if query and len(query.strip()) > 0:
-            response = supabase.table(TABLE_NAME).select('*').or_(
-                f"nombre_completo.ilike.%{query}%,documento_identidad.ilike.%{query}%"
-            ).order('nombre_completo', desc=False).execute()
-            return response.data if response.data else []
+        if query and len(query.strip()) >= MIN_QUERY_LENGTH:
+            return participes_search_engine.search(query.strip(), page=page, page_size=RESULTS_PAGE_SIZE)
         else:
-            return []
+            return [], 0
     except Exception as e:
         st.error(f"Error buscando en {TABLE_NAME}: {e}")
-        return []
+        return [], 0
+
+def obtener_participe_db(participe_id):
+    """Lee el registro completo de un partícipe (al abrirlo para editar)"""
+    supabase = get_supabase_client()
+    try:
+        response = supabase.table(TABLE_NAME).select('*').eq('id', participe_id).limit(1).execute()
+        return response.data[0] if response.data else None
+    except Exception as e:
+        st.error(f"Error leyendo partícipe: {e}")
+        return None
 
 def guardar_registro_db(data, update_id=None):
     supabase = get_supabase_client()
@@ -62,6 +74,7 @@ def guardar_registro_db(data, update_id=None):
         
         if update_id:
             response = supabase.table(TABLE_NAME).update(clean_data).eq('id', update_id).execute()
+            participes_search_engine.upsert({**clean_data, 'id': update_id})
             return True, "Registro actualizado correctamente."
         else:
             existing = supabase.table(TABLE_NAME).select('id').eq('documento_identidad', clean_data['documento_identidad']).execute()
@@ -69,23 +82,28 @@ def guardar_registro_db(data, update_id=None):
                 return False, f"Ya existe un partícipe con el documento {clean_data['documento_identidad']}."
             
             response = supabase.table(TABLE_NAME).insert(clean_data).execute()
+            if response.data:
+                participes_search_engine.upsert(response.data[0])
             return True, "Registro creado correctamente."
     except Exception as e:
         return False, f"Error en BD: {e}"
 
-def exportar_excel_db():
-    supabase = get_supabase_client()
+def exportar_participes_db(formato='xlsx'):
+    """Exporta crm_participes paginando por id y escribiendo fila a fila (memoria acotada).
+    Devuelve la ruta del archivo temporal generado (quien llama lo elimina)."""
+    barra = st.progress(0.0, text="Exportando partícipes...")
+
+    def on_progress(escritos, total):
+        fraccion = min(escritos / total, 1.0) if total else 0.0
+        barra.progress(fraccion, text=f"Exportando partícipes... {escritos}/{total or '?'}")
+
     try:
-        response = supabase.table(TABLE_NAME).select('*').execute()
-        if not response.data: return None
-        df = pd.DataFrame(response.data)
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Participes')
-        return buffer.getvalue()
+        return export_table(TABLE_NAME, formato, key='id', sheet_name='Participes', on_progress=on_progress)
     except Exception as e:
-        st.error(f"Error generando Excel: {e}")
+        st.error(f"Error generando exportación: {e}")
         return None
+    finally:
+        barra.empty()
 
 # --- VIEWS ---
 
@@ -97,6 +115,8 @@ def mostrar_busqueda():
     
     with col1:
         # IMPORTANTE: Deshabilitar autocomplete del navegador
+        # Sin debounce: st.text_input solo dispara un rerun al presionar Enter o
+        # salir del campo (no por tecla), y la búsqueda es en memoria
         search_query = st.text_input(
             "🔍 Buscar por Nombre o DNI",
             placeholder="Escribe para buscar...",
@@ -113,33 +133,43 @@ def mostrar_busqueda():
             st.rerun()
     
     with col3:
-        st.write("")
-        st.write("")
-        # Only generate Excel when button is clicked, not on page load
-        if st.button("📥 Exportar Todo (Excel)", use_container_width=True):
-            excel_data = exportar_excel_db()
-            if excel_data:
-                st.download_button(
-                    label="⬇️ Descargar Excel",
-                    data=excel_data,
-                    file_name=f"participes_{dt.date.today()}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    use_container_width=True,
-                    key="download_excel"
-                )
+        formato = st.selectbox("Formato", list(EXPORT_FORMATS), key="participes_export_format")
+        # Only generate the export when button is clicked, not on page load
+        if st.button("📥 Exportar Todo", use_container_width=True):
+            ruta = exportar_participes_db(formato)
+            if ruta:
+                # El archivo abierto se pasa tal cual: no se lee entero a memoria aquí
+                try:
+                    with open(ruta, 'rb') as archivo:
+                        st.download_button(
+                            label=f"⬇️ Descargar {formato.upper()}",
+                            data=archivo,
+                            file_name=f"participes_{dt.date.today()}.{EXPORT_FORMATS[formato]['extension']}",
+                            mime=EXPORT_FORMATS[formato]['mime'],
+                            use_container_width=True,
+                            key="download_export"
+                        )
+                finally:
+                    os.remove(ruta)
     
     # Search results
     if search_query:
-        resultados = buscar_participes_db(search_query)
+        # Nueva búsqueda -> volver a la primera página
+        if st.session_state.get('participes_search_last') != search_query:
+            st.session_state.participes_search_last = search_query
+            st.session_state.participes_search_page = 0
+        page = st.session_state.participes_search_page
+        resultados, total = buscar_participes_db(search_query, page)
         
         if resultados:
             # Auto-redirect si solo hay 1 resultado
-            if len(resultados) == 1:
-                st.session_state.participe_seleccionado = resultados[0]
+            if total == 1:
+                st.session_state.participe_seleccionado = obtener_participe_db(resultados[0]['id']) or resultados[0]
                 st.session_state.vista_participes = 'editar'
                 st.rerun()
             
-            st.caption(f"✅ Se encontraron {len(resultados)} partícipes")
+            inicio = page * RESULTS_PAGE_SIZE
+            st.caption(f"✅ Se encontraron {total} partícipes (mostrando {inicio + 1}-{inicio + len(resultados)})")
             
             # Headers
             c1, c2, c3, c4 = st.columns([1, 4, 3, 1])
@@ -149,17 +179,31 @@ def mostrar_busqueda():
             c4.markdown("**Acción**")
             st.divider()
             
-            # Results
+            # Results (solo la página actual)
             for idx, row in enumerate(resultados):
                 c1, c2, c3, c4 = st.columns([1, 4, 3, 1])
                 c1.write(f"`{row.get('documento_identidad', '')}`")
                 c2.write(row.get('nombre_completo', ''))
                 c3.write(row.get('email', ''))
                 if c4.button("✏️", key=f"edit_{row['id']}", use_container_width=True):
-                    st.session_state.participe_seleccionado = row
+                    st.session_state.participe_seleccionado = obtener_participe_db(row['id']) or row
                     st.session_state.vista_participes = 'editar'
                     st.rerun()
                 st.divider()
+            
+            # Paginación
+            total_paginas = math.ceil(total / RESULTS_PAGE_SIZE)
+            if total_paginas > 1:
+                p1, p2, p3 = st.columns([1, 2, 1])
+                if p1.button("⬅️ Anterior", disabled=page == 0, use_container_width=True):
+                    st.session_state.participes_search_page = page - 1
+                    st.rerun()
+                p2.markdown(f"<div style='text-align: center'>Página {page + 1} de {total_paginas}</div>", unsafe_allow_html=True)
+                if p3.button("Siguiente ➡️", disabled=page + 1 >= total_paginas, use_container_width=True):
+                    st.session_state.participes_search_page = page + 1
+                    st.rerun()
+        elif len(search_query.strip()) < MIN_QUERY_LENGTH:
+            st.info(f"👆 Ingresa al menos {MIN_QUERY_LENGTH} caracteres para buscar")
         else:
             st.warning(f"❌ No se encontraron partícipes con: '{search_query}'")
     else:
@@ -339,6 +383,7 @@ def vista_migracion():
                 from src.utils.migration_participes import migrate_participes_from_gsheet
                 success, msg, count = migrate_participes_from_gsheet()
                 if success:
+                    participes_search_engine.invalidate()
                     st.write(f"✅ {msg}")
                     st.write(f"Partícipes Actualizados: {count}")
                     status.update(label="Completado", state="complete", expanded=False)
@@ -0,0 +1,44 @@
+"""
+Verifica / reconstruye los acumulados de liquidaciones_resumen
+(saldo_favor_acumulado, fecha_primer_evento) desde el
+historial de liquidacion_eventos.
+
+Uso:
+    python rebuild_liquidacion_acumulados.py                 # Corrige todas las diferencias
+    python rebuild_liquidacion_acumulados.py --dry-run       # Solo reporta
+    python rebuild_liquidacion_acumulados.py ID1 ID2 ...     # Solo esas propuestas
+"""
+import sys
+import os
+
+# Asegurar que podemos importar desde src
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from src.data.supabase_repository import rebuild_liquidacion_acumulados
+
+
+def main(argv):
+    dry_run = '--dry-run' in argv
+    proposal_ids = [arg for arg in argv if not arg.startswith('--')] or None
+
+    alcance = f"{len(proposal_ids)} propuestas" if proposal_ids else "todas las propuestas"
+    print(f"Verificando acumulados de liquidación ({alcance}){' [DRY RUN]' if dry_run else ''}...")
+
+    diferencias = rebuild_liquidacion_acumulados(proposal_ids, aplicar=not dry_run)
+
+    if not diferencias:
+        print("[OK] Los acumulados almacenados coinciden con el historial de eventos.")
+        return 0
+
+    print(f"\n--- {len(diferencias)} RESÚMENES CON DIFERENCIAS ---")
+    for d in diferencias:
+        print(
+            f"{d['proposal_id']}: saldo {d['saldo_favor_almacenado']} -> {d['saldo_favor_recalculado']} | "
+            f"primer evento {d['fecha_primer_evento_almacenada']} -> {d['fecha_primer_evento_recalculada']}"
+        )
+    print("\n[ALERTA] Diferencias solo reportadas (dry run)." if dry_run else "\n[OK] Diferencias corregidas.")
+    return 1 if dry_run else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,29 @@
+-- FECHA DE PROPUESTA INDEXADA EN PROPUESTAS
+-- Objetivo: Filtrar por rango de fechas en la BD (search_proposals_advanced)
+--           en lugar de parsear el sufijo YYYYMMDD del proposal_id en Python.
+-- Fecha: 2026-10-18
+
+ALTER TABLE propuestas ADD COLUMN IF NOT EXISTS fecha_propuesta DATE;
+
+-- Parseo tolerante del sufijo YYYYMMDD (NULL si no es una fecha válida)
+CREATE OR REPLACE FUNCTION crm_try_parse_yyyymmdd(p_value TEXT)
+RETURNS DATE
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+    IF p_value IS NULL OR p_value !~ '^\d{8}$' THEN
+        RETURN NULL;
+    END IF;
+    RETURN to_date(p_value, 'YYYYMMDD');
+EXCEPTION WHEN OTHERS THEN
+    RETURN NULL;
+END;
+$$;
+
+-- Backfill desde proposal_id con formato emisor-factura-YYYYMMDD
+UPDATE propuestas
+SET fecha_propuesta = crm_try_parse_yyyymmdd(substring(proposal_id FROM '^.*-.*-(\d{8})$'))
+WHERE fecha_propuesta IS NULL;
+
+-- Índices para rango de fechas + paginación keyset (proposal_id DESC)
+CREATE INDEX IF NOT EXISTS idx_propuestas_fecha_propuesta ON propuestas(fecha_propuesta, proposal_id DESC);
+CREATE INDEX IF NOT EXISTS idx_propuestas_emisor_ruc ON propuestas(emisor_ruc, proposal_id DESC);
@@ -0,0 +1,83 @@
+-- APPEND ATÓMICO DE EVENTOS DE LIQUIDACIÓN Y DESEMBOLSO
+-- Objetivo: Asignar orden_evento en el servidor (sin leer MAX desde la app),
+--           evitando carreras entre usuarios y permitiendo lotes de eventos
+--           de muchos resúmenes en una sola llamada RPC.
+-- Fecha: 2026-10-18
+
+-- Un orden_evento por resumen (detecta duplicados si algo escapa al lock)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_liquidacion_eventos_orden ON liquidacion_eventos(liquidacion_resumen_id, orden_evento);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_desembolso_eventos_orden ON desembolso_eventos(desembolso_resumen_id, orden_evento);
+
+-- p_eventos: JSON array de objetos con las columnas de liquidacion_eventos
+-- (sin id ni orden_evento). Devuelve las filas insertadas.
+CREATE OR REPLACE FUNCTION append_liquidacion_eventos(p_eventos JSONB)
+RETURNS SETOF liquidacion_eventos
+LANGUAGE sql AS $$
+    -- Serializa appends concurrentes sobre los mismos resúmenes (orden fijo evita deadlocks)
+    SELECT 1
+    FROM liquidaciones_resumen lr
+    WHERE lr.id IN (
+        SELECT (jsonb_populate_record(NULL::liquidacion_eventos, e)).liquidacion_resumen_id
+        FROM jsonb_array_elements(p_eventos) e
+    )
+    ORDER BY lr.id
+    FOR UPDATE;
+
+    WITH nuevos AS (
+        SELECT r.*, t.ord
+        FROM jsonb_array_elements(p_eventos) WITH ORDINALITY AS t(e, ord),
+             LATERAL jsonb_populate_record(NULL::liquidacion_eventos, t.e) AS r
+    ), ultimos AS (
+        SELECT le.liquidacion_resumen_id, MAX(le.orden_evento) AS max_orden
+        FROM liquidacion_eventos le
+        WHERE le.liquidacion_resumen_id IN (SELECT liquidacion_resumen_id FROM nuevos)
+        GROUP BY le.liquidacion_resumen_id
+    )
+    INSERT INTO liquidacion_eventos (
+        liquidacion_resumen_id, orden_evento, tipo_evento, fecha_evento,
+        monto_recibido, dias_diferencia, resultado_json
+    )
+    SELECT
+        n.liquidacion_resumen_id,
+        COALESCE(u.max_orden, 0) + ROW_NUMBER() OVER (PARTITION BY n.liquidacion_resumen_id ORDER BY n.ord),
+        n.tipo_evento, n.fecha_evento, n.monto_recibido, n.dias_diferencia, n.resultado_json
+    FROM nuevos n
+    LEFT JOIN ultimos u ON u.liquidacion_resumen_id = n.liquidacion_resumen_id
+    ORDER BY n.ord
+    RETURNING *;
+$$;
+
+CREATE OR REPLACE FUNCTION append_desembolso_eventos(p_eventos JSONB)
+RETURNS SETOF desembolso_eventos
+LANGUAGE sql AS $$
+    SELECT 1
+    FROM desembolsos_resumen dr
+    WHERE dr.id IN (
+        SELECT (jsonb_populate_record(NULL::desembolso_eventos, e)).desembolso_resumen_id
+        FROM jsonb_array_elements(p_eventos) e
+    )
+    ORDER BY dr.id
+    FOR UPDATE;
+
+    WITH nuevos AS (
+        SELECT r.*, t.ord
+        FROM jsonb_array_elements(p_eventos) WITH ORDINALITY AS t(e, ord),
+             LATERAL jsonb_populate_record(NULL::desembolso_eventos, t.e) AS r
+    ), ultimos AS (
+        SELECT de.desembolso_resumen_id, MAX(de.orden_evento) AS max_orden
+        FROM desembolso_eventos de
+        WHERE de.desembolso_resumen_id IN (SELECT desembolso_resumen_id FROM nuevos)
+        GROUP BY de.desembolso_resumen_id
+    )
+    INSERT INTO desembolso_eventos (
+        desembolso_resumen_id, orden_evento, tipo_evento, fecha_evento, monto_desembolsado
+    )
+    SELECT
+        n.desembolso_resumen_id,
+        COALESCE(u.max_orden, 0) + ROW_NUMBER() OVER (PARTITION BY n.desembolso_resumen_id ORDER BY n.ord),
+        n.tipo_evento, n.fecha_evento, n.monto_desembolsado
+    FROM nuevos n
+    LEFT JOIN ultimos u ON u.desembolso_resumen_id = n.desembolso_resumen_id
+    ORDER BY n.ord
+    RETURNING *;
+$$;
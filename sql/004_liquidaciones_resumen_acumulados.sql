@@ -0,0 +1,166 @@
+-- ACUMULADOS DE SALDO A FAVOR E INT.MIN EN LIQUIDACIONES_RESUMEN
+-- Objetivo: Lecturas O(1) para get_saldo_favor_acumulado y
+--           check_if_int_min_already_charged. Los acumulados se mantienen en
+--           append_liquidacion_eventos y se pueden reconstruir desde el historial.
+--           El Int.Min no se almacena: depende de la fecha de desembolso (que puede
+--           cambiar o ser la de una refinanciación), así que se deriva de
+--           fecha_primer_evento al consultar.
+-- Fecha: 2026-10-18
+-- Requiere: 003_append_eventos_rpc.sql
+
+ALTER TABLE liquidaciones_resumen ADD COLUMN IF NOT EXISTS saldo_favor_acumulado NUMERIC NOT NULL DEFAULT 0; -- SUM(generado - aplicado), sin truncar en 0
+ALTER TABLE liquidaciones_resumen ADD COLUMN IF NOT EXISTS fecha_primer_evento DATE; -- Fecha del pago más temprano
+-- Una versión anterior almacenaba int_min_cobrado; quedaba desactualizado al cambiar el desembolso
+ALTER TABLE liquidaciones_resumen DROP COLUMN IF EXISTS int_min_cobrado;
+
+-- Conversiones tolerantes: un valor ilegible cuenta como NULL (como hacía el
+-- cálculo en Python) en lugar de abortar la transacción del append completo.
+CREATE OR REPLACE FUNCTION crm_try_numeric(p_value TEXT)
+RETURNS NUMERIC
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE
+        WHEN p_value ~ '^\s*[-+]?(\d+(\.\d*)?|\.\d+)([eE][-+]?\d+)?\s*$' THEN trim(p_value)::numeric
+    END;
+$$;
+
+-- Fechas ISO (YYYY-MM-DD, con o sin hora); NULL si no es una fecha válida
+CREATE OR REPLACE FUNCTION crm_try_date(p_value TEXT)
+RETURNS DATE
+LANGUAGE plpgsql STABLE AS $$
+BEGIN
+    IF p_value IS NULL OR p_value !~ '^\d{4}-\d{2}-\d{2}' THEN
+        RETURN NULL;
+    END IF;
+    RETURN left(p_value, 10)::date;
+EXCEPTION WHEN OTHERS THEN
+    RETURN NULL;  -- p.ej. 2025-02-30
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION crm_try_jsonb(p_value TEXT)
+RETURNS JSONB
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+    RETURN p_value::jsonb;
+EXCEPTION WHEN OTHERS THEN
+    RETURN NULL;
+END;
+$$;
+
+-- Acumulados esperados según el historial de eventos (fuente de verdad para la reconstrucción)
+-- DROP: CREATE OR REPLACE no puede quitar la columna int_min_cobrado de una versión anterior
+DROP VIEW IF EXISTS v_liquidaciones_resumen_acumulados;
+CREATE VIEW v_liquidaciones_resumen_acumulados AS
+SELECT
+    lr.id AS liquidacion_resumen_id,
+    lr.proposal_id,
+    COALESCE(SUM(
+        COALESCE(crm_try_numeric(crm_try_jsonb(le.resultado_json::text) ->> 'saldo_favor_generado'), 0)
+        - COALESCE(crm_try_numeric(crm_try_jsonb(le.resultado_json::text) ->> 'saldo_favor_aplicado'), 0)
+    ), 0) AS saldo_favor_acumulado,
+    MIN(crm_try_date(le.fecha_evento::text)) AS fecha_primer_evento
+FROM liquidaciones_resumen lr
+LEFT JOIN liquidacion_eventos le ON le.liquidacion_resumen_id = lr.id
+GROUP BY lr.id, lr.proposal_id;
+
+-- Append de eventos que además actualiza los acumulados del resumen (misma transacción)
+CREATE OR REPLACE FUNCTION append_liquidacion_eventos(p_eventos JSONB)
+RETURNS SETOF liquidacion_eventos
+LANGUAGE sql AS $$
+    SELECT 1
+    FROM liquidaciones_resumen lr
+    WHERE lr.id IN (
+        SELECT (jsonb_populate_record(NULL::liquidacion_eventos, e)).liquidacion_resumen_id
+        FROM jsonb_array_elements(p_eventos) e
+    )
+    ORDER BY lr.id
+    FOR UPDATE;
+
+    WITH nuevos AS (
+        SELECT r.*, t.ord
+        FROM jsonb_array_elements(p_eventos) WITH ORDINALITY AS t(e, ord),
+             LATERAL jsonb_populate_record(NULL::liquidacion_eventos, t.e) AS r
+    ), ultimos AS (
+        SELECT le.liquidacion_resumen_id, MAX(le.orden_evento) AS max_orden
+        FROM liquidacion_eventos le
+        WHERE le.liquidacion_resumen_id IN (SELECT liquidacion_resumen_id FROM nuevos)
+        GROUP BY le.liquidacion_resumen_id
+    ), insertados AS (
+        INSERT INTO liquidacion_eventos (
+            liquidacion_resumen_id, orden_evento, tipo_evento, fecha_evento,
+            monto_recibido, dias_diferencia, resultado_json
+        )
+        SELECT
+            n.liquidacion_resumen_id,
+            COALESCE(u.max_orden, 0) + ROW_NUMBER() OVER (PARTITION BY n.liquidacion_resumen_id ORDER BY n.ord),
+            n.tipo_evento, n.fecha_evento, n.monto_recibido, n.dias_diferencia, n.resultado_json
+        FROM nuevos n
+        LEFT JOIN ultimos u ON u.liquidacion_resumen_id = n.liquidacion_resumen_id
+        ORDER BY n.ord
+        RETURNING *
+    ), deltas AS (
+        SELECT
+            i.liquidacion_resumen_id,
+            SUM(
+                COALESCE(crm_try_numeric(crm_try_jsonb(i.resultado_json::text) ->> 'saldo_favor_generado'), 0)
+                - COALESCE(crm_try_numeric(crm_try_jsonb(i.resultado_json::text) ->> 'saldo_favor_aplicado'), 0)
+            ) AS saldo_delta,
+            MIN(crm_try_date(i.fecha_evento::text)) AS primer_evento
+        FROM insertados i
+        GROUP BY i.liquidacion_resumen_id
+    ), actualizados AS (
+        -- Los CTE con UPDATE se ejecutan aunque no se referencien
+        UPDATE liquidaciones_resumen lr
+        SET saldo_favor_acumulado = lr.saldo_favor_acumulado + d.saldo_delta,
+            fecha_primer_evento = LEAST(lr.fecha_primer_evento, d.primer_evento)
+        FROM deltas d
+        WHERE lr.id = d.liquidacion_resumen_id
+        RETURNING lr.id
+    )
+    SELECT i.* FROM insertados i ORDER BY i.liquidacion_resumen_id, i.orden_evento;
+$$;
+
+-- Recalcula los acumulados desde el historial.
+-- p_proposal_ids NULL = todos. p_aplicar FALSE = solo reporta diferencias.
+-- Devuelve un JSON array con los resúmenes cuyo valor almacenado difería.
+CREATE OR REPLACE FUNCTION rebuild_liquidaciones_resumen_acumulados(
+    p_proposal_ids TEXT[] DEFAULT NULL,
+    p_aplicar BOOLEAN DEFAULT TRUE
+)
+RETURNS JSONB
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_diferencias JSONB;
+BEGIN
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+        'liquidacion_resumen_id', lr.id,
+        'proposal_id', lr.proposal_id,
+        'saldo_favor_almacenado', lr.saldo_favor_acumulado,
+        'saldo_favor_recalculado', v.saldo_favor_acumulado,
+        'fecha_primer_evento_almacenada', lr.fecha_primer_evento,
+        'fecha_primer_evento_recalculada', v.fecha_primer_evento
+    )), '[]'::jsonb)
+    INTO v_diferencias
+    FROM liquidaciones_resumen lr
+    JOIN v_liquidaciones_resumen_acumulados v ON v.liquidacion_resumen_id = lr.id
+    WHERE (p_proposal_ids IS NULL OR lr.proposal_id = ANY(p_proposal_ids))
+      AND (lr.saldo_favor_acumulado IS DISTINCT FROM v.saldo_favor_acumulado
+           OR lr.fecha_primer_evento IS DISTINCT FROM v.fecha_primer_evento);
+
+    IF p_aplicar THEN
+        UPDATE liquidaciones_resumen lr
+        SET saldo_favor_acumulado = v.saldo_favor_acumulado,
+            fecha_primer_evento = v.fecha_primer_evento
+        FROM v_liquidaciones_resumen_acumulados v
+        WHERE v.liquidacion_resumen_id = lr.id
+          AND (p_proposal_ids IS NULL OR lr.proposal_id = ANY(p_proposal_ids))
+          AND (lr.saldo_favor_acumulado IS DISTINCT FROM v.saldo_favor_acumulado
+               OR lr.fecha_primer_evento IS DISTINCT FROM v.fecha_primer_evento);
+    END IF;
+
+    RETURN v_diferencias;
+END;
+$$;
+
+-- Backfill inicial de los resúmenes existentes
+SELECT rebuild_liquidaciones_resumen_acumulados();
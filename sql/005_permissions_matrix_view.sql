@@ -0,0 +1,25 @@
+-- MATRIZ DE PERMISOS EN UNA SOLA CONSULTA
+-- Objetivo: get_full_permissions_matrix lee una fila por módulo ya agrupada,
+--           en lugar de 3 lecturas completas + filtrado O(módulos x accesos) en Python.
+--           Soporta varios titulares por rol: cada rol es un arreglo de emails
+--           (vacío si no hay titular); la UI los une solo para mostrarlos.
+-- Fecha: 2026-10-18
+
+-- DROP: una versión anterior devolvía texto; CREATE OR REPLACE no cambia el tipo de una columna
+DROP VIEW IF EXISTS v_permissions_matrix;
+
+CREATE VIEW v_permissions_matrix
+WITH (security_invoker = true) AS
+SELECT
+    m.id AS module_id,
+    m.name AS module_name,
+    COALESCE(array_agg(u.email::text ORDER BY u.email) FILTER (WHERE lower(a.hierarchy_level) = 'super_user'), ARRAY[]::text[]) AS super_user,
+    COALESCE(array_agg(u.email::text ORDER BY u.email) FILTER (WHERE lower(a.hierarchy_level) = 'principal'), ARRAY[]::text[]) AS principal,
+    COALESCE(array_agg(u.email::text ORDER BY u.email) FILTER (WHERE lower(a.hierarchy_level) = 'secondary'), ARRAY[]::text[]) AS secondary
+FROM modules m
+LEFT JOIN user_module_access a ON a.module_id = m.id
+LEFT JOIN authorized_users u ON u.id = a.user_id
+GROUP BY m.id, m.name;
+
+-- Índice para el join por módulo
+CREATE INDEX IF NOT EXISTS idx_user_module_access_module ON user_module_access(module_id, hierarchy_level);
@@ -0,0 +1,11 @@
+-- CLAVE DE IDEMPOTENCIA EN PROPUESTAS
+-- Objetivo: save_proposals_batch guarda un lote completo en un solo upsert
+--           (ON CONFLICT (idempotency_key) DO NOTHING), de modo que reintentar
+--           o enviar dos veces el mismo lote no duplica propuestas.
+--           Las filas anteriores quedan con NULL (el índice único admite varios NULL).
+-- Fecha: 2026-10-18
+
+ALTER TABLE propuestas ADD COLUMN IF NOT EXISTS idempotency_key TEXT;
+
+-- Debe ser un índice único no parcial para que PostgREST pueda usarlo en on_conflict
+CREATE UNIQUE INDEX IF NOT EXISTS ux_propuestas_idempotency_key ON propuestas(idempotency_key);
@@ -0,0 +1,321 @@
+# src/data/audit_writer.py
+
+import atexit
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from postgrest.exceptions import APIError
+
+AuditRow = Dict[str, Any]
+
+# Deployments that must set AUDIT_SPOOL_PATH (a persistent volume); APP_ENV wins over Railway's variable
+_PRODUCTION_ENV_NAMES = ('production', 'prod')
+
+# SQLSTATE classes PostgREST answers with a 5xx (connection, resources, locks,
+# timeouts, internal errors); everything else it reports is a 4xx
+_TRANSIENT_SQLSTATE_CLASSES = ('08', '09', '25', '2D', '38', '39', '3B', '40', '53', '54', '55', '57', '58', 'F0', 'HV', 'XX')
+_TRANSIENT_PGRST_CODES = ('PGRST000', 'PGRST001', 'PGRST002', 'PGRST003')  # Database unreachable / pool timeout
+
+
+def is_production() -> bool:
+    env = os.environ.get('APP_ENV') or os.environ.get('RAILWAY_ENVIRONMENT_NAME') or ''
+    return env.strip().lower() in _PRODUCTION_ENV_NAMES
+
+def spool_path_for(project: str) -> str:
+    """
+    Spool file for the Supabase project `project` (its URL): AUDIT_SPOOL_PATH
+    when set, otherwise one file per project in the temp dir, so rows spooled
+    for one project are never replayed into another. Production requires
+    AUDIT_SPOOL_PATH (the temp dir does not survive a redeploy).
+    """
+    configured = os.environ.get('AUDIT_SPOOL_PATH')
+    if configured:
+        return configured
+    if is_production():
+        raise RuntimeError("AUDIT_SPOOL_PATH es obligatorio en producción (ruta en un volumen persistente).")
+    digest = hashlib.sha256(project.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f'crm_auditoria_spool_{digest}.sqlite3')
+
+def is_permanent_error(error: Exception) -> bool:
+    """
+    True when the server rejected the request for good (HTTP 4xx: constraint,
+    unknown column, invalid value, permissions), so retrying cannot succeed.
+    Network errors and 5xx answers are transient.
+    """
+    if not isinstance(error, APIError):
+        return False  # httpx.TransportError, timeouts and anything unexpected are retried
+    code = error.code
+    if isinstance(code, int) or (isinstance(code, str) and code.isdigit() and len(code) == 3):
+        status = int(code)  # Non-JSON error body: postgrest reports the HTTP status
+        return 400 <= status < 500 and status not in (408, 429)
+    if not code:
+        return False
+    if code.startswith('PGRST'):
+        return code not in _TRANSIENT_PGRST_CODES
+    return not code.upper().startswith(_TRANSIENT_SQLSTATE_CLASSES)
+
+
+class AuditWriter:
+    """
+    Write-behind writer for auditoria_eventos.
+
+    `enqueue` only appends to an in-memory buffer; a daemon thread sends the
+    rows with one batched insert when `batch_size` rows are waiting or every
+    `flush_interval` seconds. If an insert fails, the batch goes to a local
+    SQLite spool, and later batches queue behind it there so order is kept.
+    The spool is replayed, oldest first, once the insert works again (retried
+    every `retry_interval` seconds, doubling up to `max_retry_interval`).
+    Only network errors and 5xx answers are retried: rows the server rejects
+    for good (see is_permanent_error) are isolated and moved, with the error,
+    to the spool's `dead_letter` table so they cannot block later events.
+    Whatever is still buffered at interpreter exit is flushed or spooled.
+
+    Delivery is at-least-once: a batch whose insert succeeded but whose
+    response was lost is sent again from the spool.
+
+    Example:
+        writer = AuditWriter(lambda rows: supabase.table('auditoria_eventos').insert(rows).execute(), spool_path_for(url))
+        writer.enqueue([row])
+    """
+
+    def __init__(
+        self,
+        insert_batch: Callable[[List[AuditRow]], Any],
+        spool_path: str,
+        batch_size: int = 200,
+        flush_interval: float = 2.0,
+        retry_interval: float = 5.0,
+        max_retry_interval: float = 120.0
+    ):
+        self.insert_batch = insert_batch
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+
+        self._buffer: Deque[AuditRow] = deque()
+        self._condition = threading.Condition()
+        self._in_flight = 0                 # Rows taken from the buffer but not yet stored
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._spool_lock = threading.Lock()
+        self._spooled = self._count_spool()  # Replay rows left over by a previous process
+        self._next_retry_at = 0.0
+        self._current_retry_interval = retry_interval
+        self.last_error: Optional[str] = None
+        atexit.register(self.close)
+        if self._spooled:
+            with self._condition:
+                self._ensure_thread()
+
+    # --- Public API ---
+
+    def enqueue(self, rows: List[AuditRow]) -> None:
+        """Buffers rows for the background thread; never blocks on the network."""
+        if not rows:
+            return
+        with self._condition:
+            self._buffer.extend(rows)
+            self._ensure_thread()
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until every buffered row was inserted or spooled.
+        Returns False if `timeout` expired first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._condition.notify()
+            while self._buffer or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stops the thread after draining the buffer; leftovers are spooled."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        # Whatever the thread could not take (or if it never started) goes to disk
+        with self._condition:
+            rows = list(self._buffer)
+            self._buffer.clear()
+        if rows:
+            self._spool(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        """Buffered / spooled row counts and the last insert error."""
+        with self._condition:
+            buffered = len(self._buffer) + self._in_flight
+        return {'buffered': buffered, 'spooled': self._spooled, 'dead_letter': self._count_dead_letter(), 'last_error': self.last_error}
+
+    # --- Background thread ---
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._stopping and len(self._buffer) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                self._in_flight = len(batch)
+                stopping = self._stopping
+
+            if batch:
+                self._write(batch)
+            if self._spooled and time.monotonic() >= self._next_retry_at:
+                self._replay_spool()
+
+            with self._condition:
+                self._in_flight = 0
+                self._condition.notify_all()
+                if stopping and not self._buffer:
+                    return
+
+    def _write(self, batch: List[AuditRow]) -> None:
+        if self._spooled:
+            # Older rows are waiting in the spool; queue behind them
+            self._spool(batch)
+            return
+        try:
+            self._insert(batch)
+            self._mark_healthy()
+        except Exception as e:
+            self._mark_failed(e)
+            self._spool(batch)
+
+    def _insert(self, rows: List[AuditRow]) -> None:
+        """
+        Inserts `rows`, dead-lettering the ones the server rejects for good.
+        Raises on transient errors (the caller spools or keeps the rows).
+        """
+        try:
+            self.insert_batch(rows)
+            return
+        except Exception as e:
+            if not is_permanent_error(e):
+                raise
+            if len(rows) == 1:
+                self._dead_letter(rows, e)
+                return
+        # One bad row rejects the whole statement: retry one by one to isolate it
+        for row in rows:
+            try:
+                self.insert_batch([row])
+            except Exception as e:
+                if not is_permanent_error(e):
+                    raise
+                self._dead_letter([row], e)
+
+    def _replay_spool(self) -> None:
+        while True:
+            with self._spool_lock:
+                entries = self._read_spool(self.batch_size)
+            if not entries:
+                return
+            try:
+                self._insert([row for _, row in entries])
+            except Exception as e:
+                self._mark_failed(e)
+                return
+            self._mark_healthy()
+            with self._spool_lock:
+                self._delete_spool([entry_id for entry_id, _ in entries])
+
+    def _mark_healthy(self) -> None:
+        self._current_retry_interval = self.retry_interval
+        self._next_retry_at = 0.0
+
+    def _mark_failed(self, error: Exception) -> None:
+        self.last_error = str(error)
+        print(f"[ERROR en AuditWriter]: {error}. Eventos en spool local: {self.spool_path}")
+        self._next_retry_at = time.monotonic() + self._current_retry_interval
+        self._current_retry_interval = min(self._current_retry_interval * 2, self.max_retry_interval)
+
+    # --- SQLite spool ---
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.spool_path, timeout=30)
+        connection.execute('CREATE TABLE IF NOT EXISTS spool (id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL)')
+        connection.execute('CREATE TABLE IF NOT EXISTS dead_letter (id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, error TEXT, failed_at TEXT)')
+        return connection
+
+    def _count_spool(self) -> int:
+        if not os.path.exists(self.spool_path):
+            return 0
+        try:
+            with self._spool_lock, contextlib.closing(self._connect()) as connection:
+                return connection.execute('SELECT COUNT(*) FROM spool').fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"[ERROR en AuditWriter spool]: {e}")
+            return 0
+
+    def _spool(self, rows: List[AuditRow]) -> None:
+        try:
+            with self._spool_lock, contextlib.closing(self._connect()) as connection, connection:
+                connection.executemany(
+                    'INSERT INTO spool (payload) VALUES (?)',
+                    [(json.dumps(row, default=str),) for row in rows]
+                )
+            self._spooled += len(rows)
+        except sqlite3.Error as e:
+            # Last resort: keep them in memory for the next attempt
+            print(f"[ERROR en AuditWriter spool]: {e}. {len(rows)} eventos se reintentarán en memoria.")
+            with self._condition:
+                self._buffer.extendleft(reversed(rows))
+
+    def _read_spool(self, limit: int) -> List[tuple]:
+        try:
+            with contextlib.closing(self._connect()) as connection:
+                cursor = connection.execute('SELECT id, payload FROM spool ORDER BY id LIMIT ?', (limit,))
+                return [(entry_id, json.loads(payload)) for entry_id, payload in cursor]
+        except sqlite3.Error as e:
+            print(f"[ERROR en AuditWriter spool]: {e}")
+            return []
+
+    def _delete_spool(self, entry_ids: List[int]) -> None:
+        with contextlib.closing(self._connect()) as connection, connection:
+            connection.executemany('DELETE FROM spool WHERE id = ?', [(entry_id,) for entry_id in entry_ids])
+        self._spooled = max(0, self._spooled - len(entry_ids))
+
+    def _dead_letter(self, rows: List[AuditRow], error: Exception) -> None:
+        print(f"[ERROR en AuditWriter]: {len(rows)} eventos rechazados por el servidor ({error}); movidos a dead_letter en {self.spool_path}")
+        failed_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        try:
+            with self._spool_lock, contextlib.closing(self._connect()) as connection, connection:
+                connection.executemany(
+                    'INSERT INTO dead_letter (payload, error, failed_at) VALUES (?, ?, ?)',
+                    [(json.dumps(row, default=str), repr(error), failed_at) for row in rows]
+                )
+        except sqlite3.Error as e:
+            print(f"[ERROR en AuditWriter spool]: {e}. Eventos descartados: {json.dumps(rows, default=str)}")
+
+    def _count_dead_letter(self) -> int:
+        if not os.path.exists(self.spool_path):
+            return 0
+        try:
+            with self._spool_lock, contextlib.closing(self._connect()) as connection:
+                return connection.execute('SELECT COUNT(*) FROM dead_letter').fetchone()[0]
+        except sqlite3.Error:
+            return 0
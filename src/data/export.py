@@ -0,0 +1,205 @@
+# src/data/export.py
+
+import csv
+import datetime as dt
+import json
+import os
+import tempfile
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .supabase_client import get_supabase_client
+from .supabase_repository import iter_table_pages
+from src.utils.latency import measure_latency
+
+ProgressCallback = Callable[[int, Optional[int]], None]  # (rows_written, total_rows or None)
+
+EXPORT_FORMATS: Dict[str, Dict[str, str]] = {
+    'xlsx': {'extension': 'xlsx', 'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'},
+    'csv': {'extension': 'csv', 'mime': 'text/csv'},
+    'parquet': {'extension': 'parquet', 'mime': 'application/vnd.apache.parquet'},
+}
+
+
+def _cell(value: Any) -> Any:
+    """Values a spreadsheet/CSV cell can hold (JSON columns are serialized)."""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return value
+
+
+def _write_xlsx(pages: Iterator[List[Dict[str, Any]]], path: str, table: str, sheet_name: str, on_row_batch: Callable[[int], None]) -> None:
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)  # Rows are streamed to disk, not kept in memory
+    sheet = workbook.create_sheet(title=sheet_name[:31])
+    headers: Optional[List[str]] = None
+    for page in pages:
+        if headers is None:
+            headers = list(page[0].keys())
+            sheet.append(headers)
+        for row in page:
+            sheet.append([_cell(row.get(h)) for h in headers])
+        on_row_batch(len(page))
+    if headers is None:
+        sheet.append([])
+    workbook.save(path)
+
+
+def _write_csv(pages: Iterator[List[Dict[str, Any]]], path: str, table: str, sheet_name: str, on_row_batch: Callable[[int], None]) -> None:
+    with open(path, 'w', newline='', encoding='utf-8-sig') as handle:  # BOM so Excel detects UTF-8
+        writer = None
+        headers: List[str] = []
+        for page in pages:
+            if writer is None:
+                headers = list(page[0].keys())
+                writer = csv.writer(handle)
+                writer.writerow(headers)
+            writer.writerows([_cell(row.get(h)) for h in headers] for row in page)
+            on_row_batch(len(page))
+
+
+# PostgREST (OpenAPI) column formats -> Parquet types; anything else is written as text
+_PARQUET_TYPES = {
+    'smallint': 'int64', 'integer': 'int64', 'bigint': 'int64',
+    'numeric': 'float64', 'real': 'float64', 'double precision': 'float64',
+    'boolean': 'bool',
+}
+
+
+def _declared_column_types(table: str) -> Dict[str, str]:
+    """Column formats of `table` from the PostgREST OpenAPI description ({} if unavailable)."""
+    try:
+        session = get_supabase_client().postgrest.session
+        response = session.get('/', headers={'Accept': 'application/openapi+json'})
+        response.raise_for_status()
+        properties = response.json().get('definitions', {}).get(table, {}).get('properties', {})
+        return {column: spec.get('format', '') for column, spec in properties.items()}
+    except Exception as e:
+        print(f"[WARN] No se pudieron leer los tipos de columna de '{table}' ({e}); se infieren de los datos.")
+        return {}
+
+
+def _parquet_schema(table: str, first_page: List[Dict[str, Any]]):
+    """
+    Schema for the whole export: declared column types when PostgREST exposes
+    them, otherwise inferred from the first page with integers widened to
+    float64 (a NUMERIC column may hold only whole numbers in the first page)
+    and all-NULL columns typed as text.
+    """
+    import pyarrow as pa
+
+    declared = _declared_column_types(table)
+    fields = []
+    for name in first_page[0].keys():
+        if name in declared:
+            arrow_type = getattr(pa, _PARQUET_TYPES.get(declared[name], 'string'))()
+        else:
+            inferred = pa.array([row.get(name) for row in first_page]).type
+            if pa.types.is_integer(inferred) or pa.types.is_floating(inferred):
+                arrow_type = pa.float64()
+            elif pa.types.is_boolean(inferred):
+                arrow_type = pa.bool_()
+            else:
+                arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def _parquet_column(values: List[Any], field):
+    """One page of a column cast to the export schema; raises instead of truncating (e.g. 1000.5 into int64)."""
+    import pyarrow as pa
+
+    if pa.types.is_string(field.type):
+        values = [v if v is None or isinstance(v, str) else json.dumps(v, ensure_ascii=False, default=str) for v in values]
+    return pa.array(values).cast(field.type, safe=True)
+
+
+def _write_parquet(pages: Iterator[List[Dict[str, Any]]], path: str, table: str, sheet_name: str, on_row_batch: Callable[[int], None]) -> None:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("La exportación a Parquet requiere pyarrow (pip install pyarrow).")
+
+    writer = None
+    schema = None
+    try:
+        for page in pages:
+            rows = [{k: _cell(v) for k, v in row.items()} for row in page]
+            if schema is None:
+                schema = _parquet_schema(table, rows)
+                writer = pq.ParquetWriter(path, schema, compression='zstd')
+            columns = [_parquet_column([row.get(f.name) for row in rows], f) for f in schema]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            on_row_batch(len(page))
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        pq.write_table(pa.table({}), path)
+
+
+_WRITERS = {'xlsx': _write_xlsx, 'csv': _write_csv, 'parquet': _write_parquet}
+
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Export Table")
+def export_table(
+    table: str,
+    fmt: str = 'xlsx',
+    columns: str = '*',
+    key: str = 'id',
+    page_size: int = 1000,
+    path: Optional[str] = None,
+    sheet_name: Optional[str] = None,
+    on_progress: Optional[ProgressCallback] = None
+) -> str:
+    """
+    Streams a whole table to an XLSX, CSV or Parquet file with bounded memory.
+
+    Pages through the table by keyset on `key` (see iter_table_pages) and writes
+    each page as it arrives, so peak memory is about one page regardless of the
+    table size. Works for any table with a unique key, e.g.
+    export_table('propuestas', 'csv', key='proposal_id').
+
+    Args:
+        table: Table to export
+        fmt: 'xlsx', 'csv' or 'parquet'
+        columns: PostgREST column list (must include `key`)
+        key: Unique column used for keyset pagination
+        page_size: Rows per request
+        path: Output file; a temporary file is created when omitted
+        sheet_name: Worksheet name for XLSX (defaults to the table name)
+        on_progress: Called after each page with (rows_written, total_rows)
+
+    Returns:
+        Path of the written file (the caller deletes temporary files)
+    """
+    if fmt not in _WRITERS:
+        raise ValueError(f"Formato no soportado: '{fmt}'. Opciones: {', '.join(_WRITERS)}")
+
+    if path is None:
+        handle, path = tempfile.mkstemp(prefix=f"{table}_{dt.date.today()}_", suffix=f".{EXPORT_FORMATS[fmt]['extension']}")
+        os.close(handle)
+
+    # Row count from the first page's request (no separate count query)
+    total: Optional[int] = None
+    written = 0
+
+    def on_total(count: Optional[int]) -> None:
+        nonlocal total
+        total = count
+
+    def on_row_batch(count: int) -> None:
+        nonlocal written
+        written += count
+        if on_progress:
+            on_progress(written, total)
+
+    try:
+        _WRITERS[fmt](iter_table_pages(table, columns=columns, key=key, page_size=page_size, on_total=on_total), path, table, sheet_name or table, on_row_batch)
+    except Exception:
+        # Never leave a half-written export behind
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return path
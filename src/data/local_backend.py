@@ -0,0 +1,1000 @@
+# src/data/local_backend.py
+
+import asyncio
+import contextlib
+import datetime as dt
+import functools
+import glob
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from postgrest.exceptions import APIError
+
+from src.utils.query_stats import current_query_stats
+from src.utils.tracing import record_span
+
+# --- Local Supabase stand-in ---
+# An in-memory implementation of the PostgREST builder subset used by the
+# repository (select with embedding, eq/neq/gt/gte/lt/lte/in_/like/ilike/is_/
+# or_, order, limit, range, single, insert, upsert, update, delete, rpc),
+# with simulated network latency. Tables, defaults, unique keys and foreign
+# keys come from _BASE_SCHEMA_SQL (tables that only exist in the hosted
+# project) plus every file in sql/; views and RPC functions from sql/ are
+# emulated in Python. Each execute() counts as one round trip in the query
+# stats (src/utils/query_stats.py) and is traced as a span (src/utils/tracing.py).
+#
+# Activation: SUPABASE_BACKEND=local makes get_supabase_client() return a
+# LocalSupabaseClient. Optional settings:
+#   LOCAL_BACKEND_LATENCY_MS   round-trip latency (default 0)
+#   LOCAL_BACKEND_JITTER_MS    +/- random jitter (default 0)
+#   LOCAL_BACKEND_MS_PER_KB    transfer cost per KB of request + response (default 0)
+#   LOCAL_BACKEND_SEED         JSON file {table: [rows]} loaded at start
+
+_SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'sql')
+
+# Tables managed in the hosted Supabase project (not created by sql/)
+_BASE_SCHEMA_SQL = """
+CREATE TABLE propuestas (
+    proposal_id TEXT PRIMARY KEY,
+    identificador_lote TEXT,
+    estado TEXT,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE TABLE liquidaciones_resumen (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    proposal_id TEXT REFERENCES propuestas(proposal_id),
+    saldo_actual NUMERIC,
+    capital_original NUMERIC,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE TABLE liquidacion_eventos (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    liquidacion_resumen_id UUID REFERENCES liquidaciones_resumen(id),
+    orden_evento INT,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE TABLE desembolsos_resumen (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    proposal_id TEXT REFERENCES propuestas(proposal_id),
+    monto_desembolsado_total NUMERIC,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE TABLE desembolso_eventos (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    desembolso_resumen_id UUID REFERENCES desembolsos_resumen(id),
+    orden_evento INT,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE TABLE auditoria_eventos (
+    id BIGSERIAL PRIMARY KEY,
+    usuario_id TEXT,
+    entidad_id TEXT
+);
+CREATE TABLE authorized_users (
+    id BIGSERIAL PRIMARY KEY,
+    email TEXT UNIQUE
+);
+CREATE TABLE modules (
+    id BIGSERIAL PRIMARY KEY,
+    name TEXT UNIQUE,
+    description TEXT
+);
+CREATE TABLE user_module_access (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT REFERENCES authorized_users(id),
+    module_id BIGINT REFERENCES modules(id),
+    hierarchy_level TEXT
+);
+CREATE TABLE "EMISORES.ACEPTANTES" (
+    "RUC" TEXT PRIMARY KEY,
+    "Razon Social" TEXT,
+    tipo TEXT
+);
+"""
+
+
+# --- Value semantics ---
+
+def _key(value: Any) -> Any:
+    """Equality key mirroring how PostgREST compares a filter string with a column."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (dt.date, dt.datetime)):
+        return value.isoformat()
+    return str(value)
+
+def _as_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _compare(a: Any, b: Any) -> int:
+    """-1/0/1 ordering; numeric when both sides are numbers, textual otherwise."""
+    na, nb = _as_number(a), _as_number(b)
+    if na is not None and nb is not None and not (isinstance(a, str) and isinstance(b, str)):
+        return (na > nb) - (na < nb)
+    sa, sb = _key(a), _key(b)
+    return (sa > sb) - (sa < sb)
+
+def _like_regex(pattern: str, ignore_case: bool) -> "re.Pattern":
+    parts = []
+    for ch in str(pattern):
+        if ch in '%*':
+            parts.append('.*')
+        elif ch == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(ch))
+    return re.compile('^' + ''.join(parts) + '$', re.IGNORECASE | re.DOTALL if ignore_case else re.DOTALL)
+
+def _to_json_value(value: Any) -> Any:
+    if isinstance(value, (dt.date, dt.datetime)):
+        return value.isoformat()
+    return value
+
+
+# --- Filters ---
+
+class _Condition:
+    """One filter: (column, operator, value) or a nested and/or group."""
+
+    def __init__(self, column: Optional[str], op: str, value: Any, negate: bool = False, children: Optional[List["_Condition"]] = None):
+        self.column = column
+        self.op = op
+        self.value = value
+        self.negate = negate
+        self.children = children or []
+        if op in ('like', 'ilike'):
+            self.regex = _like_regex(value, op == 'ilike')
+
+    def matches(self, row: Dict[str, Any]) -> bool:
+        if self.op == 'and':
+            result = all(child.matches(row) for child in self.children)
+        elif self.op == 'or':
+            result = any(child.matches(row) for child in self.children)
+        else:
+            result = self._matches_column(row.get(self.column))
+        return not result if self.negate else result
+
+    def _matches_column(self, cell: Any) -> bool:
+        op, value = self.op, self.value
+        if op == 'is':
+            target = None if str(value).lower() == 'null' else (str(value).lower() == 'true')
+            return cell is None if target is None else cell is target
+        if cell is None:
+            return False
+        if op == 'eq':
+            return _key(cell) == _key(value)
+        if op == 'neq':
+            return _key(cell) != _key(value)
+        if op == 'in':
+            return _key(cell) in {_key(v) for v in value}
+        if op in ('like', 'ilike'):
+            return bool(self.regex.match(str(cell)))
+        order = _compare(cell, value)
+        return {'gt': order > 0, 'gte': order >= 0, 'lt': order < 0, 'lte': order <= 0}[op]
+
+    def url_params(self) -> List[Tuple[str, str]]:
+        """PostgREST-style query parameters (used for the query stats)."""
+        if self.op in ('and', 'or'):
+            return [(self.op, '(...)')]
+        value = '(' + ','.join(str(v) for v in self.value) + ')' if self.op == 'in' else str(self.value)
+        return [(self.column, f"{'not.' if self.negate else ''}{self.op}.{value}")]
+
+def _split_top_level(text: str) -> List[str]:
+    parts, depth, current = [], 0, []
+    for ch in text:
+        if ch == ',' and depth == 0:
+            parts.append(''.join(current).strip())
+            current = []
+            continue
+        depth += (ch == '(') - (ch == ')')
+        current.append(ch)
+    if current:
+        parts.append(''.join(current).strip())
+    return [part for part in parts if part]
+
+def _parse_logic(expression: str) -> List[_Condition]:
+    """Parses the body of an or_()/and() filter string: 'a.eq.1,and(b.gt.2,c.is.null)'."""
+    conditions = []
+    for part in _split_top_level(expression):
+        match = re.match(r'^(not\.)?(and|or)\((.*)\)$', part, re.DOTALL)
+        if match:
+            conditions.append(_Condition(None, match.group(2), None, negate=bool(match.group(1)), children=_parse_logic(match.group(3))))
+            continue
+        column, rest = part.split('.', 1)
+        negate = rest.startswith('not.')
+        if negate:
+            rest = rest[4:]
+        op, value = rest.split('.', 1)
+        if op == 'in':
+            value = [v.strip().strip('"') for v in value.strip('()').split(',') if v.strip()]
+        conditions.append(_Condition(column, op, value, negate=negate))
+    return conditions
+
+
+# --- Schema ---
+
+class _TableSchema:
+    def __init__(self, name: str):
+        self.name = name
+        self.primary_key: Optional[Tuple[str, ...]] = None
+        self.unique: List[Tuple[str, ...]] = []
+        self.defaults: Dict[str, str] = {}                 # column -> SQL default expression
+        self.serial: List[str] = []                        # auto-increment columns
+        self.references: Dict[str, Tuple[str, str]] = {}   # column -> (table, column)
+
+    def unique_keys(self) -> List[Tuple[str, ...]]:
+        keys = [self.primary_key] if self.primary_key else []
+        return keys + [u for u in self.unique if u not in keys]
+
+def _strip_sql_comments(sql: str) -> str:
+    return re.sub(r'--[^\n]*', '', sql)
+
+def _identifier(token: str) -> str:
+    return token.strip().strip('"')
+
+def _parse_default(expression: str) -> str:
+    return expression.strip().rstrip(',').strip()
+
+def parse_schema_sql(sql: str, schemas: Dict[str, _TableSchema]) -> None:
+    """Applies CREATE TABLE / ALTER TABLE ADD COLUMN / CREATE UNIQUE INDEX statements to `schemas`."""
+    sql = _strip_sql_comments(sql)
+    name_pattern = r'("[^"]+"|[\w.]+)'
+
+    for match in re.finditer(r'CREATE TABLE (?:IF NOT EXISTS )?' + name_pattern + r'\s*\((.*?)\)\s*;', sql, re.IGNORECASE | re.DOTALL):
+        schema = _TableSchema(_identifier(match.group(1)))  # A later definition replaces an earlier one
+        for item in _split_top_level(match.group(2)):
+            _parse_table_item(schema, item)
+        schemas[schema.name] = schema
+
+    for match in re.finditer(r'ALTER TABLE (?:IF EXISTS )?' + name_pattern + r'\s+ADD COLUMN (?:IF NOT EXISTS )?(.*?);', sql, re.IGNORECASE | re.DOTALL):
+        schema = schemas.setdefault(_identifier(match.group(1)), _TableSchema(_identifier(match.group(1))))
+        _parse_table_item(schema, match.group(2))
+
+    for match in re.finditer(r'CREATE UNIQUE INDEX (?:IF NOT EXISTS )?\w+ ON ' + name_pattern + r'\s*\(([^)]*)\)', sql, re.IGNORECASE):
+        schema = schemas.get(_identifier(match.group(1)))
+        if schema is not None:
+            columns = tuple(_identifier(c) for c in match.group(2).split(','))
+            if columns not in schema.unique:
+                schema.unique.append(columns)
+
+def _parse_table_item(schema: _TableSchema, item: str) -> None:
+    upper = item.upper()
+    constraint = re.match(r'^(?:CONSTRAINT\s+\w+\s+)?(PRIMARY KEY|UNIQUE)\s*\(([^)]*)\)', item, re.IGNORECASE)
+    if constraint:
+        columns = tuple(_identifier(c) for c in constraint.group(2).split(','))
+        if constraint.group(1).upper() == 'PRIMARY KEY':
+            schema.primary_key = columns
+        else:
+            schema.unique.append(columns)
+        return
+    if upper.startswith(('CONSTRAINT', 'CHECK', 'FOREIGN KEY')):
+        return
+
+    column_match = re.match(r'^("[^"]+"|\w+)\s+(.*)$', item, re.DOTALL)
+    if not column_match:
+        return
+    column, definition = _identifier(column_match.group(1)), column_match.group(2)
+    definition_upper = definition.upper()
+    if 'PRIMARY KEY' in definition_upper:
+        schema.primary_key = (column,)
+    elif re.search(r'\bUNIQUE\b', definition_upper):
+        schema.unique.append((column,))
+    if re.match(r'^(BIG)?SERIAL\b', definition_upper) or 'GENERATED' in definition_upper and 'IDENTITY' in definition_upper:
+        schema.serial.append(column)
+    default = re.search(r'\bDEFAULT\s+(.+?)(?:\s+(?:NOT NULL|NULL|PRIMARY KEY|UNIQUE|REFERENCES|CHECK)\b|$)', definition, re.IGNORECASE | re.DOTALL)
+    if default:
+        schema.defaults[column] = _parse_default(default.group(1))
+    reference = re.search(r'REFERENCES\s+("[^"]+"|[\w.]+)\s*\(([^)]*)\)', definition, re.IGNORECASE)
+    if reference:
+        schema.references[column] = (_identifier(reference.group(1)), _identifier(reference.group(2)))
+
+def _evaluate_default(expression: str) -> Any:
+    lowered = expression.lower()
+    if 'uuid' in lowered:
+        return str(uuid.uuid4())
+    if 'now()' in lowered or 'current_timestamp' in lowered:
+        return dt.datetime.now(dt.timezone.utc).isoformat()
+    if 'current_date' in lowered:
+        return dt.date.today().isoformat()
+    if lowered in ('true', 'false'):
+        return lowered == 'true'
+    if re.match(r"^'.*'(::\w+)?$", expression, re.DOTALL):
+        return expression[1:expression.rindex("'")]
+    number = _as_number(expression)
+    if number is not None:
+        return int(number) if number.is_integer() else number
+    return None
+
+
+# --- Storage ---
+
+class _Table:
+    """Rows of one table, keyed by row id, with lazily built hash indexes per column."""
+
+    def __init__(self, schema: _TableSchema):
+        self.schema = schema
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self.indexes: Dict[str, Dict[Any, set]] = {}
+        self._next_row_id = 1
+        self._serial_counters: Dict[str, int] = {}
+        # Undo actions of the statement in progress (see LocalBackend.statement); serials are not rolled back, as in PostgreSQL
+        self.journal: Optional[List[Callable[[], None]]] = None
+
+    def index(self, column: str) -> Dict[Any, set]:
+        index = self.indexes.get(column)
+        if index is None:
+            index = {}
+            for row_id, row in self.rows.items():
+                index.setdefault(_key(row.get(column)), set()).add(row_id)
+            self.indexes[column] = index
+        return index
+
+    def _index_add(self, row_id: int, row: Dict[str, Any]) -> None:
+        for column, index in self.indexes.items():
+            index.setdefault(_key(row.get(column)), set()).add(row_id)
+
+    def _index_remove(self, row_id: int, row: Dict[str, Any]) -> None:
+        for column, index in self.indexes.items():
+            bucket = index.get(_key(row.get(column)))
+            if bucket is not None:
+                bucket.discard(row_id)
+                if not bucket:
+                    del index[_key(row.get(column))]
+
+    def with_defaults(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        row = {column: _to_json_value(value) for column, value in values.items()}
+        for column in self.schema.serial:
+            if row.get(column) is None:
+                self._serial_counters[column] = self._serial_counters.get(column, 0) + 1
+                row[column] = self._serial_counters[column]
+            else:
+                number = _as_number(row[column])
+                if number is not None:
+                    self._serial_counters[column] = max(self._serial_counters.get(column, 0), int(number))
+        for column, expression in self.schema.defaults.items():
+            if column not in row:
+                row[column] = _evaluate_default(expression)
+        return row
+
+    def find_conflict(self, row: Dict[str, Any], columns: Tuple[str, ...], ignore_row_id: Optional[int] = None) -> Optional[int]:
+        values = [row.get(c) for c in columns]
+        if any(v is None for v in values):
+            return None  # NULLs never conflict
+        candidates = set(self.index(columns[0]).get(_key(values[0]), ()))
+        for column, value in zip(columns[1:], values[1:]):
+            candidates &= self.index(column).get(_key(value), set())
+        candidates.discard(ignore_row_id)
+        return next(iter(candidates), None)
+
+    def check_unique(self, row: Dict[str, Any], ignore_row_id: Optional[int] = None) -> None:
+        for columns in self.schema.unique_keys():
+            if self.find_conflict(row, columns, ignore_row_id) is not None:
+                raise APIError({
+                    'code': '23505',
+                    'message': f'duplicate key value violates unique constraint on {self.schema.name}({", ".join(columns)})',
+                    'details': f"Key ({', '.join(columns)})=({', '.join(str(row.get(c)) for c in columns)}) already exists.",
+                    'hint': None,
+                })
+
+    def insert(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        self.check_unique(row)
+        row_id = self._next_row_id
+        self._next_row_id += 1
+        self.rows[row_id] = row
+        self._index_add(row_id, row)
+        if self.journal is not None:
+            self.journal.append(lambda: self._restore(row_id, None))
+        return row
+
+    def update(self, row_id: int, changes: Dict[str, Any]) -> Dict[str, Any]:
+        old = self.rows[row_id]
+        new = {**old, **{column: _to_json_value(value) for column, value in changes.items()}}
+        self.check_unique(new, ignore_row_id=row_id)
+        self._index_remove(row_id, old)
+        self.rows[row_id] = new
+        self._index_add(row_id, new)
+        if self.journal is not None:
+            self.journal.append(lambda: self._restore(row_id, old))
+        return new
+
+    def delete(self, row_id: int) -> Dict[str, Any]:
+        row = self.rows.pop(row_id)
+        self._index_remove(row_id, row)
+        if self.journal is not None:
+            self.journal.append(lambda: self._restore(row_id, row))
+        return row
+
+    def _restore(self, row_id: int, row: Optional[Dict[str, Any]]) -> None:
+        """Puts back `row` under `row_id` (None removes it)."""
+        current = self.rows.pop(row_id, None)
+        if current is not None:
+            self._index_remove(row_id, current)
+        if row is not None:
+            self.rows[row_id] = row
+            self._index_add(row_id, row)
+
+
+class LocalResponse:
+    """Stand-in for postgrest's APIResponse (data + count)."""
+
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+    def __repr__(self) -> str:
+        size = len(self.data) if isinstance(self.data, list) else 1
+        return f"LocalResponse(rows={size}, count={self.count})"
+
+
+class LocalBackend:
+    """
+    In-memory database shared by LocalSupabaseClient instances.
+
+    Example:
+        backend = LocalBackend(latency_ms=40)
+        backend.seed('propuestas', rows)
+        client = LocalSupabaseClient(backend)
+        client.table('propuestas').select('*').eq('estado', 'ACTIVO').execute()
+    """
+
+    def __init__(self, sql_dir: Optional[str] = _SQL_DIR, latency_ms: float = 0.0, jitter_ms: float = 0.0, ms_per_kb: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.ms_per_kb = ms_per_kb
+        self.lock = threading.RLock()
+        self.round_trips = 0
+
+        self.schemas: Dict[str, _TableSchema] = {}
+        parse_schema_sql(_BASE_SCHEMA_SQL, self.schemas)
+        if sql_dir and os.path.isdir(sql_dir):
+            for path in sorted(glob.glob(os.path.join(sql_dir, '*.sql'))):
+                with open(path, encoding='utf-8') as handle:
+                    parse_schema_sql(handle.read(), self.schemas)
+        self.tables: Dict[str, _Table] = {}
+        self._journal: Optional[List[Callable[[], None]]] = None
+
+        self.views: Dict[str, Callable[[], List[Dict[str, Any]]]] = {
+            'v_permissions_matrix': self._view_permissions_matrix,
+            'v_liquidaciones_resumen_acumulados': self._view_liquidaciones_acumulados,
+        }
+        self.functions: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            'append_liquidacion_eventos': self._rpc_append_liquidacion_eventos,
+            'append_desembolso_eventos': self._rpc_append_desembolso_eventos,
+            'rebuild_liquidaciones_resumen_acumulados': self._rpc_rebuild_acumulados,
+        }
+
+    @classmethod
+    def from_env(cls) -> "LocalBackend":
+        backend = cls(
+            latency_ms=float(os.environ.get('LOCAL_BACKEND_LATENCY_MS', 0)),
+            jitter_ms=float(os.environ.get('LOCAL_BACKEND_JITTER_MS', 0)),
+            ms_per_kb=float(os.environ.get('LOCAL_BACKEND_MS_PER_KB', 0)),
+        )
+        seed_path = os.environ.get('LOCAL_BACKEND_SEED')
+        if seed_path:
+            with open(seed_path, encoding='utf-8') as handle:
+                for table, rows in json.load(handle).items():
+                    backend.seed(table, rows)
+        return backend
+
+    def table(self, name: str) -> _Table:
+        table = self.tables.get(name)
+        if table is None:
+            schema = self.schemas.get(name)
+            if schema is None:
+                schema = self.schemas[name] = _TableSchema(name)
+                schema.primary_key = ('id',)
+                schema.defaults['id'] = 'gen_random_uuid()'
+            table = self.tables[name] = _Table(schema)
+            table.journal = self._journal
+        return table
+
+    @contextlib.contextmanager
+    def statement(self):
+        """
+        Applies one write request atomically: if it raises, every row change
+        it made is undone, as PostgREST (one statement) and the plpgsql RPCs
+        (one transaction) do. Call with `lock` held.
+        """
+        journal: List[Callable[[], None]] = []
+        self._journal = journal
+        for table in self.tables.values():
+            table.journal = journal
+        try:
+            yield
+        except Exception:
+            for undo in reversed(journal):
+                undo()
+            raise
+        finally:
+            self._journal = None
+            for table in self.tables.values():
+                table.journal = None
+
+    def seed(self, table_name: str, rows: Iterable[Dict[str, Any]]) -> int:
+        """Bulk-loads rows (defaults applied, no latency, not counted as round trips)."""
+        count = 0
+        with self.lock:
+            table = self.table(table_name)
+            for row in rows:
+                table.insert(table.with_defaults(row))
+                count += 1
+        return count
+
+    def rows(self, name: str) -> List[Dict[str, Any]]:
+        """Current rows of a table or view (live objects; copy before mutating)."""
+        view = self.views.get(name)
+        if view is not None:
+            return view()
+        return list(self.table(name).rows.values())
+
+    # --- Latency / accounting ---
+
+    def simulated_delay(self, payload_bytes: int) -> float:
+        delay_ms = self.latency_ms + (random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0)
+        delay_ms += self.ms_per_kb * payload_bytes / 1024
+        return max(0.0, delay_ms) / 1000
+
+    def record(self, method: str, resource: str, params: List[Tuple[str, str]], bytes_sent: int, bytes_received: int, duration_ms: float, status_code: int = 200) -> None:
+        with self.lock:
+            self.round_trips += 1
+        url = httpx.URL(f"http://local-supabase/rest/v1/{resource}", params=params)
+        current_query_stats().record(method, url, status_code, bytes_sent, bytes_received, duration_ms)
+        finished = time.perf_counter_ns()
+        record_span(f"{method} {resource}", finished - int(duration_ms * 1e6), finished,
+                    status="ERROR" if status_code >= 400 else "OK", status_code=status_code)
+
+    # --- Views ---
+
+    def _view_permissions_matrix(self) -> List[Dict[str, Any]]:
+        emails = {_key(u.get('id')): u.get('email') for u in self.rows('authorized_users')}
+        holders: Dict[Any, Dict[str, List[str]]] = {}
+        for access in self.rows('user_module_access'):
+            level = str(access.get('hierarchy_level') or '').lower()
+            email = emails.get(_key(access.get('user_id')))
+            if email and level in ('super_user', 'principal', 'secondary'):
+                holders.setdefault(_key(access.get('module_id')), {}).setdefault(level, []).append(email)
+        matrix = []
+        for module in self.rows('modules'):
+            roles = holders.get(_key(module.get('id')), {})
+            matrix.append({
+                'module_id': module.get('id'),
+                'module_name': module.get('name'),
+                **{level: sorted(roles.get(level, [])) for level in ('super_user', 'principal', 'secondary')},
+            })
+        return matrix
+
+    def _view_liquidaciones_acumulados(self) -> List[Dict[str, Any]]:
+        eventos = self.table('liquidacion_eventos').index('liquidacion_resumen_id')
+        eventos_rows = self.table('liquidacion_eventos').rows
+        view = []
+        for resumen in self.rows('liquidaciones_resumen'):
+            own = [eventos_rows[row_id] for row_id in eventos.get(_key(resumen.get('id')), ())]
+            view.append({
+                'liquidacion_resumen_id': resumen.get('id'),
+                'proposal_id': resumen.get('proposal_id'),
+                **_acumulados(own),
+            })
+        return view
+
+    # --- RPC functions (sql/003, sql/004) ---
+
+    def _append_eventos(self, table_name: str, parent_column: str, eventos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        table = self.table(table_name)
+        index = table.index(parent_column)
+        next_orden: Dict[Any, int] = {}
+        inserted = []
+        for evento in eventos:
+            parent = _key(evento.get(parent_column))
+            if parent not in next_orden:
+                next_orden[parent] = max((_as_number(table.rows[r].get('orden_evento')) or 0 for r in index.get(parent, ())), default=0)
+            next_orden[parent] += 1
+            row = table.with_defaults({**evento, 'orden_evento': int(next_orden[parent])})
+            inserted.append(table.insert(row))
+        return inserted
+
+    def _rpc_append_liquidacion_eventos(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        inserted = self._append_eventos('liquidacion_eventos', 'liquidacion_resumen_id', params.get('p_eventos') or [])
+        resumenes = self.table('liquidaciones_resumen')
+        by_resumen: Dict[Any, List[Dict[str, Any]]] = {}
+        for row in inserted:
+            by_resumen.setdefault(_key(row.get('liquidacion_resumen_id')), []).append(row)
+        for resumen_key, rows in by_resumen.items():
+            for row_id in list(resumenes.index('id').get(resumen_key, ())):
+                resumen = resumenes.rows[row_id]
+                delta = _acumulados(rows)
+                primer = min(filter(None, [resumen.get('fecha_primer_evento'), delta['fecha_primer_evento']]), default=None)
+                resumenes.update(row_id, {
+                    'saldo_favor_acumulado': (_as_number(resumen.get('saldo_favor_acumulado')) or 0.0) + delta['saldo_favor_acumulado'],
+                    'fecha_primer_evento': primer,
+                })
+        return sorted(inserted, key=lambda r: (_key(r.get('liquidacion_resumen_id')), r.get('orden_evento')))
+
+    def _rpc_append_desembolso_eventos(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return self._append_eventos('desembolso_eventos', 'desembolso_resumen_id', params.get('p_eventos') or [])
+
+    def _rpc_rebuild_acumulados(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        proposal_ids = params.get('p_proposal_ids')
+        wanted = {str(pid) for pid in proposal_ids} if proposal_ids is not None else None
+        apply = params.get('p_aplicar', True)
+        resumenes = self.table('liquidaciones_resumen')
+        expected = {_key(v['liquidacion_resumen_id']): v for v in self._view_liquidaciones_acumulados()}
+        diferencias = []
+        for row_id, resumen in list(resumenes.rows.items()):
+            if wanted is not None and str(resumen.get('proposal_id')) not in wanted:
+                continue
+            v = expected[_key(resumen.get('id'))]
+            stored = (_as_number(resumen.get('saldo_favor_acumulado')) or 0.0, resumen.get('fecha_primer_evento'))
+            if stored == (v['saldo_favor_acumulado'], v['fecha_primer_evento']):
+                continue
+            diferencias.append({
+                'liquidacion_resumen_id': resumen.get('id'),
+                'proposal_id': resumen.get('proposal_id'),
+                'saldo_favor_almacenado': stored[0],
+                'saldo_favor_recalculado': v['saldo_favor_acumulado'],
+                'fecha_primer_evento_almacenada': stored[1],
+                'fecha_primer_evento_recalculada': v['fecha_primer_evento'],
+            })
+            if apply:
+                resumenes.update(row_id, {
+                    'saldo_favor_acumulado': v['saldo_favor_acumulado'],
+                    'fecha_primer_evento': v['fecha_primer_evento'],
+                })
+        return diferencias
+
+    def _find_one(self, table_name: str, column: str, value: Any) -> Optional[Dict[str, Any]]:
+        table = self.table(table_name)
+        row_ids = table.index(column).get(_key(value))
+        return table.rows[next(iter(row_ids))] if row_ids else None
+
+
+def _acumulados(eventos: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """saldo_favor_acumulado / fecha_primer_evento of a set of events (as in sql/004)."""
+    saldo = 0.0
+    fechas = []
+    for evento in eventos:
+        resultado = evento.get('resultado_json') or {}
+        if isinstance(resultado, str):
+            try:
+                resultado = json.loads(resultado)
+            except ValueError:
+                resultado = {}
+        if not isinstance(resultado, dict):
+            resultado = {}
+        saldo += (_as_number(resultado.get('saldo_favor_generado')) or 0.0) - (_as_number(resultado.get('saldo_favor_aplicado')) or 0.0)
+        fecha = _as_date(evento.get('fecha_evento'))
+        if fecha:
+            fechas.append(fecha)
+    primer = min(fechas).isoformat() if fechas else None
+    return {'saldo_favor_acumulado': saldo, 'fecha_primer_evento': primer}
+
+def _as_date(value: Any) -> Optional[dt.date]:
+    """ISO date (with or without time) or None when unreadable, like crm_try_date in sql/004."""
+    if not value:
+        return None
+    try:
+        return dt.date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+# --- Query builder ---
+
+class LocalQueryBuilder:
+    """Chainable request against a LocalBackend table, view or function."""
+
+    def __init__(self, backend: LocalBackend, resource: str, is_async: bool = False, rpc_params: Optional[Dict[str, Any]] = None):
+        self._backend = backend
+        self._resource = resource
+        self._is_async = is_async
+        self._rpc_params = rpc_params
+        self._method = 'POST' if rpc_params is not None else 'GET'
+        self._action = 'rpc' if rpc_params is not None else 'select'
+        self._columns = '*'
+        self._count: Optional[str] = None
+        self._payload: Any = None
+        self._on_conflict: Optional[str] = None
+        self._ignore_duplicates = False
+        self._conditions: List[_Condition] = []
+        self._order: List[Tuple[str, bool, Optional[bool]]] = []
+        self._embedded_order: Dict[str, List[Tuple[str, bool, Optional[bool]]]] = {}
+        self._limit: Optional[int] = None
+        self._offset = 0
+        self._single = False
+        self._maybe_single = False
+        self.request = SimpleNamespace(session=None)  # execute_read() may wrap it; unused locally
+
+    # Actions
+    def select(self, *columns: str, count: Optional[str] = None) -> "LocalQueryBuilder":
+        self._columns = ','.join(columns) if columns else '*'  # After a write: the returned columns
+        self._count = count
+        return self
+
+    def insert(self, json_data: Any, **_: Any) -> "LocalQueryBuilder":
+        self._action, self._method, self._payload = 'insert', 'POST', json_data
+        return self
+
+    def upsert(self, json_data: Any, on_conflict: str = '', ignore_duplicates: bool = False, **_: Any) -> "LocalQueryBuilder":
+        self._action, self._method, self._payload = 'upsert', 'POST', json_data
+        self._on_conflict, self._ignore_duplicates = on_conflict or None, ignore_duplicates
+        return self
+
+    def update(self, json_data: Dict[str, Any], **_: Any) -> "LocalQueryBuilder":
+        self._action, self._method, self._payload = 'update', 'PATCH', json_data
+        return self
+
+    def delete(self, **_: Any) -> "LocalQueryBuilder":
+        self._action, self._method = 'delete', 'DELETE'
+        return self
+
+    # Filters
+    def _filter(self, column: str, op: str, value: Any, negate: bool = False) -> "LocalQueryBuilder":
+        self._conditions.append(_Condition(column, op, value, negate=negate))
+        return self
+
+    def eq(self, column: str, value: Any): return self._filter(column, 'eq', value)
+    def neq(self, column: str, value: Any): return self._filter(column, 'neq', value)
+    def gt(self, column: str, value: Any): return self._filter(column, 'gt', value)
+    def gte(self, column: str, value: Any): return self._filter(column, 'gte', value)
+    def lt(self, column: str, value: Any): return self._filter(column, 'lt', value)
+    def lte(self, column: str, value: Any): return self._filter(column, 'lte', value)
+    def like(self, column: str, pattern: str): return self._filter(column, 'like', pattern)
+    def ilike(self, column: str, pattern: str): return self._filter(column, 'ilike', pattern)
+    def is_(self, column: str, value: Any): return self._filter(column, 'is', 'null' if value is None else value)
+    def in_(self, column: str, values: Iterable[Any]): return self._filter(column, 'in', list(values))
+
+    def match(self, query: Dict[str, Any]) -> "LocalQueryBuilder":
+        for column, value in query.items():
+            self.eq(column, value)
+        return self
+
+    def or_(self, filters: str, reference_table: Optional[str] = None) -> "LocalQueryBuilder":
+        self._conditions.append(_Condition(None, 'or', None, children=_parse_logic(filters)))
+        return self
+
+    # Modifiers
+    def order(self, column: str, *, desc: bool = False, nullsfirst: Optional[bool] = None, foreign_table: Optional[str] = None) -> "LocalQueryBuilder":
+        target = self._embedded_order.setdefault(foreign_table, []) if foreign_table else self._order
+        target.append((column, desc, nullsfirst))
+        return self
+
+    def limit(self, size: int, *, foreign_table: Optional[str] = None) -> "LocalQueryBuilder":
+        if foreign_table is None:
+            self._limit = size
+        return self
+
+    def range(self, start: int, end: int, foreign_table: Optional[str] = None) -> "LocalQueryBuilder":
+        if foreign_table is None:
+            self._offset, self._limit = start, end - start + 1
+        return self
+
+    def single(self) -> "LocalQueryBuilder":
+        self._single = True
+        return self
+
+    def maybe_single(self) -> "LocalQueryBuilder":
+        self._maybe_single = True
+        return self
+
+    # Execution
+    def execute(self):
+        if self._is_async:
+            return self._execute_async()
+        started = time.perf_counter()
+        try:
+            response, delay, sent, received = self._run()
+        except APIError:
+            self._account(0, 0, started, status_code=400)  # The failed request still was a round trip
+            raise
+        time.sleep(delay)
+        self._account(sent, received, started)
+        return response
+
+    async def _execute_async(self):
+        started = time.perf_counter()
+        try:
+            response, delay, sent, received = self._run()
+        except APIError:
+            self._account(0, 0, started, status_code=400)
+            raise
+        await asyncio.sleep(delay)
+        self._account(sent, received, started)
+        return response
+
+    def _account(self, sent: int, received: int, started: float, status_code: int = 200) -> None:
+        params = [('select', self._columns)] if self._action == 'select' else []
+        for condition in self._conditions:
+            params.extend(condition.url_params())
+        resource = f"rpc/{self._resource}" if self._action == 'rpc' else self._resource
+        self._backend.record(self._method, resource, params, sent, received, (time.perf_counter() - started) * 1000, status_code)
+
+    def _run(self) -> Tuple[Any, float, int, int]:
+        sent = len(json.dumps(self._rpc_params if self._action == 'rpc' else self._payload, default=str)) if (self._payload is not None or self._action == 'rpc') else 0
+        with self._backend.lock:
+            if self._action == 'rpc':
+                function = self._backend.functions.get(self._resource)
+                if function is None:
+                    raise APIError({'code': 'PGRST202', 'message': f'Could not find the function public.{self._resource}', 'hint': None, 'details': None})
+                with self._backend.statement():
+                    data, count = function(self._rpc_params or {}), None
+            elif self._action == 'select':
+                data, count = self._run_select()
+            else:
+                with self._backend.statement():
+                    data, count = self._run_write(), None
+            data = self._shape_single(data)
+        received = len(json.dumps(data, default=str)) if data else 0
+        return LocalResponse(data, count), self._backend.simulated_delay(sent + received), sent, received
+
+    def _matching_row_ids(self, table: _Table) -> List[int]:
+        # Narrow with a hash index on the first eq / in_ filter, then check every condition
+        candidates: Optional[Iterable[int]] = None
+        for condition in self._conditions:
+            if condition.negate or condition.column is None:
+                continue
+            if condition.op == 'eq':
+                candidates = table.index(condition.column).get(_key(condition.value), set())
+                break
+            if condition.op == 'in':
+                index = table.index(condition.column)
+                candidates = set().union(*(index.get(_key(v), set()) for v in condition.value)) if condition.value else set()
+                break
+        row_ids = sorted(candidates) if candidates is not None else list(table.rows)
+        return [row_id for row_id in row_ids if all(c.matches(table.rows[row_id]) for c in self._conditions)]
+
+    def _run_select(self) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        if self._resource in self._backend.views:
+            rows = [row for row in self._backend.views[self._resource]() if all(c.matches(row) for c in self._conditions)]
+        else:
+            table = self._backend.table(self._resource)
+            rows = [table.rows[row_id] for row_id in self._matching_row_ids(table)]
+        count = len(rows) if self._count else None
+        rows = _sorted_rows(rows, self._order)
+        if self._offset:
+            rows = rows[self._offset:]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return [self._project(self._resource, row, self._columns) for row in rows], count
+
+    def _project(self, resource: str, row: Dict[str, Any], columns: str) -> Dict[str, Any]:
+        items = _split_top_level(columns.replace('\n', ' '))
+        result: Dict[str, Any] = {}
+        for item in items:
+            embedded = re.match(r'^([\w.]+)\s*\((.*)\)$', item, re.DOTALL)
+            if embedded:
+                result[embedded.group(1)] = self._embed(resource, row, embedded.group(1), embedded.group(2))
+            elif item == '*':
+                result.update(row)
+            else:
+                name = _identifier(item)
+                result[name] = row.get(name)
+        return result
+
+    def _embed(self, parent_name: str, parent_row: Dict[str, Any], child_name: str, columns: str) -> Any:
+        backend = self._backend
+        child = backend.table(child_name)
+        # One-to-many: the embedded table references the parent
+        for column, (target, target_column) in child.schema.references.items():
+            if target == parent_name:
+                row_ids = child.index(column).get(_key(parent_row.get(target_column)), set())
+                rows = _sorted_rows([child.rows[r] for r in sorted(row_ids)], self._embedded_order.get(child_name, []))
+                return [self._project(child_name, r, columns) for r in rows]
+        # Many-to-one: the parent references the embedded table
+        for column, (target, target_column) in backend.table(parent_name).schema.references.items():
+            if target == child_name:
+                found = backend._find_one(child_name, target_column, parent_row.get(column))
+                return self._project(child_name, found, columns) if found else None
+        raise APIError({'code': 'PGRST200', 'message': f"Could not find a relationship between '{parent_name}' and '{child_name}'", 'hint': None, 'details': None})
+
+    def _run_write(self) -> List[Dict[str, Any]]:
+        table = self._backend.table(self._resource)
+        if self._action in ('insert', 'upsert'):
+            payload = self._payload if isinstance(self._payload, list) else [self._payload]
+            conflict_columns = tuple(c.strip() for c in self._on_conflict.split(',')) if self._on_conflict else table.schema.primary_key
+            written = []
+            for values in payload:
+                if self._action == 'upsert' and conflict_columns:
+                    existing = table.find_conflict({k: _to_json_value(v) for k, v in values.items()}, conflict_columns)
+                    if existing is not None:
+                        if not self._ignore_duplicates:
+                            written.append(table.update(existing, values))
+                        continue
+                written.append(table.insert(table.with_defaults(values)))
+            return [self._project(self._resource, row, self._columns) for row in written]
+
+        row_ids = self._matching_row_ids(table)
+        if self._action == 'update':
+            return [self._project(self._resource, table.update(row_id, self._payload), self._columns) for row_id in row_ids]
+        return [self._project(self._resource, table.delete(row_id), self._columns) for row_id in row_ids]
+
+    def _shape_single(self, data: Any) -> Any:
+        if not (self._single or self._maybe_single) or not isinstance(data, list):
+            return data
+        if len(data) == 1:
+            return data[0]
+        if self._maybe_single and not data:
+            return None
+        raise APIError({
+            'code': 'PGRST116',
+            'message': 'JSON object requested, multiple (or no) rows returned',
+            'details': f'The result contains {len(data)} rows',
+            'hint': None,
+        })
+
+
+def _sorted_rows(rows: List[Dict[str, Any]], order: List[Tuple[str, bool, Optional[bool]]]) -> List[Dict[str, Any]]:
+    def compare(a: Dict[str, Any], b: Dict[str, Any]) -> int:
+        for column, desc, nullsfirst in order:
+            va, vb = a.get(column), b.get(column)
+            if va is None or vb is None:
+                if va is None and vb is None:
+                    continue
+                nulls_first = desc if nullsfirst is None else nullsfirst  # PostgreSQL default: NULLS LAST for ASC
+                return (-1 if va is None else 1) * (1 if nulls_first else -1)
+            result = _compare(va, vb)
+            if result:
+                return -result if desc else result
+        return 0
+
+    return sorted(rows, key=functools.cmp_to_key(compare)) if order else rows
+
+
+# --- Clients ---
+
+class LocalSupabaseClient:
+    """Drop-in for supabase.Client restricted to table()/from_()/rpc()."""
+
+    _is_async = False
+
+    def __init__(self, backend: Optional[LocalBackend] = None):
+        self.backend = backend or LocalBackend.from_env()
+
+    def table(self, name: str) -> LocalQueryBuilder:
+        return LocalQueryBuilder(self.backend, name, is_async=self._is_async)
+
+    from_ = table
+
+    def rpc(self, name: str, params: Optional[Dict[str, Any]] = None, **_: Any) -> LocalQueryBuilder:
+        return LocalQueryBuilder(self.backend, name, is_async=self._is_async, rpc_params=params or {})
+
+
+class LocalAsyncSupabaseClient(LocalSupabaseClient):
+    """Async flavour: execute() returns an awaitable, as with supabase.AsyncClient."""
+
+    _is_async = True
+
+
+def local_backend_enabled() -> bool:
+    """True when SUPABASE_BACKEND=local."""
+    return os.environ.get('SUPABASE_BACKEND', '').lower() == 'local'
+
+
+_shared_backend: Optional[LocalBackend] = None
+_shared_backend_lock = threading.Lock()
+
+def get_shared_backend() -> LocalBackend:
+    """Process-wide LocalBackend used by the local sync and async clients."""
+    global _shared_backend
+    with _shared_backend_lock:
+        if _shared_backend is None:
+            _shared_backend = LocalBackend.from_env()
+        return _shared_backend
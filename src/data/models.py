@@ -0,0 +1,113 @@
+# src/data/models.py
+
+import json
+from collections.abc import Mapping
+from typing import Any, Dict, Optional, Union
+
+_UNSET = object()
+
+
+def _parse_numeric(value: Any) -> Optional[float]:
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+def _decode_json(raw: Any) -> Dict[str, Any]:
+    if not raw:
+        return {}
+    if isinstance(raw, str):
+        try:
+            return json.loads(raw) or {}
+        except json.JSONDecodeError:
+            return {}
+    return raw
+
+
+class RecalculateResultNotLoaded(LookupError):
+    """recalculate_result was read on a record fetched without recalculate_result_json."""
+
+
+class Proposal(dict):
+    """
+    A row of 'propuestas'.
+
+    A plain dict holding the values exactly as Supabase returns them (dates
+    stay ISO strings), so json.dumps, isinstance(x, dict), st.session_state
+    copies and pd.DataFrame(list_of_proposals) behave as with the raw rows.
+    On top of that, recalculate_result_json is decoded once on first use
+    (`recalculate_result`) and reused by `capital` and `abono`; replacing
+    the column invalidates the decoded copy.
+
+    Rows read by the repository with a lighter projection (no blob) raise
+    RecalculateResultNotLoaded on `recalculate_result` instead of fetching
+    the blob one row at a time; load it for a whole list with
+    supabase_repository.load_recalculate_results. Records built with
+    `coerce` never do I/O (a missing blob reads as empty).
+    """
+    __slots__ = ('_recalc_source', '_recalc', '_strict')
+
+    def __init__(self, *args: Any, **fields: Any):
+        super().__init__(*args, **fields)
+        self._recalc_source: Any = _UNSET
+        self._recalc: Optional[Mapping] = None
+        self._strict = False
+
+    @classmethod
+    def from_row(cls, row: Mapping, strict: bool = False) -> 'Proposal':
+        """
+        Builds a Proposal from a Supabase row (dict). With `strict`, reading
+        recalculate_result on a row without recalculate_result_json raises.
+        """
+        proposal = cls(row)
+        proposal._strict = strict
+        return proposal
+
+    @classmethod
+    def coerce(cls, data: Union['Proposal', Mapping]) -> 'Proposal':
+        """Returns `data` unchanged if it already is a Proposal, else wraps it (no I/O)."""
+        return data if isinstance(data, cls) else cls.from_row(data)
+
+    # --- Decoded JSON & derived values ---
+
+    @property
+    def recalculate_result(self) -> Mapping:
+        """Decoded recalculate_result_json (decoded once; session payloads may carry it decoded as 'recalculate_result')."""
+        if 'recalculate_result_json' in self:
+            source = self['recalculate_result_json']
+            if self._recalc is None or self._recalc_source is not source:
+                self._recalc, self._recalc_source = _decode_json(source), source
+            return self._recalc
+        if 'recalculate_result' in self:
+            return self['recalculate_result'] or {}
+        if self._strict:
+            raise RecalculateResultNotLoaded(
+                f"La propuesta {self.get('proposal_id')!r} se leyó sin recalculate_result_json: usar la proyección "
+                "'liquidation' o 'full', o load_recalculate_results() para cargarlo en una sola consulta."
+            )
+        return {}
+
+    @property
+    def has_recalculate_result(self) -> bool:
+        """False for records read with a projection that omits the blob."""
+        return 'recalculate_result_json' in self or 'recalculate_result' in self or not self._strict
+
+    @property
+    def capital(self) -> float:
+        """Capital from calculo_con_tasa_encontrada, falling back to capital_calculado."""
+        capital = (self.recalculate_result.get('calculo_con_tasa_encontrada') or {}).get('capital')
+        if capital is None:
+            capital = self.get('capital_calculado')
+        return _parse_numeric(capital) or 0.0
+
+    @property
+    def abono(self) -> float:
+        """Disbursed amount from desglose_final_detallado.abono.monto."""
+        abono = ((self.recalculate_result.get('desglose_final_detallado') or {}).get('abono') or {}).get('monto')
+        return _parse_numeric(abono) or 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict copy of the row (for code that checks type(x) is dict)."""
+        return dict(self)
@@ -0,0 +1,82 @@
+# src/data/participes_search.py
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .search_index import TextSearchIndex
+from .supabase_repository import iter_table_pages
+
+TABLE_NAME = "crm_participes"
+
+# Only what the results list shows; the full record is read when one is opened
+_LIST_COLUMNS = 'id, documento_identidad, nombre_completo, email'
+
+
+class ParticipeSearchEngine:
+    """
+    Process-wide search over crm_participes for Gestión de Partícipes.
+
+    Keeps a TextSearchIndex of accent-folded names (prefix + fuzzy matching)
+    and document numbers (prefix), plus a compact tuple per partícipe for the
+    results list. Loaded once by keyset paging and reloaded after ttl_seconds;
+    saves made from the page update it in place with `upsert`.
+    """
+
+    def __init__(self, ttl_seconds: float = 600):
+        self.ttl_seconds = ttl_seconds
+        self._index: Optional[TextSearchIndex] = None
+        self._rows: Dict[Any, Tuple[str, str, str]] = {}  # id -> (documento, nombre, email)
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self) -> Tuple[TextSearchIndex, Dict[Any, Tuple[str, str, str]]]:
+        index, rows = self._index, self._rows
+        if index is not None and time.monotonic() - self._loaded_at < self.ttl_seconds:
+            return index, rows
+        with self._lock:
+            if self._index is not None and time.monotonic() - self._loaded_at < self.ttl_seconds:
+                return self._index, self._rows
+            index = TextSearchIndex()
+            rows: Dict[Any, Tuple[str, str, str]] = {}
+            for page in iter_table_pages(TABLE_NAME, columns=_LIST_COLUMNS, key='id'):
+                for row in page:
+                    rows[row['id']] = self._compact(row)
+                    index.add(row['id'], row.get('nombre_completo'), codes=[row.get('documento_identidad')])
+            self._index, self._rows, self._loaded_at = index, rows, time.monotonic()
+            return index, rows
+
+    @staticmethod
+    def _compact(row: Dict[str, Any]) -> Tuple[str, str, str]:
+        return (row.get('documento_identidad') or '', row.get('nombre_completo') or '', row.get('email') or '')
+
+    def search(self, query: str, page: int = 0, page_size: int = 25) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Returns (page of results ranked by relevance, total matches).
+        Each result has id, documento_identidad, nombre_completo and email.
+        """
+        index, rows = self._ensure_loaded()
+        ids, total = index.search(query, limit=page_size, offset=page * page_size)
+        results = []
+        for participe_id in ids:
+            documento, nombre, email = rows[participe_id]
+            results.append({'id': participe_id, 'documento_identidad': documento, 'nombre_completo': nombre, 'email': email})
+        return results, total
+
+    def upsert(self, row: Dict[str, Any]) -> None:
+        """Indexes a created/updated partícipe (no-op until the index is loaded)."""
+        if self._index is None or not row.get('id'):
+            return
+        with self._lock:
+            self._rows[row['id']] = self._compact(row)
+            self._index.add(row['id'], row.get('nombre_completo'), codes=[row.get('documento_identidad')])
+
+    def invalidate(self) -> None:
+        """Forces a full reload on the next search (e.g. after a bulk migration)."""
+        with self._lock:
+            self._index = None
+            self._rows = {}
+
+
+# Shared by every session of the process
+participes_search_engine = ParticipeSearchEngine()
@@ -0,0 +1,145 @@
+# src/data/repository_common.py
+
+import datetime as dt
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+from .cache import TTLCache
+from .models import Proposal
+
+# --- Shared Query Shapes ---
+# Column profiles, filters, caches and row/payload builders used by both the
+# sync repository (supabase_repository.py) and its async mirror
+# (supabase_async.py), so the two build the same queries and return the same
+# shapes.
+
+Ledger = Dict[str, Any]  # {'resumen': Optional[dict], 'eventos': List[dict]}
+
+# --- Projection Profiles for 'propuestas' ---
+# Column sets shipped by the proposal readers. Only 'liquidation' and 'full'
+# carry the multi-KB recalculate_result_json; records read with the other
+# profiles raise on Proposal.recalculate_result until the blob is loaded for
+# the whole list with load_recalculate_results (one query per chunk, no N+1).
+_PROPOSAL_LIST_COLUMNS = (
+    'proposal_id, identificador_lote, estado, emisor_nombre, emisor_ruc, aceptante_nombre, aceptante_ruc, '
+    'numero_factura, monto_neto_factura, moneda_factura, fecha_propuesta'
+)
+PROPOSAL_PROJECTIONS: Dict[str, str] = {
+    'list': _PROPOSAL_LIST_COLUMNS,
+    'approval': _PROPOSAL_LIST_COLUMNS + (
+        ', monto_total_factura, fecha_emision_factura, plazo_credito_dias, fecha_desembolso_factoring, '
+        'tasa_de_avance, interes_mensual, interes_moratorio, fecha_pago_calculada, plazo_operacion_calculado, '
+        'capital_calculado, anexo_number, contract_number'
+    ),
+    'liquidation': _PROPOSAL_LIST_COLUMNS + (
+        ', fecha_desembolso_factoring, fecha_pago_calculada, interes_mensual, interes_moratorio, '
+        'capital_calculado, anexo_number, contract_number, recalculate_result_json'
+    ),
+    'full': '*',
+}
+
+# Estados relevant for liquidation. Broad OR filter to catch 'EN PROCESO - Caso 4',
+# 'LIQUIDADO - Caso 2', etc. Syntax: comma separated filters inside or_() string.
+DISBURSED_ESTADO_FILTER = 'estado.eq.DESEMBOLSADA,estado.eq.DESEMBOLSADO,estado.ilike.%EN PROCESO%,estado.ilike.%LIQUIDADO%,estado.ilike.%CON SALDO%'
+
+# IDs per `in_` filter; keeps the PostgREST URL well below server limits.
+IN_CHUNK_SIZE = 100
+
+# Events per append RPC call (append_liquidacion_eventos / append_desembolso_eventos)
+EVENT_BATCH_SIZE = 500
+
+# --- EMISORES.ACEPTANTES Read-Through Cache ---
+# Full rows keyed by RUC (None = RUC not registered). Shared by
+# get_razon_social_by_ruc, get_signatory_data_by_ruc, get_financial_conditions
+# and the async get_emisor_row; filled in bulk by prefetch_emisores and
+# invalidated by create/update_emisor_deudor. Readers hand out copies, never
+# the cached dicts, so a caller editing its row cannot corrupt the cache.
+EMISOR_CACHE = TTLCache(max_size=4096, ttl_seconds=300)
+
+# --- Proposals ---
+
+def proposal_columns(projection: str) -> str:
+    """Resolves a projection profile name to its PostgREST column list."""
+    try:
+        return PROPOSAL_PROJECTIONS[projection]
+    except KeyError:
+        raise ValueError(f"Unknown projection '{projection}'. Expected one of: {', '.join(PROPOSAL_PROJECTIONS)}")
+
+def to_proposals(rows: Optional[List[Dict[str, Any]]]) -> List[Proposal]:
+    """Wraps Supabase rows from 'propuestas' into Proposal records."""
+    return [Proposal.from_row(row, strict=True) for row in rows] if rows else []
+
+# --- Liquidation Ledgers ---
+
+def empty_ledger() -> Ledger:
+    return {'resumen': None, 'eventos': []}
+
+class LedgerLoadError(Exception):
+    """
+    Some chunks of a ledger load failed, so their proposals are unknown rather
+    than empty. `ledgers` holds the ones that did load; `failed_ids` the rest.
+    """
+
+    def __init__(self, failed_ids: List[str], ledgers: Dict[str, Ledger]):
+        super().__init__(f"No se pudieron cargar las liquidaciones de {len(failed_ids)} propuesta(s)")
+        self.failed_ids = failed_ids
+        self.ledgers = ledgers
+
+def ledger_query(supabase: Any, proposal_ids: List[str]) -> Any:
+    """
+    One joined request (resumen + embedded eventos ordered by orden_evento)
+    for a chunk of proposal IDs; works with the sync and the async client.
+    """
+    return supabase.table('liquidaciones_resumen').select(
+        '*, liquidacion_eventos(*)'
+    ).in_('proposal_id', proposal_ids).order('orden_evento', desc=False, foreign_table='liquidacion_eventos')
+
+def ledgers_from_rows(proposal_ids: Iterable[str], rows: Optional[List[Dict[str, Any]]]) -> Dict[str, Ledger]:
+    """
+    Groups the rows of `ledger_query` by proposal. Every ID in `proposal_ids`
+    is present; IDs without a resumen get an empty ledger.
+    """
+    ledgers: Dict[str, Ledger] = {pid: empty_ledger() for pid in proposal_ids}
+    for row in rows or []:
+        pid = row.get('proposal_id')
+        if pid not in ledgers or ledgers[pid]['resumen'] is not None:
+            continue  # Keep the first resumen, as get_liquidacion_resumen does
+        eventos = row.pop('liquidacion_eventos', None) or []
+        ledgers[pid] = {'resumen': row, 'eventos': eventos}
+    return ledgers
+
+def liquidacion_evento_payload(evento: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-ready liquidacion_eventos entry for the append RPC."""
+    fecha_evento = evento['fecha_evento']
+    return {
+        "liquidacion_resumen_id": evento['liquidacion_resumen_id'],
+        "tipo_evento": evento['tipo_evento'],
+        "fecha_evento": fecha_evento.isoformat() if isinstance(fecha_evento, dt.date) else fecha_evento,
+        "monto_recibido": evento.get('monto_recibido'),
+        "dias_diferencia": evento.get('dias_diferencia'),
+        "resultado_json": json.dumps(evento.get('resultado_json') or {}),
+    }
+
+def desembolso_evento_payload(evento: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-ready desembolso_eventos entry for the append RPC."""
+    fecha_evento = evento['fecha_evento']
+    return {
+        "desembolso_resumen_id": evento['desembolso_resumen_id'],
+        "tipo_evento": evento['tipo_evento'],
+        "fecha_evento": fecha_evento.isoformat() if isinstance(fecha_evento, dt.date) else fecha_evento,
+        "monto_desembolsado": evento.get('monto_desembolsado'),
+    }
+
+# --- Auditing ---
+
+def audit_row(usuario_id: str, entidad_id: str, accion: str, estado_anterior: str, estado_nuevo: str, detalles_adicionales: dict) -> Dict[str, Any]:
+    """Builds one auditoria_eventos row."""
+    return {
+        "usuario_id": usuario_id,
+        "entidad_id": entidad_id,
+        "accion": accion,
+        "estado_anterior": estado_anterior,
+        "estado_nuevo": estado_nuevo,
+        "detalles_adicionales": json.dumps(detalles_adicionales),
+        "timestamp": dt.datetime.now().isoformat()
+    }
@@ -0,0 +1,204 @@
+# src/data/search_index.py
+
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+# Scores per query token (a document's score is the sum over query tokens)
+_SCORE_EXACT = 3.0
+_SCORE_PREFIX = 2.0
+_SCORE_FUZZY = 1.5   # Multiplied by the trigram similarity (0-1]
+_SCORE_CODE_EXACT = 100.0
+_SCORE_CODE_PREFIX = 50.0
+
+_FUZZY_MIN_SIMILARITY = 0.4
+_FUZZY_MIN_TOKEN_LENGTH = 3
+
+
+def fold_text(text: Any) -> str:
+    """Lowercases, strips accents and collapses punctuation: 'Compañía S.A.C.' -> 'compania s a c'."""
+    if text is None:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(' ', stripped.lower()).strip()
+
+def _trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _prefix_range(sorted_values: List[str], prefix: str) -> List[str]:
+    start = bisect.bisect_left(sorted_values, prefix)
+    end = bisect.bisect_left(sorted_values, prefix + '\uffff')
+    return sorted_values[start:end]
+
+
+class TextSearchIndex:
+    """
+    In-process ranked search over short texts (company or person names) plus
+    exact "codes" (RUC, DNI, ...).
+
+    - Names are accent/case folded and split into tokens (inverted index).
+    - Each query token matches documents by exact token, token prefix, or -
+      when nothing matches literally - trigram similarity (typos).
+      All query tokens must match (AND); scores add up.
+    - Codes match by exact value or prefix and rank above name matches.
+
+    Documents are added/replaced/removed incrementally; sorted token and code
+    lists for prefix lookups are rebuilt lazily on the next search.
+
+    Example:
+        index = TextSearchIndex()
+        index.add('20100047218', 'Banco de Crédito del Perú', codes=['20100047218'])
+        ids, total = index.search('credito peru', limit=10)
+    """
+
+    def __init__(self):
+        self._docs: Dict[Hashable, Tuple[Tuple[str, ...], Tuple[str, ...], str]] = {}
+        self._token_docs: Dict[str, Set[Hashable]] = {}
+        self._code_docs: Dict[str, Set[Hashable]] = {}
+        self._trigram_tokens: Dict[str, Set[str]] = {}
+        self._sorted_tokens: List[str] = []
+        self._sorted_codes: List[str] = []
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self._docs
+
+    def add(self, doc_id: Hashable, text: Any, codes: Iterable[Any] = ()) -> None:
+        """Indexes (or re-indexes) a document."""
+        folded = fold_text(text)
+        tokens = tuple(dict.fromkeys(folded.split()))
+        folded_codes = tuple(dict.fromkeys(c for c in (fold_text(code).replace(' ', '') for code in codes) if c))
+        with self._lock:
+            if doc_id in self._docs:
+                self._remove_locked(doc_id)
+            self._docs[doc_id] = (tokens, folded_codes, folded)
+            for token in tokens:
+                postings = self._token_docs.get(token)
+                if postings is None:
+                    postings = self._token_docs[token] = set()
+                    for gram in _trigrams(token):
+                        self._trigram_tokens.setdefault(gram, set()).add(token)
+                postings.add(doc_id)
+            for code in folded_codes:
+                self._code_docs.setdefault(code, set()).add(doc_id)
+            self._dirty = True
+
+    def remove(self, doc_id: Hashable) -> None:
+        """Removes a document if present."""
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id: Hashable) -> None:
+        entry = self._docs.pop(doc_id, None)
+        if entry is None:
+            return
+        tokens, codes, _ = entry
+        for token in tokens:
+            postings = self._token_docs.get(token)
+            if postings is None:
+                continue
+            postings.discard(doc_id)
+            if not postings:
+                del self._token_docs[token]
+                for gram in _trigrams(token):
+                    grams = self._trigram_tokens.get(gram)
+                    if grams is not None:
+                        grams.discard(token)
+                        if not grams:
+                            del self._trigram_tokens[gram]
+        for code in codes:
+            postings = self._code_docs.get(code)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self._code_docs[code]
+        self._dirty = True
+
+    def _refresh_sorted_locked(self) -> None:
+        if self._dirty:
+            self._sorted_tokens = sorted(self._token_docs)
+            self._sorted_codes = sorted(self._code_docs)
+            self._dirty = False
+
+    def _token_scores(self, query_token: str, fuzzy: bool) -> Dict[Hashable, float]:
+        """Best score per document for one query token."""
+        scores: Dict[Hashable, float] = {}
+        for token in _prefix_range(self._sorted_tokens, query_token):
+            score = _SCORE_EXACT if token == query_token else _SCORE_PREFIX
+            for doc_id in self._token_docs[token]:
+                if scores.get(doc_id, 0.0) < score:
+                    scores[doc_id] = score
+
+        if not scores and fuzzy and len(query_token) >= _FUZZY_MIN_TOKEN_LENGTH:
+            query_grams = _trigrams(query_token)
+            shared: Dict[str, int] = {}
+            for gram in query_grams:
+                for token in self._trigram_tokens.get(gram, ()):
+                    shared[token] = shared.get(token, 0) + 1
+            for token, common in shared.items():
+                similarity = common / (len(query_grams) + len(token) + 1 - common)  # Jaccard over trigrams
+                if similarity < _FUZZY_MIN_SIMILARITY:
+                    continue
+                score = _SCORE_FUZZY * similarity
+                for doc_id in self._token_docs[token]:
+                    if scores.get(doc_id, 0.0) < score:
+                        scores[doc_id] = score
+        return scores
+
+    def search(self, query: Any, limit: Optional[int] = 20, offset: int = 0, fuzzy: bool = True) -> Tuple[List[Hashable], int]:
+        """
+        Ranked search.
+
+        Args:
+            query: Free text (name fragments and/or a code prefix)
+            limit: Page size (None = all matches)
+            offset: Number of ranked matches to skip
+            fuzzy: Allow trigram matching for tokens without literal matches
+
+        Returns:
+            Tuple (doc_ids for the requested page, total number of matches)
+        """
+        folded = fold_text(query)
+        query_tokens = list(dict.fromkeys(folded.split()))
+        if not query_tokens:
+            return [], 0
+
+        with self._lock:
+            self._refresh_sorted_locked()
+
+            totals: Optional[Dict[Hashable, float]] = None
+            for query_token in query_tokens:
+                token_scores = self._token_scores(query_token, fuzzy)
+                if totals is None:
+                    totals = token_scores
+                else:
+                    totals = {doc_id: score + token_scores[doc_id] for doc_id, score in totals.items() if doc_id in token_scores}
+                if not totals:
+                    break
+            totals = totals or {}
+
+            code_query = folded.replace(' ', '')
+            for code in _prefix_range(self._sorted_codes, code_query):
+                score = _SCORE_CODE_EXACT if code == code_query else _SCORE_CODE_PREFIX
+                for doc_id in self._code_docs[code]:
+                    totals[doc_id] = max(totals.get(doc_id, 0.0), score)
+
+            rank_key = lambda item: (-item[1], self._docs[item[0]][2])
+            if limit is None:
+                ranked = sorted(totals.items(), key=rank_key)[offset:]
+            else:
+                # Only the requested page needs ordering
+                ranked = heapq.nsmallest(offset + limit, totals.items(), key=rank_key)[offset:]
+
+        return [doc_id for doc_id, _ in ranked], len(totals)
@@ -0,0 +1,409 @@
+# src/data/supabase_async.py
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Awaitable, Dict, Iterable, List, Optional
+
+from supabase import AsyncClient
+
+from .supabase_client import create_async_supabase_client
+from src.utils.latency import measure_latency, record_caught_error
+from src.utils.query_stats import bind_query_stats, current_query_stats
+from src.utils.tracing import bind_trace, current_span, current_trace
+from .models import Proposal
+from .repository_common import (
+    DISBURSED_ESTADO_FILTER,
+    EMISOR_CACHE,
+    EVENT_BATCH_SIZE,
+    IN_CHUNK_SIZE,
+    Ledger,
+    LedgerLoadError,
+    audit_row,
+    desembolso_evento_payload,
+    empty_ledger,
+    ledger_query,
+    ledgers_from_rows,
+    liquidacion_evento_payload,
+    proposal_columns,
+    to_proposals,
+)
+from .supabase_repository import add_audit_events as sync_add_audit_events
+
+# --- Async Repository ---
+# Async mirrors of the main supabase_repository reads and writes, for screens
+# that need several independent queries. Everything runs on one background
+# event loop (and one AsyncClient) per process; Streamlit scripts, which are
+# synchronous, submit work to it with `run_concurrently`:
+#
+#     proposal, ledgers, desembolso = run_concurrently(
+#         get_proposal_details_by_id(pid),
+#         get_liquidation_ledgers([pid]),
+#         get_desembolso_resumen(pid),
+#     )
+#
+# so the screen waits about as long as the slowest query instead of the sum.
+# Functions keep the error contract of their sync counterparts (print and
+# return a default for reads, raise for writes; ledger loads raise
+# LedgerLoadError). The ledger memo of `liquidation_ledger_scope` is not used here.
+# Public coroutines are measured with measure_latency under the operation
+# names of their sync counterparts, so both show up in the same histograms.
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+_async_client: Optional[AsyncClient] = None
+_runtime_lock = threading.Lock()
+
+
+def _ensure_runtime() -> asyncio.AbstractEventLoop:
+    """Starts the background event loop and its AsyncClient on first use."""
+    global _loop, _loop_thread, _async_client
+    if _async_client is not None:
+        return _loop
+    with _runtime_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name='supabase-async-loop', daemon=True)
+            thread.start()
+            _loop, _loop_thread = loop, thread
+        if _async_client is None:
+            _async_client = asyncio.run_coroutine_threadsafe(create_async_supabase_client(), _loop).result()
+    return _loop
+
+
+def get_async_supabase_client() -> AsyncClient:
+    """Returns the shared AsyncClient (only usable from coroutines run through this module)."""
+    _ensure_runtime()
+    return _async_client
+
+
+def run_concurrently(*aws: Awaitable[Any], timeout: Optional[float] = None, return_exceptions: bool = False) -> List[Any]:
+    """
+    Runs awaitables concurrently on the repository event loop and blocks until
+    all of them finish, like `asyncio.gather`, returning results in order.
+
+    Args:
+        *aws: Coroutines from this module (or any coroutine using its client)
+        timeout: Seconds to wait for the whole group (None = no limit); on timeout
+            the pending queries are cancelled and TimeoutError is raised
+        return_exceptions: Return exceptions as results instead of raising the first one
+
+    Returns:
+        List with one result per awaitable
+    """
+    loop = _ensure_runtime()
+    if threading.current_thread() is _loop_thread:
+        raise RuntimeError("run_concurrently() cannot be called from the repository event loop; await the coroutines instead.")
+
+    # Queries made on the loop thread count toward the caller's rerun stats and
+    # are traced as children of the caller's open span
+    stats = current_query_stats()
+    trace, parent = current_trace(), current_span()
+
+    async def _gather() -> List[Any]:
+        bind_query_stats(stats)
+        bind_trace(trace, parent)
+        return list(await asyncio.gather(*aws, return_exceptions=return_exceptions))
+
+    future = asyncio.run_coroutine_threadsafe(_gather(), loop)
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        # Otherwise the queries keep running (and holding connections) on the loop
+        future.cancel()
+        raise
+
+
+def run(aw: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """Runs a single awaitable on the repository event loop and returns its result."""
+    return run_concurrently(aw, timeout=timeout)[0]
+
+# --- Proposals ---
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Proposal Details")
+async def get_proposal_details_by_id(proposal_id: str, projection: str = 'full') -> Optional[Proposal]:
+    """Async `supabase_repository.get_proposal_details_by_id`."""
+    columns = proposal_columns(projection)
+    supabase = get_async_supabase_client()
+    try:
+        response = await supabase.table('propuestas').select(columns).eq('proposal_id', proposal_id).single().execute()
+        return Proposal.from_row(response.data, strict=True) if response.data else None
+    except Exception as e:
+        print(f"[ERROR en async get_proposal_details_by_id]: {e}")
+        record_caught_error(e)
+        return None
+
+async def _get_proposals_matching(estado_filter: str, projection: str, caller: str) -> List[Proposal]:
+    # estado_filter uses the or_() syntax, e.g. 'estado.eq.ACTIVO'
+    columns = proposal_columns(projection)
+    supabase = get_async_supabase_client()
+    try:
+        response = await supabase.table('propuestas').select(columns).or_(estado_filter).execute()
+        return to_proposals(response.data)
+    except Exception as e:
+        print(f"[ERROR en async {caller}]: {e}")
+        record_caught_error(e)
+        return []
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List Pending Proposals")
+async def get_active_proposals_for_approval(projection: str = 'full') -> List[Proposal]:
+    """Async `supabase_repository.get_active_proposals_for_approval`."""
+    return await _get_proposals_matching('estado.eq.ACTIVO', projection, 'get_active_proposals_for_approval')
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List Approved Proposals")
+async def get_approved_proposals_for_disbursement(projection: str = 'full') -> List[Proposal]:
+    """Async `supabase_repository.get_approved_proposals_for_disbursement`."""
+    return await _get_proposals_matching('estado.eq.APROBADO', projection, 'get_approved_proposals_for_disbursement')
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List Disbursed Proposals")
+async def get_all_disbursed_proposals(projection: str = 'full') -> List[Proposal]:
+    """Async `supabase_repository.get_all_disbursed_proposals`."""
+    return await _get_proposals_matching(DISBURSED_ESTADO_FILTER, projection, 'get_all_disbursed_proposals')
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List Proposals By Lote")
+async def get_proposals_by_lote(lote_id: str, estado_filter: str = 'APROBADO') -> List[Proposal]:
+    """Async `supabase_repository.get_proposals_by_lote`."""
+    supabase = get_async_supabase_client()
+    try:
+        response = await supabase.table('propuestas').select(
+            'proposal_id, emisor_nombre, aceptante_nombre, monto_neto_factura, moneda_factura, anexo_number, contract_number, recalculate_result_json, estado'
+        ).eq('identificador_lote', lote_id).eq('estado', estado_filter).execute()
+        return to_proposals(response.data)
+    except Exception as e:
+        print(f"[ERROR en async get_proposals_by_lote]: {e}")
+        record_caught_error(e)
+        return []
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Update Proposal Status")
+async def update_proposal_status(proposal_id: str, status: str) -> None:
+    """Async `supabase_repository.update_proposal_status`."""
+    supabase = get_async_supabase_client()
+    try:
+        await supabase.table('propuestas').update({'estado': status}).eq('proposal_id', proposal_id).execute()
+    except Exception as e:
+        print(f"[ERROR en async update_proposal_status]: {e}")
+        raise
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Update Proposal Status Bulk")
+async def update_proposal_status_bulk(
+    proposal_ids: Iterable[str],
+    from_state: str,
+    to_state: str,
+    user: str,
+    accion: str = 'CAMBIO_ESTADO',
+    detalles_adicionales: Optional[dict] = None
+) -> List[str]:
+    """
+    Async `supabase_repository.update_proposal_status_bulk`; the conditional
+    UPDATE of every chunk of IDs is sent concurrently.
+    """
+    supabase = get_async_supabase_client()
+    unique_ids = list(dict.fromkeys(pid for pid in proposal_ids if pid))
+    chunks = [unique_ids[start:start + IN_CHUNK_SIZE] for start in range(0, len(unique_ids), IN_CHUNK_SIZE)]
+    responses = await asyncio.gather(
+        *(
+            supabase.table('propuestas').update({'estado': to_state}).in_('proposal_id', chunk).eq('estado', from_state).execute()
+            for chunk in chunks
+        ),
+        return_exceptions=True
+    )
+
+    changed: List[str] = []
+    error: Optional[BaseException] = None
+    for response in responses:
+        if isinstance(response, BaseException):
+            error = error or response
+            continue
+        changed.extend(row['proposal_id'] for row in response.data or [])
+
+    # Audit whatever changed, even if some chunk failed
+    if changed:
+        await add_audit_events([
+            audit_row(user, pid, accion, from_state, to_state, detalles_adicionales or {})
+            for pid in changed
+        ])
+    if error is not None:
+        print(f"[ERROR en async update_proposal_status_bulk]: {error}")
+        raise error
+    return changed
+
+# --- Liquidation / Disbursement ---
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Liquidacion Resumen", sample_rate=0.1)
+async def get_liquidacion_resumen(proposal_id: str) -> Optional[Dict[str, Any]]:
+    """Async `supabase_repository.get_liquidacion_resumen` (no ledger memo)."""
+    supabase = get_async_supabase_client()
+    try:
+        response = await supabase.table('liquidaciones_resumen').select('*').eq('proposal_id', proposal_id).limit(1).execute()
+        return response.data[0] if response.data else None
+    except Exception as e:
+        print(f"[ERROR en async get_liquidacion_resumen]: {e}")
+        record_caught_error(e)
+        return None
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Load Liquidation Ledgers")
+async def get_liquidation_ledgers(proposal_ids: Iterable[str]) -> Dict[str, Ledger]:
+    """
+    Async `supabase_repository.get_liquidation_ledgers`: one joined query
+    (resumen + embedded eventos) per chunk of IDs, all chunks in flight at once.
+    Every requested ID is present; missing ones get an empty ledger. Raises
+    LedgerLoadError if any chunk failed, like the sync version.
+    """
+    supabase = get_async_supabase_client()
+    unique_ids = list(dict.fromkeys(pid for pid in proposal_ids if pid))
+    chunks = [unique_ids[start:start + IN_CHUNK_SIZE] for start in range(0, len(unique_ids), IN_CHUNK_SIZE)]
+    responses = await asyncio.gather(
+        *(ledger_query(supabase, chunk).execute() for chunk in chunks),
+        return_exceptions=True
+    )
+
+    ledgers: Dict[str, Ledger] = {}
+    failed_ids: List[str] = []
+    first_error: Optional[BaseException] = None
+    for chunk, response in zip(chunks, responses):
+        if isinstance(response, BaseException):
+            print(f"[ERROR en async get_liquidation_ledgers]: {response}")
+            record_caught_error(response)
+            failed_ids.extend(chunk)
+            first_error = first_error or response
+            continue
+        ledgers.update(ledgers_from_rows(chunk, response.data))
+    if failed_ids:
+        raise LedgerLoadError(failed_ids, ledgers) from first_error
+    return ledgers
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Liquidacion Eventos", sample_rate=0.1)
+async def get_liquidacion_eventos(proposal_id: str) -> List[Dict[str, Any]]:
+    """Async `supabase_repository.get_liquidacion_eventos`."""
+    ledger = (await get_liquidation_ledgers([proposal_id])).get(proposal_id)
+    return ledger['eventos'] if ledger else []
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Desembolso Resumen")
+async def get_desembolso_resumen(proposal_id: str) -> Optional[Dict[str, Any]]:
+    """Async `supabase_repository.get_desembolso_resumen`."""
+    supabase = get_async_supabase_client()
+    try:
+        response = await supabase.table('desembolsos_resumen').select('*').eq('proposal_id', proposal_id).limit(1).execute()
+        return response.data[0] if response.data else None
+    except Exception as e:
+        print(f"[ERROR en async get_desembolso_resumen]: {e}")
+        record_caught_error(e)
+        return None
+
+async def _append_eventos(rpc_name: str, eventos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Batches go one after another so orden_evento keeps the order of `eventos`
+    supabase = get_async_supabase_client()
+    inserted: List[Dict[str, Any]] = []
+    for start in range(0, len(eventos), EVENT_BATCH_SIZE):
+        response = await supabase.rpc(rpc_name, {'p_eventos': eventos[start:start + EVENT_BATCH_SIZE]}).execute()
+        inserted.extend(response.data or [])
+    return inserted
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Append Liquidacion Eventos")
+async def append_liquidacion_eventos(eventos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Async `supabase_repository.append_liquidacion_eventos`."""
+    try:
+        return await _append_eventos('append_liquidacion_eventos', [liquidacion_evento_payload(e) for e in eventos])
+    except Exception as e:
+        print(f"[ERROR en async append_liquidacion_eventos]: {e}")
+        raise
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Append Desembolso Eventos")
+async def append_desembolso_eventos(eventos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Async `supabase_repository.append_desembolso_eventos`."""
+    try:
+        return await _append_eventos('append_desembolso_eventos', [desembolso_evento_payload(e) for e in eventos])
+    except Exception as e:
+        print(f"[ERROR en async append_desembolso_eventos]: {e}")
+        raise
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Load Proposal Detail")
+async def get_proposal_detail(proposal_id: str, projection: str = 'full') -> Dict[str, Any]:
+    """
+    Everything a proposal detail screen shows, fetched concurrently.
+
+    Returns:
+        Dict with 'proposal' (Proposal or None), 'liquidacion' (Ledger) and
+        'desembolso' (resumen dict or None)
+
+    Raises:
+        LedgerLoadError: if the liquidation ledger could not be read
+    """
+    proposal, ledgers, desembolso = await asyncio.gather(
+        get_proposal_details_by_id(proposal_id, projection),
+        get_liquidation_ledgers([proposal_id]),
+        get_desembolso_resumen(proposal_id),
+    )
+    return {
+        'proposal': proposal,
+        'liquidacion': ledgers.get(proposal_id) or empty_ledger(),
+        'desembolso': desembolso,
+    }
+
+# --- Emisores ---
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Emisor Row", sample_rate=0.1)
+async def get_emisor_row(ruc: Any) -> Optional[Dict[str, Any]]:
+    """
+    Async read-through lookup of an EMISORES.ACEPTANTES row, sharing the
+    RUC cache of the sync repository. Returns None if not registered or on errors.
+    The row is a copy of the cached one.
+    """
+    clean_ruc = str(ruc).strip()
+    hit, row = EMISOR_CACHE.lookup(clean_ruc)
+    if hit:
+        return dict(row) if row is not None else None
+
+    supabase = get_async_supabase_client()
+    try:
+        response = await supabase.table('EMISORES.ACEPTANTES').select('*').eq('RUC', clean_ruc).limit(1).execute()
+    except Exception as e:
+        print(f"[ERROR en async get_emisor_row]: {e}")
+        record_caught_error(e)
+        return None
+    row = response.data[0] if response.data else None
+    EMISOR_CACHE.set(clean_ruc, row)
+    return dict(row) if row is not None else None
+
+# --- Auditing ---
+
+async def add_audit_events(eventos: List[Dict[str, Any]]) -> None:
+    """Async `supabase_repository.add_audit_events` (queued on the shared audit writer)."""
+    sync_add_audit_events(eventos)
+
+# --- Users and Permissions ---
+
+async def _select_all(table: str, columns: str, order: Optional[str], caller: str) -> List[Dict[str, Any]]:
+    supabase = get_async_supabase_client()
+    try:
+        query = supabase.table(table).select(columns)
+        if order:
+            query = query.order(order)
+        response = await query.execute()
+        return response.data if response.data else []
+    except Exception as e:
+        print(f"[ERROR in async {caller}]: {e}")
+        record_caught_error(e)
+        return []
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List Modules")
+async def get_all_modules() -> List[Dict[str, Any]]:
+    """Async `supabase_repository.get_all_modules`."""
+    return await _select_all('modules', '*', 'id', 'get_all_modules')
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List Authorized Users")
+async def get_all_authorized_users() -> List[Dict[str, Any]]:
+    """Async `supabase_repository.get_all_authorized_users`."""
+    return await _select_all('authorized_users', '*', None, 'get_all_authorized_users')
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List User Module Access")
+async def get_all_user_module_access() -> List[Dict[str, Any]]:
+    """All user_module_access rows (user_id, module_id, hierarchy_level)."""
+    return await _select_all('user_module_access', 'user_id, module_id, hierarchy_level', None, 'get_all_user_module_access')
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Permissions Matrix")
+async def get_full_permissions_matrix() -> List[Dict[str, Any]]:
+    """Async `supabase_repository.get_full_permissions_matrix` (reads v_permissions_matrix)."""
+    return await _select_all(
+        'v_permissions_matrix', 'module_id, module_name, super_user, principal, secondary', 'module_id', 'get_full_permissions_matrix'
+    )
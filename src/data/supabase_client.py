@@ -1,58 +1,222 @@
 # src/data/supabase_client.py
 
 import os
-from supabase import create_client, Client
-from typing import Optional
+import random
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+import httpx
+from supabase import create_client, Client, ClientOptions, acreate_client, AsyncClient, AsyncClientOptions
 from dotenv import load_dotenv
 
+from src.utils.query_stats import (
+    httpx_request_hook, httpx_response_hook, async_httpx_request_hook, async_httpx_response_hook
+)
+from .local_backend import LocalSupabaseClient, LocalAsyncSupabaseClient, get_shared_backend, local_backend_enabled
+
 # --- Singleton instance ---
 _supabase_client_instance: Optional[Client] = None
+_supabase_client_lock = threading.Lock()
 
-def get_supabase_client() -> Client:
+# --- HTTP Transport Settings ---
+# One pooled keep-alive httpx transport is shared by every request of the
+# process, so repeated repository calls reuse warm (already TLS-negotiated)
+# connections. Each setting can be overridden with the environment variable
+# of the same name.
+#
+# HTTP/2 is optional: it is used (one multiplexed connection instead of a
+# pool of HTTP/1.1 ones) only when the `h2` package is installed
+# (pip install h2, or httpx[http2]); without it httpx speaks HTTP/1.1.
+_TRANSPORT_DEFAULTS = {
+    'SUPABASE_HTTP_POOL_SIZE': 20,          # Max simultaneous connections
+    'SUPABASE_HTTP_KEEPALIVE': 10,          # Idle connections kept open
+    'SUPABASE_HTTP_KEEPALIVE_EXPIRY': 60.0, # Seconds an idle connection is kept
+    'SUPABASE_HTTP_CONNECT_TIMEOUT': 5.0,   # Seconds to open a connection
+    'SUPABASE_HTTP_TIMEOUT': 30.0,          # Default read/write timeout per request
+    'SUPABASE_READ_RETRIES': 2,             # Extra attempts for idempotent reads
+}
+_RETRY_BASE_DELAY = 0.2   # Seconds; doubled per attempt, with full jitter
+_RETRY_MAX_DELAY = 2.0
+
+def _transport_setting(name: str) -> Any:
+    default = _TRANSPORT_DEFAULTS[name]
+    raw = os.environ.get(name)
+    if raw is None:
+        return default
+    try:
+        return type(default)(raw)
+    except ValueError:
+        print(f"[WARN] Valor inválido para {name}: '{raw}'. Usando {default}.")
+        return default
+
+def _http2_available() -> bool:
+    """True when the optional `h2` package is installed (httpx needs it for HTTP/2)."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _transport_kwargs() -> dict:
+    """Pool limits and timeouts for the httpx clients handed to supabase-py."""
+    pool_size = _transport_setting('SUPABASE_HTTP_POOL_SIZE')
+    return {
+        'limits': httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=min(_transport_setting('SUPABASE_HTTP_KEEPALIVE'), pool_size),
+            keepalive_expiry=_transport_setting('SUPABASE_HTTP_KEEPALIVE_EXPIRY'),
+        ),
+        'timeout': httpx.Timeout(_transport_setting('SUPABASE_HTTP_TIMEOUT'), connect=_transport_setting('SUPABASE_HTTP_CONNECT_TIMEOUT')),
+        'http2': _http2_available(),
+        'follow_redirects': True,
+    }
+
+def resolve_supabase_credentials() -> Tuple[str, str]:
     """
-    Initializes and returns a singleton Supabase client instance.
+    Returns (SUPABASE_URL, SUPABASE_KEY).
     It attempts to load credentials from Streamlit's secrets (for frontend)
     or from environment variables (for backend/non-Streamlit environments).
     """
     # Load environment variables from .env file if present (for local backend execution)
     load_dotenv()
-    
+
+    SUPABASE_URL = None
+    SUPABASE_KEY = None
+
+    # Try to load from Streamlit secrets first (for frontend)
+    try:
+        import streamlit as st
+        if "supabase" in st.secrets and "url" in st.secrets.supabase and "key" in st.secrets.supabase:
+            SUPABASE_URL = st.secrets.supabase.url
+            SUPABASE_KEY = st.secrets.supabase.key
+            print("Supabase credentials loaded from Streamlit secrets.")
+    except Exception:
+        # Streamlit not available or secrets not configured, fall back to environment variables
+        pass
+
+    # If not loaded from Streamlit secrets, try environment variables (for backend)
+    if SUPABASE_URL is None or SUPABASE_KEY is None:
+        SUPABASE_URL = os.environ.get("SUPABASE_URL")
+        SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
+        if SUPABASE_URL and SUPABASE_KEY:
+            print("Supabase credentials loaded from environment variables.")
+        else:
+            print(f"DEBUG: SUPABASE_URL found: {SUPABASE_URL is not None}")
+            print(f"DEBUG: SUPABASE_KEY found: {SUPABASE_KEY is not None}")
+            print(f"DEBUG: Available env vars: {[k for k in os.environ.keys() if 'SUPABASE' in k.upper()]}")
+
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError(
+            "Supabase credentials (SUPABASE_URL and SUPABASE_KEY) not found. "
+            "Please ensure they are set in Streamlit Secrets (for frontend) "
+            "or as environment variables (for backend)."
+        )
+
+    return SUPABASE_URL, SUPABASE_KEY
+
+def get_supabase_client() -> Client:
+    """
+    Returns the singleton Supabase client, creating it on first use.
+
+    Once created this is a plain global read: credentials (.env, Streamlit
+    secrets) are resolved only once, and every call shares one pooled
+    keep-alive HTTP transport (see _TRANSPORT_DEFAULTS). Every round trip is
+    counted in the per-rerun query stats (src/utils/query_stats.py).
+    """
+    client = _supabase_client_instance
+    if client is not None:
+        return client
+    return _init_supabase_client()
+
+def set_supabase_client(client: Optional[Client]) -> None:
+    """
+    Replaces the singleton (e.g. with a LocalSupabaseClient in benchmarks);
+    None makes the next get_supabase_client() call build it again.
+    """
     global _supabase_client_instance
-    if _supabase_client_instance is None:
-        SUPABASE_URL = None
-        SUPABASE_KEY = None
+    with _supabase_client_lock:
+        _supabase_client_instance = client
 
-        # Try to load from Streamlit secrets first (for frontend)
-        try:
-            import streamlit as st
-            if "supabase" in st.secrets and "url" in st.secrets.supabase and "key" in st.secrets.supabase:
-                SUPABASE_URL = st.secrets.supabase.url
-                SUPABASE_KEY = st.secrets.supabase.key
-                print("Supabase credentials loaded from Streamlit secrets.")
-        except Exception:
-            # Streamlit not available or secrets not configured, fall back to environment variables
-            pass
-
-        # If not loaded from Streamlit secrets, try environment variables (for backend)
-        if SUPABASE_URL is None or SUPABASE_KEY is None:
-            SUPABASE_URL = os.environ.get("SUPABASE_URL")
-            SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
-            if SUPABASE_URL and SUPABASE_KEY:
-                print("Supabase credentials loaded from environment variables.")
-            else:
-                print(f"DEBUG: SUPABASE_URL found: {SUPABASE_URL is not None}")
-                print(f"DEBUG: SUPABASE_KEY found: {SUPABASE_KEY is not None}")
-                print(f"DEBUG: Available env vars: {[k for k in os.environ.keys() if 'SUPABASE' in k.upper()]}")
-
-        if not SUPABASE_URL or not SUPABASE_KEY:
-            raise ValueError(
-                "Supabase credentials (SUPABASE_URL and SUPABASE_KEY) not found. "
-                "Please ensure they are set in Streamlit Secrets (for frontend) "
-                "or as environment variables (for backend)."
-            )
+def _init_supabase_client() -> Client:
+    global _supabase_client_instance
+    with _supabase_client_lock:
+        if _supabase_client_instance is None and local_backend_enabled():
+            print("SUPABASE_BACKEND=local: usando el backend local en memoria.")
+            _supabase_client_instance = LocalSupabaseClient(get_shared_backend())
+        elif _supabase_client_instance is None:
+            SUPABASE_URL, SUPABASE_KEY = resolve_supabase_credentials()
 
-        print("Initializing Supabase client...")
-        _supabase_client_instance = create_client(SUPABASE_URL, SUPABASE_KEY)
-        print("Supabase client initialized.")
+            print("Initializing Supabase client...")
+            transport = _transport_kwargs()
+            options = ClientOptions(
+                postgrest_client_timeout=transport['timeout'],
+                httpx_client=httpx.Client(**transport, event_hooks={'request': [httpx_request_hook], 'response': [httpx_response_hook]}),
+            )
+            _supabase_client_instance = create_client(SUPABASE_URL, SUPABASE_KEY, options=options)
+            print("Supabase client initialized.")
 
     return _supabase_client_instance
+
+async def create_async_supabase_client() -> AsyncClient:
+    """
+    Creates an async Supabase client with the same credentials and transport
+    settings as `get_supabase_client`. The client is bound to the event loop
+    that awaits this coroutine; the shared instance lives in src/data/supabase_async.py.
+    """
+    if local_backend_enabled():
+        return LocalAsyncSupabaseClient(get_shared_backend())
+    SUPABASE_URL, SUPABASE_KEY = resolve_supabase_credentials()
+    print("Initializing async Supabase client...")
+    transport = _transport_kwargs()
+    options = AsyncClientOptions(
+        postgrest_client_timeout=transport['timeout'],
+        httpx_client=httpx.AsyncClient(**transport, event_hooks={'request': [async_httpx_request_hook], 'response': [async_httpx_response_hook]}),
+    )
+    return await acreate_client(SUPABASE_URL, SUPABASE_KEY, options=options)
+
+# --- Reads with Timeout and Retries ---
+
+class _TimeoutSession:
+    """Forwards requests to the shared httpx client with a per-call timeout (same connection pool)."""
+
+    def __init__(self, session: httpx.Client, timeout: httpx.Timeout):
+        self._session = session
+        self._timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault('timeout', self._timeout)
+        return self._session.request(*args, **kwargs)
+
+def execute_read(query: Any, timeout: Optional[float] = None, retries: Optional[int] = None) -> Any:
+    """
+    Executes an idempotent PostgREST read (select / count), retrying transport
+    failures (connect errors, timeouts, dropped keep-alive connections) with
+    exponential backoff and full jitter.
+
+    Only use it for reads: a retried write whose first attempt reached the
+    server would be applied twice.
+
+    Args:
+        query: A built request, e.g. supabase.table('x').select('*').eq('id', 1)
+        timeout: Seconds for this call (default SUPABASE_HTTP_TIMEOUT)
+        retries: Extra attempts after the first (default SUPABASE_READ_RETRIES)
+
+    Returns:
+        The response of query.execute()
+    """
+    if timeout is not None:
+        request = query.request
+        connect_timeout = min(timeout, _transport_setting('SUPABASE_HTTP_CONNECT_TIMEOUT'))
+        request.session = _TimeoutSession(request.session, httpx.Timeout(timeout, connect=connect_timeout))
+    attempts = 1 + (_transport_setting('SUPABASE_READ_RETRIES') if retries is None else max(0, retries))
+
+    for attempt in range(attempts):
+        try:
+            return query.execute()
+        except httpx.TransportError as e:
+            if attempt == attempts - 1:
+                raise
+            delay = random.uniform(0, min(_RETRY_MAX_DELAY, _RETRY_BASE_DELAY * (2 ** attempt)))
+            print(f"[WARN] Lectura Supabase falló ({type(e).__name__}); reintento {attempt + 1}/{attempts - 1} en {delay:.2f}s")
+            time.sleep(delay)
@@ -2,15 +2,76 @@
 
 import os
 import json
+import hashlib
+import contextlib
+import contextvars
+import threading
+import time
+import uuid
 import datetime as dt
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Optional, Iterable, Iterator, Union
+
+from postgrest.exceptions import APIError
 
 # Internal imports
-from .supabase_client import get_supabase_client
-from src.utils.latency import measure_latency
+from .supabase_client import get_supabase_client, execute_read
+from .models import Proposal
+from .search_index import TextSearchIndex
+from .repository_common import (
+    DISBURSED_ESTADO_FILTER,
+    EMISOR_CACHE,
+    EVENT_BATCH_SIZE,
+    IN_CHUNK_SIZE,
+    PROPOSAL_PROJECTIONS,
+    Ledger,
+    LedgerLoadError,
+    audit_row,
+    desembolso_evento_payload,
+    ledger_query,
+    ledgers_from_rows,
+    liquidacion_evento_payload,
+    proposal_columns,
+    to_proposals,
+)
+from .audit_writer import AuditWriter, spool_path_for
+from src.utils.latency import measure_latency, record_caught_error
 
 # --- Type Aliases for Clarity ---
-Proposal = Dict[str, Any]
+ProposalData = Dict[str, Any]  # Raw proposal payload (session data, Supabase rows)
+
+# --- Liquidation Ledger Memo ---
+# Inside a `liquidation_ledger_scope()` block every ledger helper reads from this
+# memo (proposal_id -> Ledger) instead of querying Supabase again.
+# Outside a scope nothing is cached, so reads are always fresh.
+_ledger_memo: contextvars.ContextVar[Optional[Dict[str, Ledger]]] = contextvars.ContextVar('liquidation_ledger_memo', default=None)
+
+# Proposals per upsert request in save_proposals_batch
+_SAVE_BATCH_SIZE = 500
+
+# Hex characters of the idempotency_key embedded in proposal_id
+_PROPOSAL_ID_KEY_LENGTH = 10
+
+# --- Permission Snapshot ---
+# Process-wide copy of modules, authorized_users and user_module_access used by
+# check_user_access / get_user_role. Refreshed after _PERMISSION_TTL_SECONDS and
+# dropped immediately by every write to those tables made through this module.
+_PERMISSION_TTL_SECONDS = 60
+_permission_snapshot: Optional[Dict[str, Any]] = None
+_permission_snapshot_lock = threading.Lock()
+
+_FINANCIAL_CONDITION_COLUMNS = (
+    'tasa_avance', 'interes_mensual_pen', 'interes_moratorio_pen', 'interes_mensual_usd', 'interes_moratorio_usd',
+    'comision_estructuracion_pen', 'comision_estructuracion_usd', 'comision_estructuracion_pct',
+    'comision_afiliacion_pen', 'comision_afiliacion_usd', 'dias_minimos_interes',
+)
+
+# --- EMISORES.ACEPTANTES Search Index ---
+# In-process ranked index (see TextSearchIndex) over RUC and "Razon Social".
+# Built from one paged full read, refreshed incrementally by create/update_emisor_deudor
+# and rebuilt after _EMISOR_SEARCH_TTL_SECONDS to pick up external changes.
+_EMISOR_SEARCH_TTL_SECONDS = 600
+_emisor_search: Optional[Dict[str, Any]] = None  # {'index', 'rows', 'loaded_at'}
+_emisor_search_lock = threading.Lock()
 
 # --- Helper Functions ---
 
@@ -32,98 +93,342 @@ def _convert_to_numeric(value: Any) -> Optional[float]:
     except (ValueError, TypeError):
         return None
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Load Recalculate Results")
+def load_recalculate_results(proposals: List[Proposal]) -> List[Proposal]:
+    """
+    Loads recalculate_result_json into proposals read with a lighter projection,
+    with one `in_` query per IN_CHUNK_SIZE ids (records that already have it
+    are skipped). Returns the same list.
+    """
+    missing = {}
+    for proposal in proposals:
+        if not proposal.has_recalculate_result and proposal.get('proposal_id'):
+            missing.setdefault(proposal['proposal_id'], []).append(proposal)
+    ids = list(missing)
+    supabase = get_supabase_client()
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        chunk = ids[start:start + IN_CHUNK_SIZE]
+        response = execute_read(supabase.table('propuestas').select('proposal_id, recalculate_result_json').in_('proposal_id', chunk))
+        blobs = {row['proposal_id']: row.get('recalculate_result_json') for row in response.data or []}
+        for proposal_id in chunk:
+            for proposal in missing[proposal_id]:
+                proposal['recalculate_result_json'] = blobs.get(proposal_id)
+    return proposals
+
+def iter_table_pages(
+    table: str,
+    columns: str = '*',
+    key: str = 'id',
+    page_size: int = 1000,
+    on_total: Optional[Callable[[Optional[int]], None]] = None
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yields every row of a table in pages ordered by `key` (keyset pagination).
+
+    `key` must be unique and included in `columns`. The first page also asks
+    for the exact row count, so a short page only ends the iteration once
+    every row was seen: a PostgREST max-rows setting below `page_size` (1000
+    by default in Supabase) shortens the pages instead of truncating the scan.
+    That count is passed to `on_total` (None if unavailable) before the first
+    page is yielded, so callers showing progress need no separate count query.
+    """
+    supabase = get_supabase_client()
+    cursor = None
+    total = None
+    seen = 0
+    while True:
+        query = supabase.table(table).select(columns, count='exact') if cursor is None else supabase.table(table).select(columns).gt(key, cursor)
+        response = execute_read(query.order(key).limit(page_size))
+        rows = response.data or []
+        if cursor is None:
+            total = response.count
+            if on_total:
+                on_total(total)
+        if not rows:
+            return
+        yield rows
+        seen += len(rows)
+        if len(rows) < page_size and (total is None or seen >= total):
+            return
+        cursor = rows[-1][key]
+
 # --- Public Repository Functions ---
 
 # --- Functions for Operations Module (Original `supabase_handler`) ---
 
+def _get_emisor_row(ruc: Any) -> Optional[Dict[str, Any]]:
+    """
+    Returns the EMISORES.ACEPTANTES row for a RUC through the read-through cache
+    (None if not registered). Raises on query errors, which are not cached.
+    The row is a copy, so callers may modify it without touching the cache.
+    """
+    clean_ruc = str(ruc).strip()
+    hit, row = EMISOR_CACHE.lookup(clean_ruc)
+    if not hit:
+        supabase = get_supabase_client()
+        response = execute_read(supabase.table('EMISORES.ACEPTANTES').select('*').eq('RUC', clean_ruc).limit(1))
+        row = response.data[0] if response.data else None
+        EMISOR_CACHE.set(clean_ruc, row)
+    return dict(row) if row is not None else None
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Prefetch Emisores")
+def prefetch_emisores(rucs: Iterable[Any]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Loads every RUC not already cached with one `in_` query per chunk of
+    IN_CHUNK_SIZE, so building a whole lote costs at most one emisor query
+    (for lotes up to that size). Unregistered RUCs are cached as None.
+
+    Returns:
+        Dict RUC -> row (or None) for the requested RUCs; rows are copies of
+        the cached ones
+    """
+    unique_rucs = list(dict.fromkeys(str(ruc).strip() for ruc in rucs if ruc))
+    result: Dict[str, Optional[Dict[str, Any]]] = {}
+    missing = []
+    for ruc in unique_rucs:
+        hit, row = EMISOR_CACHE.lookup(ruc)
+        if hit:
+            result[ruc] = dict(row) if row is not None else None
+        else:
+            missing.append(ruc)
+
+    supabase = get_supabase_client()
+    for start in range(0, len(missing), IN_CHUNK_SIZE):
+        chunk = missing[start:start + IN_CHUNK_SIZE]
+        try:
+            response = execute_read(supabase.table('EMISORES.ACEPTANTES').select('*').in_('RUC', chunk))
+        except Exception as e:
+            print(f"[ERROR in prefetch_emisores]: {e}")
+            record_caught_error(e)
+            continue
+        found = {str(row.get('RUC')).strip(): row for row in response.data or []}
+        for ruc in chunk:
+            row = found.get(ruc)
+            EMISOR_CACHE.set(ruc, row)
+            result[ruc] = dict(row) if row is not None else None
+    return result
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Razon Social", sample_rate=0.1)
 def get_razon_social_by_ruc(ruc: str) -> str:
     """Fetches a company's legal name by its RUC."""
-    supabase = get_supabase_client()
     if not ruc:
         return ""
     
-    # Robustification: Convert to string and strip whitespace
-    clean_ruc = str(ruc).strip()
-    
     try:
-        response = supabase.table('EMISORES.ACEPTANTES').select('"Razon Social"').eq('RUC', clean_ruc).single().execute()
-        return response.data.get('Razon Social', '') if response.data else ''
+        row = _get_emisor_row(ruc)
+        return (row.get('Razon Social') or '') if row else ''
     except Exception as e:
         print(f"[ERROR in get_razon_social_by_ruc]: {e}")
+        record_caught_error(e)
         return ""
 
-@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Save Proposal")
-def save_proposal(session_data: Proposal, identificador_lote: str) -> tuple[bool, str]:
-    """Saves a complete proposal to the 'propuestas' table."""
-    supabase = get_supabase_client()
-    try:
-        recalculate_result_full = session_data.get('recalculate_result')
-        data_to_insert = {
-            'recalculate_result_json': json.dumps(recalculate_result_full) if recalculate_result_full else None,
-            'emisor_nombre': session_data.get('emisor_nombre'),
-            'emisor_ruc': session_data.get('emisor_ruc'),
-            'aceptante_nombre': session_data.get('aceptante_nombre'),
-            'aceptante_ruc': session_data.get('aceptante_ruc'),
-            'numero_factura': session_data.get('numero_factura'),
-            'monto_total_factura': _convert_to_numeric(session_data.get('monto_total_factura')),
-            'monto_neto_factura': _convert_to_numeric(session_data.get('monto_neto_factura')),
-            'moneda_factura': session_data.get('moneda_factura'),
-            'fecha_emision_factura': _format_date(session_data.get('fecha_emision_factura')),
-            'plazo_credito_dias': int(session_data['plazo_credito_dias']) if session_data.get('plazo_credito_dias') is not None else None,
-            'fecha_desembolso_factoring': _format_date(session_data.get('fecha_desembolso_factoring')),
-            'tasa_de_avance': _convert_to_numeric(session_data.get('tasa_de_avance')),
-            'interes_mensual': _convert_to_numeric(session_data.get('interes_mensual')),
-            'interes_moratorio': _convert_to_numeric(session_data.get('interes_moratorio')),
-            'fecha_pago_calculada': _format_date(session_data.get('fecha_pago_calculada')),
-            'plazo_operacion_calculado': int(session_data['plazo_operacion_calculado']) if session_data.get('plazo_operacion_calculado') is not None else None,
-            'anexo_number': session_data.get('anexo_number'),
-            'contract_number': session_data.get('contract_number'),
-            'identificador_lote': identificador_lote,
-            'estado': 'ACTIVO'
-        }
-
-        if recalculate_result_full:
-            capital = recalculate_result_full.get('calculo_con_tasa_encontrada', {}).get('capital')
-            data_to_insert['capital_calculado'] = _convert_to_numeric(capital)
-
+def _proposal_row(session_data: ProposalData, identificador_lote: str, fecha_propuesta: dt.date) -> Dict[str, Any]:
+    """
+    Normalizes a proposal payload (session data) into a 'propuestas' row
+    (proposal_id and idempotency_key are set by the caller, see _proposal_id).
+    Raises ValueError when a field cannot be converted.
+    """
+    recalculate_result_full = session_data.get('recalculate_result')
+    if recalculate_result_full:
         # Persist Group ID within JSON for Reporting
-        if recalculate_result_full:
-            recalculate_result_full['group_id'] = session_data.get('group_id')
-            data_to_insert['recalculate_result_json'] = json.dumps(recalculate_result_full)
+        recalculate_result_full = {**recalculate_result_full, 'group_id': session_data.get('group_id')}
+
+    row = {
+        'recalculate_result_json': json.dumps(recalculate_result_full, sort_keys=True, default=str) if recalculate_result_full else None,
+        'emisor_nombre': session_data.get('emisor_nombre'),
+        'emisor_ruc': session_data.get('emisor_ruc'),
+        'aceptante_nombre': session_data.get('aceptante_nombre'),
+        'aceptante_ruc': session_data.get('aceptante_ruc'),
+        'numero_factura': session_data.get('numero_factura'),
+        'monto_total_factura': _convert_to_numeric(session_data.get('monto_total_factura')),
+        'monto_neto_factura': _convert_to_numeric(session_data.get('monto_neto_factura')),
+        'moneda_factura': session_data.get('moneda_factura'),
+        'fecha_emision_factura': _format_date(session_data.get('fecha_emision_factura')),
+        'plazo_credito_dias': int(session_data['plazo_credito_dias']) if session_data.get('plazo_credito_dias') is not None else None,
+        'fecha_desembolso_factoring': _format_date(session_data.get('fecha_desembolso_factoring')),
+        'tasa_de_avance': _convert_to_numeric(session_data.get('tasa_de_avance')),
+        'interes_mensual': _convert_to_numeric(session_data.get('interes_mensual')),
+        'interes_moratorio': _convert_to_numeric(session_data.get('interes_moratorio')),
+        'fecha_pago_calculada': _format_date(session_data.get('fecha_pago_calculada')),
+        'plazo_operacion_calculado': int(session_data['plazo_operacion_calculado']) if session_data.get('plazo_operacion_calculado') is not None else None,
+        'anexo_number': session_data.get('anexo_number'),
+        'contract_number': session_data.get('contract_number'),
+        'identificador_lote': identificador_lote,
+        'estado': 'ACTIVO',
+        'capital_calculado': None,
+    }
+    for field in ('monto_total_factura', 'monto_neto_factura'):
+        if row[field] is None and session_data.get(field) not in (None, ''):
+            raise ValueError(f"{field} no es numérico: {session_data.get(field)!r}")
+
+    if recalculate_result_full:
+        capital = recalculate_result_full.get('calculo_con_tasa_encontrada', {}).get('capital')
+        row['capital_calculado'] = _convert_to_numeric(capital)
+
+    row['fecha_propuesta'] = fecha_propuesta.isoformat()
+    return row
+
+def _proposal_id(row: Dict[str, Any], fecha_propuesta: dt.date, idempotency_key: str) -> str:
+    """
+    EMISOR-FACTURA-KEY-YYYYMMDD, where KEY is the start of the idempotency_key:
+    the same invoice saved twice on one day (new submission) gets a new id,
+    while a retry of the same submission gets the same one. The date stays
+    last, as the sql/002 backfill expects.
+    """
+    emisor_nombre_id = str(row.get('emisor_nombre') or 'SIN_NOMBRE').replace(' ', '_').replace('.', '')
+    numero_factura = str(row.get('numero_factura') or 'SIN_FACTURA')
+    return f"{emisor_nombre_id}-{numero_factura}-{idempotency_key[:_PROPOSAL_ID_KEY_LENGTH]}-{fecha_propuesta.strftime('%Y%m%d')}"
 
-        emisor_nombre_id = str(data_to_insert.get('emisor_nombre', 'SIN_NOMBRE')).replace(' ', '_').replace('.', '')
-        numero_factura = str(data_to_insert.get('numero_factura', 'SIN_FACTURA'))
-        fecha_propuesta = dt.datetime.now().strftime('%Y%m%d')
-        data_to_insert['proposal_id'] = f"{emisor_nombre_id}-{numero_factura}-{fecha_propuesta}"
+def _idempotency_key(submission_token: str, row: Dict[str, Any], occurrence: int) -> str:
+    """
+    Key of one proposal within a submission: the same submission sent again
+    (retry, double click) maps to the same keys, while a deliberate re-issue
+    with identical content comes with a new token and gets new keys.
+    `occurrence` tells apart identical proposals inside one submission.
+    """
+    content = json.dumps(row, sort_keys=True, default=str)
+    return hashlib.sha256(f"{submission_token}|{occurrence}|{content}".encode('utf-8')).hexdigest()
 
-        print(f"DEBUG: Data being sent to Supabase -> {json.dumps(data_to_insert, indent=4, default=str)}")
-        response = supabase.table('propuestas').insert(data_to_insert).execute()
-        if hasattr(response, 'error') and response.error:
-            raise Exception(response.error.message)
+def _upsert_proposal_chunk(supabase: Any, chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Upserts a chunk on idempotency_key (existing keys are skipped) and returns
+    the inserted rows. If the statement is rejected (e.g. a row violating a
+    constraint), rows are retried one by one so only the offending ones fail;
+    those are returned as {'idempotency_key', 'error'} entries.
+    """
+    try:
+        response = supabase.table('propuestas').upsert(chunk, on_conflict='idempotency_key', ignore_duplicates=True).execute()
+        return response.data or []
+    except APIError:
+        if len(chunk) == 1:
+            raise
+    results = []
+    for row in chunk:
+        try:
+            response = supabase.table('propuestas').upsert([row], on_conflict='idempotency_key', ignore_duplicates=True).execute()
+            results.extend(response.data or [])
+        except APIError as e:
+            results.append({'idempotency_key': row['idempotency_key'], 'error': str(e)})
+    return results
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Save Proposals Batch")
+def save_proposals_batch(proposals: List[ProposalData], identificador_lote: str, submission_token: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Saves many proposals of a lote, normally in a single request.
+
+    Every payload is validated and normalized first (invalid ones are reported
+    and skipped). Valid rows are upserted on idempotency_key with
+    ignore_duplicates (sql/006), in chunks of _SAVE_BATCH_SIZE. Keys derive
+    from `submission_token` plus the content, so sending the same submission
+    again (same token) inserts nothing new, while a deliberate re-issue of
+    identical proposals (new token) is saved. proposal_id embeds the start of
+    the key (EMISOR-FACTURA-KEY-YYYYMMDD), so saving the same invoice twice on
+    one day creates a second proposal instead of colliding on the primary key.
+    A row the database rejects fails alone, not with its whole chunk.
 
-        return True, f"Propuesta con ID {data_to_insert['proposal_id']} guardada exitosamente."
+    Args:
+        proposals: Proposal payloads (same shape as save_proposal's session_data);
+                   an 'idempotency_key' entry overrides the derived key
+        identificador_lote: Batch identifier shared by all rows
+        submission_token: Token generated by the client once per submission
+                          (e.g. when the form is shown) and reused on retries.
+                          Without it every call is a new submission.
 
-    except Exception as e:
-        print(f"[ERROR en save_proposal]: {e}")
-        return False, f"Error al guardar la propuesta: {e}"
+    Returns:
+        One dict per input, in order: {'ok': bool, 'status': 'created' | 'duplicate'
+        | 'invalid' | 'error', 'proposal_id': str or None, 'message': str}
+    """
+    fecha_propuesta = dt.date.today()
+    submission_token = submission_token or uuid.uuid4().hex
+    results: List[Dict[str, Any]] = [{} for _ in proposals]
+    rows_by_key: Dict[str, Dict[str, Any]] = {}
+    indexes_by_key: Dict[str, List[int]] = {}
+    occurrences: Dict[str, int] = {}
+
+    for index, session_data in enumerate(proposals):
+        try:
+            row = _proposal_row(session_data, identificador_lote, fecha_propuesta)
+        except (ValueError, TypeError, KeyError) as e:
+            record_caught_error(e)
+            results[index] = {'ok': False, 'status': 'invalid', 'proposal_id': None, 'message': f"Datos inválidos: {e}"}
+            continue
+        if session_data.get('idempotency_key'):
+            row['idempotency_key'] = session_data['idempotency_key']
+        else:
+            content_key = json.dumps(row, sort_keys=True, default=str)
+            occurrences[content_key] = occurrences.get(content_key, 0) + 1
+            row['idempotency_key'] = _idempotency_key(submission_token, row, occurrences[content_key])
+        row['proposal_id'] = _proposal_id(row, fecha_propuesta, row['idempotency_key'])
+        rows_by_key.setdefault(row['idempotency_key'], row)
+        indexes_by_key.setdefault(row['idempotency_key'], []).append(index)
 
+    supabase = get_supabase_client()
+    rows = list(rows_by_key.values())
+    stored: Dict[str, tuple] = {}  # idempotency_key -> (status, proposal_id)
+    failed: Dict[str, str] = {}
+    for start in range(0, len(rows), _SAVE_BATCH_SIZE):
+        chunk = rows[start:start + _SAVE_BATCH_SIZE]
+        try:
+            for inserted in _upsert_proposal_chunk(supabase, chunk):
+                if 'error' in inserted:
+                    failed[inserted['idempotency_key']] = inserted['error']
+                else:
+                    stored[inserted['idempotency_key']] = ('created', inserted['proposal_id'])
+
+            # Rows not returned already existed (saved by an earlier attempt)
+            existing_keys = [row['idempotency_key'] for row in chunk if row['idempotency_key'] not in stored and row['idempotency_key'] not in failed]
+            if existing_keys:
+                existing = execute_read(supabase.table('propuestas').select(
+                    'idempotency_key, proposal_id'
+                ).in_('idempotency_key', existing_keys))
+                for row in existing.data or []:
+                    stored[row['idempotency_key']] = ('duplicate', row['proposal_id'])
+        except Exception as e:
+            print(f"[ERROR en save_proposals_batch]: {e}")
+            record_caught_error(e)
+            for row in chunk:
+                if row['idempotency_key'] not in stored:
+                    failed[row['idempotency_key']] = str(e)
+
+    for key, indexes in indexes_by_key.items():
+        for position, index in enumerate(indexes):
+            if key in stored:
+                status, proposal_id = stored[key]
+                if position > 0:
+                    status = 'duplicate'  # Repeated within this same batch
+                message = (f"Propuesta con ID {proposal_id} guardada exitosamente." if status == 'created'
+                           else f"Propuesta con ID {proposal_id} ya estaba registrada.")
+                results[index] = {'ok': True, 'status': status, 'proposal_id': proposal_id, 'message': message}
+            else:
+                error = failed.get(key, 'La propuesta no fue confirmada por la base de datos.')
+                results[index] = {'ok': False, 'status': 'error', 'proposal_id': None, 'message': f"Error al guardar la propuesta: {error}"}
+    return results
+
+def save_proposal(session_data: ProposalData, identificador_lote: str, submission_token: Optional[str] = None) -> tuple[bool, str]:
+    """Saves a complete proposal to the 'propuestas' table (see save_proposals_batch; measured there)."""
+    result = save_proposals_batch([session_data], identificador_lote, submission_token)[0]
+    if not result['ok']:
+        print(f"[ERROR en save_proposal]: {result['message']}")
+    return result['ok'], result['message']
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Signatory Data")
 def get_signatory_data_by_ruc(ruc: str) -> Optional[Dict[str, Any]]:
     """
     Fetches signatory data (legal name, address, etc.) for a given RUC.
     This is used for populating PDF reports like the EFIDE report.
     """
-    supabase = get_supabase_client()
     if not ruc:
         return ""
     try:
-        response = supabase.table('EMISORES.ACEPTANTES').select('*').eq('RUC', ruc).single().execute()
-        return response.data if response.data else None
+        return _get_emisor_row(ruc) or None
     except Exception as e:
         print(f"[ERROR in get_signatory_data_by_ruc]: {e}")
+        record_caught_error(e)
         return None
 
 # --- Functions for Liquidation & Disbursement Modules ---
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List Proposals By Lote")
 def get_proposals_by_lote(lote_id: str, estado_filter: str = 'APROBADO') -> List[Proposal]:
     """Retrieves a list of proposals for a specific batch ID filtered by status.
     
@@ -133,91 +438,113 @@ def get_proposals_by_lote(lote_id: str, estado_filter: str = 'APROBADO') -> List
     """
     supabase = get_supabase_client()
     try:
-        response = supabase.table('propuestas').select(
+        response = execute_read(supabase.table('propuestas').select(
             'proposal_id, emisor_nombre, aceptante_nombre, monto_neto_factura, moneda_factura, anexo_number, contract_number, recalculate_result_json, estado'
-        ).eq('identificador_lote', lote_id).eq('estado', estado_filter).execute()
-        return response.data if response.data else []
+        ).eq('identificador_lote', lote_id).eq('estado', estado_filter))
+        return to_proposals(response.data)
     except Exception as e:
         print(f"[ERROR en get_proposals_by_lote]: {e}")
+        record_caught_error(e)
         return []
 
 @measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List Pending Proposals")
-def get_active_proposals_for_approval() -> List[Proposal]:
+def get_active_proposals_for_approval(projection: str = 'full') -> List[Proposal]:
     """Fetches all proposals in ACTIVO status for approval module.
     
+    Args:
+        projection: Column profile from PROPOSAL_PROJECTIONS (default 'full')
+
     Returns:
         List of proposals pending approval
     """
+    columns = proposal_columns(projection)
     supabase = get_supabase_client()
     try:
-        response = supabase.table('propuestas').select('*').eq('estado', 'ACTIVO').execute()
-        return response.data if response.data else []
+        response = execute_read(supabase.table('propuestas').select(columns).eq('estado', 'ACTIVO'))
+        return to_proposals(response.data)
     except Exception as e:
         print(f"[ERROR en get_active_proposals_for_approval]: {e}")
+        record_caught_error(e)
         return []
 
-def get_approved_proposals_for_disbursement() -> List[Proposal]:
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List Approved Proposals")
+def get_approved_proposals_for_disbursement(projection: str = 'full') -> List[Proposal]:
     """Fetches all proposals in APROBADO status for disbursement module.
     
+    Args:
+        projection: Column profile from PROPOSAL_PROJECTIONS (default 'full')
+
     Returns:
         List of proposals pending disbursement
     """
+    columns = proposal_columns(projection)
     supabase = get_supabase_client()
     try:
-        response = supabase.table('propuestas').select('*').eq('estado', 'APROBADO').execute()
-        return response.data if response.data else []
+        response = execute_read(supabase.table('propuestas').select(columns).eq('estado', 'APROBADO'))
+        return to_proposals(response.data)
     except Exception as e:
         print(f"[ERROR en get_approved_proposals_for_disbursement]: {e}")
+        record_caught_error(e)
         return []
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List Disbursed Proposals By Lote")
 def get_disbursed_proposals_by_lote(lote_id: str) -> List[Proposal]:
     """Retrieves a list of disbursed or in-liquidation proposals for a specific batch ID."""
     supabase = get_supabase_client()
     try:
-        response = supabase.table('propuestas').select(
+        response = execute_read(supabase.table('propuestas').select(
             'proposal_id, emisor_nombre, aceptante_nombre, monto_neto_factura, moneda_factura, anexo_number, contract_number, recalculate_result_json, estado'
-        ).eq('identificador_lote', lote_id).in_('estado', ['DESEMBOLSADA', 'EN PROCESO DE LIQUIDACION']).execute()
-        return response.data if response.data else []
+        ).eq('identificador_lote', lote_id).in_('estado', ['DESEMBOLSADA', 'EN PROCESO DE LIQUIDACION']))
+        return to_proposals(response.data)
     except Exception as e:
         print(f"[ERROR en get_disbursed_proposals_by_lote]: {e}")
+        record_caught_error(e)
         return []
 
-def get_all_disbursed_proposals() -> List[Proposal]:
-    """Retrieves all proposals relevant for liquidation (Disbursed, In Process, etc)."""
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List Disbursed Proposals")
+def get_all_disbursed_proposals(projection: str = 'full') -> List[Proposal]:
+    """Retrieves all proposals relevant for liquidation (Disbursed, In Process, etc).
+
+    Args:
+        projection: Column profile from PROPOSAL_PROJECTIONS (default 'full')
+    """
+    columns = proposal_columns(projection)
     supabase = get_supabase_client()
     try:
-        # Changed to broad OR filter to catch 'EN PROCESO - Caso 4', 'LIQUIDADO - Caso 2', etc.
-        # Syntax: comma separated filters inside or_() string.
-        response = supabase.table('propuestas').select('*').or_(
-            'estado.eq.DESEMBOLSADA,estado.eq.DESEMBOLSADO,estado.ilike.%EN PROCESO%,estado.ilike.%LIQUIDADO%,estado.ilike.%CON SALDO%'
-        ).execute()
-        return response.data if response.data else []
+        response = execute_read(supabase.table('propuestas').select(columns).or_(DISBURSED_ESTADO_FILTER))
+        return to_proposals(response.data)
     except Exception as e:
         print(f"[ERROR en get_all_disbursed_proposals]: {e}")
+        record_caught_error(e)
         return []
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List Liquidated Proposals By Lote")
 def get_liquidated_proposals_by_lote(lote_id: str) -> List[Proposal]:
     """Retrieves proposals with liquidation data (EN PROCESO or LIQUIDADA states)."""
     supabase = get_supabase_client()
     try:
         # Buscar propuestas que contengan "EN PROCESO" o "LIQUIDADA" en su estado
         # Estos son los únicos estados que tienen eventos de liquidación
-        response = supabase.table('propuestas').select(
+        response = execute_read(supabase.table('propuestas').select(
             'proposal_id, emisor_nombre, aceptante_nombre, monto_neto_factura, moneda_factura, anexo_number, contract_number, recalculate_result_json, estado, numero_factura'
-        ).eq('identificador_lote', lote_id).or_('estado.like.%EN PROCESO%,estado.like.%LIQUIDADA%').execute()
-        return response.data if response.data else []
+        ).eq('identificador_lote', lote_id).or_('estado.like.%EN PROCESO%,estado.like.%LIQUIDADA%'))
+        return to_proposals(response.data)
     except Exception as e:
         print(f"[ERROR en get_liquidated_proposals_by_lote]: {e}")
+        record_caught_error(e)
         return []
 
-def get_proposal_details_by_id(proposal_id: str) -> Optional[Proposal]:
-    """Retrieves all details for a single proposal by its ID."""
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Proposal Details")
+def get_proposal_details_by_id(proposal_id: str, projection: str = 'full') -> Optional[Proposal]:
+    """Retrieves the details for a single proposal by its ID (all columns unless a lighter projection is given)."""
+    columns = proposal_columns(projection)
     supabase = get_supabase_client()
     try:
-        response = supabase.table('propuestas').select('*').eq('proposal_id', proposal_id).single().execute()
-        return response.data if response.data else None
+        response = execute_read(supabase.table('propuestas').select(columns).eq('proposal_id', proposal_id).single())
+        return Proposal.from_row(response.data, strict=True) if response.data else None
     except Exception as e:
         print(f"[ERROR en get_proposal_details_by_id]: {e}")
+        record_caught_error(e)
         return None
 
 @measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Update Proposal Status")
@@ -230,32 +557,224 @@ def update_proposal_status(proposal_id: str, status: str) -> None:
         print(f"[ERROR en update_proposal_status]: {e}")
         raise
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Update Proposal Status Bulk")
+def update_proposal_status_bulk(
+    proposal_ids: Iterable[str],
+    from_state: str,
+    to_state: str,
+    user: str,
+    accion: str = 'CAMBIO_ESTADO',
+    detalles_adicionales: Optional[dict] = None
+) -> List[str]:
+    """
+    Moves many proposals from `from_state` to `to_state` (e.g. approving a whole lote).
+
+    Runs one conditional UPDATE per chunk of IN_CHUNK_SIZE IDs that only
+    touches rows still in `from_state`, so proposals already moved by another
+    user are left alone. All resulting audit events are written in a single insert.
+
+    Args:
+        proposal_ids: IDs of the proposals to transition
+        from_state: Expected current estado
+        to_state: New estado
+        user: usuario_id recorded in auditoria_eventos
+        accion: Audit action name
+        detalles_adicionales: Extra audit details, shared by every event
+
+    Returns:
+        IDs of the proposals that actually changed
+    """
+    supabase = get_supabase_client()
+    unique_ids = list(dict.fromkeys(pid for pid in proposal_ids if pid))
+    changed: List[str] = []
+    try:
+        for start in range(0, len(unique_ids), IN_CHUNK_SIZE):
+            chunk = unique_ids[start:start + IN_CHUNK_SIZE]
+            response = supabase.table('propuestas').update({'estado': to_state}).in_(
+                'proposal_id', chunk
+            ).eq('estado', from_state).execute()
+            changed.extend(row['proposal_id'] for row in response.data or [])
+    except Exception as e:
+        print(f"[ERROR en update_proposal_status_bulk]: {e}")
+        raise
+    finally:
+        # Audit whatever changed, even if a later chunk failed
+        if changed:
+            add_audit_events([
+                audit_row(user, pid, accion, from_state, to_state, detalles_adicionales or {})
+                for pid in changed
+            ])
+    return changed
+
 # --- Liquidation Specific ---
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Liquidacion Resumen", sample_rate=0.1)
 def get_liquidacion_resumen(proposal_id: str) -> Optional[Dict[str, Any]]:
-    """Retrieves the liquidation summary for a given proposal_id."""
+    """
+    Retrieves the liquidation summary for a given proposal_id.
+
+    Inside `liquidation_ledger_scope()` it is read through the ledger memo and
+    a failed load raises LedgerLoadError instead of returning None.
+    """
+    if _ledger_memo.get() is not None:
+        ledger = _load_liquidation_ledgers([proposal_id]).get(proposal_id)
+        return ledger['resumen'] if ledger else None
     supabase = get_supabase_client()
     try:
-        response = supabase.table('liquidaciones_resumen').select('*').eq('proposal_id', proposal_id).limit(1).execute()
+        response = execute_read(supabase.table('liquidaciones_resumen').select('*').eq('proposal_id', proposal_id).limit(1))
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"[ERROR en get_liquidacion_resumen]: {e}")
+        record_caught_error(e)
         return None
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Liquidacion Eventos", sample_rate=0.1)
 def get_liquidacion_eventos(proposal_id: str) -> List[Dict[str, Any]]:
-    """Retrieves all liquidation events for a proposal, ordered by date."""
-    supabase = get_supabase_client()
+    """
+    Retrieves all liquidation events for a proposal, ordered by orden_evento.
+    Raises LedgerLoadError if they could not be read, so a failure is not
+    mistaken for a proposal without payments.
+    """
+    ledger = _load_liquidation_ledgers([proposal_id]).get(proposal_id)
+    return ledger['eventos'] if ledger else []
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Load Liquidation Ledgers")
+def get_liquidation_ledgers(proposal_ids: Iterable[str]) -> Dict[str, Ledger]:
+    """
+    Loads the liquidation summary and its ordered events for many proposals.
+
+    Uses a single joined query (resumen + embedded eventos) per chunk of
+    proposal IDs instead of two round trips per proposal. Results are served
+    from / stored in the ledger memo when called inside `liquidation_ledger_scope()`.
+
+    Args:
+        proposal_ids: IDs of the proposals to load
+
+    Returns:
+        Dict proposal_id -> {'resumen': dict or None, 'eventos': list ordered by orden_evento}.
+        Every requested ID is present; proposals without a resumen get an empty ledger.
+
+    Raises:
+        LedgerLoadError: if a chunk could not be read. The chunks that did load
+            are still memoized and available in `error.ledgers`.
+    """
+    return _load_liquidation_ledgers(proposal_ids)
+
+def _load_liquidation_ledgers(proposal_ids: Iterable[str]) -> Dict[str, Ledger]:
+    # Undecorated body of get_liquidation_ledgers, for the per-proposal helpers
+    # (already measured themselves) that hit the memo in hot loops
+    memo = _ledger_memo.get()
+    unique_ids = list(dict.fromkeys(pid for pid in proposal_ids if pid))
+
+    ledgers: Dict[str, Ledger] = {}
+    pending = []
+    for pid in unique_ids:
+        if memo is not None and pid in memo:
+            ledgers[pid] = memo[pid]
+        else:
+            pending.append(pid)
+
+    failed_ids: List[str] = []
+    first_error: Optional[Exception] = None
+    if pending:
+        supabase = get_supabase_client()
+        for start in range(0, len(pending), IN_CHUNK_SIZE):
+            chunk = pending[start:start + IN_CHUNK_SIZE]
+            try:
+                response = execute_read(ledger_query(supabase, chunk))
+            except Exception as e:
+                print(f"[ERROR en get_liquidation_ledgers]: {e}")
+                record_caught_error(e)
+                failed_ids.extend(chunk)
+                first_error = first_error or e
+                continue
+
+            loaded = ledgers_from_rows(chunk, response.data)
+            ledgers.update(loaded)
+            if memo is not None:
+                memo.update(loaded)
+
+    # A failed chunk is not "no payments": keep the loaded ledgers (and the
+    # memo) and let the caller decide; failed IDs are read again next time
+    if failed_ids:
+        raise LedgerLoadError(failed_ids, ledgers) from first_error
+    return ledgers
+
+@contextlib.contextmanager
+def liquidation_ledger_scope(proposal_ids: Optional[Iterable[str]] = None) -> Iterator[None]:
+    """
+    Memoizes liquidation ledgers for the duration of a request (e.g. one lote screen).
+
+    Optionally preloads the given proposals with `get_liquidation_ledgers`, so a
+    whole lote costs a fixed number of queries. Nested scopes share the outer memo.
+    Writes through this module keep the memo consistent: a new resumen or a
+    saldo update is applied to it, and new eventos drop the ledger so its
+    stored acumulados are read again.
+
+    Example:
+        with liquidation_ledger_scope(ids):
+            for pid in ids:
+                saldo = get_saldo_favor_acumulado(pid)
+    """
+    token = _ledger_memo.set({}) if _ledger_memo.get() is None else None
     try:
-        resumen = get_liquidacion_resumen(proposal_id)
-        if not resumen:
-            return []
-        resumen_id = resumen['id']
-        response = supabase.table('liquidacion_eventos').select('*').eq('liquidacion_resumen_id', resumen_id).order('orden_evento', desc=False).execute()
-        return response.data if response.data else []
-    except Exception as e:
-        print(f"[ERROR en get_liquidacion_eventos]: {e}")
-        return []
+        if proposal_ids:
+            try:
+                get_liquidation_ledgers(proposal_ids)
+            except LedgerLoadError:
+                pass  # Already reported; the failed IDs are loaded on demand
+        yield
+    finally:
+        if token is not None:
+            _ledger_memo.reset(token)
+
+def _memoized_ledger_for_resumen(liquidacion_resumen_id: str) -> Optional[Ledger]:
+    """Returns the memoized ledger owning a resumen ID, if a scope is active and holds it."""
+    memo = _ledger_memo.get()
+    if not memo:
+        return None
+    for ledger in memo.values():
+        if ledger['resumen'] and ledger['resumen'].get('id') == liquidacion_resumen_id:
+            return ledger
+    return None
+
+def _saldo_favor_delta(evento: Dict[str, Any]) -> float:
+    """saldo_favor_generado - saldo_favor_aplicado de un evento (0 si resultado_json no es legible)."""
+    resultado_json_str = evento.get('resultado_json', '{}')
+    try:
+        resultado = json.loads(resultado_json_str) if isinstance(resultado_json_str, str) else resultado_json_str
+        saldo_generado = float(resultado.get('saldo_favor_generado', 0.0))
+        saldo_aplicado = float(resultado.get('saldo_favor_aplicado', 0.0))
+        return saldo_generado - saldo_aplicado
+    except (json.JSONDecodeError, ValueError, TypeError, AttributeError):
+        return 0.0
 
+def _parse_fecha_evento(fecha_evento: Any) -> Optional[dt.date]:
+    """Parsea fecha_evento (ISO str o date); None si no es legible."""
+    if not fecha_evento:
+        return None
+    try:
+        if isinstance(fecha_evento, str):
+            return dt.datetime.fromisoformat(fecha_evento).date()
+        return fecha_evento
+    except ValueError:
+        return None
+
+def _forget_memoized_ledgers(liquidacion_resumen_ids: Iterable[Any]) -> None:
+    """
+    Drops the memoized ledgers of resúmenes that received new eventos. The
+    append RPC already updated their stored acumulados (sql/004), so the next
+    read fetches them instead of recomputing them here.
+    """
+    memo = _ledger_memo.get()
+    if not memo:
+        return
+    resumen_ids = set(liquidacion_resumen_ids)
+    stale = [pid for pid, ledger in memo.items() if ledger['resumen'] and ledger['resumen'].get('id') in resumen_ids]
+    for pid in stale:
+        del memo[pid]
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Check Int Min Charged", sample_rate=0.1)
 def check_if_int_min_already_charged(proposal_id: str, fecha_desembolso: dt.date) -> bool:
     """
     Verifica si el interés mínimo ya fue cobrado en algún pago anterior.
@@ -263,54 +782,56 @@ def check_if_int_min_already_charged(proposal_id: str, fecha_desembolso: dt.date
     Retorna True si algún pago ocurrió antes del día 15 desde el desembolso.
     Esto indica que el Int.Min ya fue aplicado y no debe cobrarse nuevamente
     en cronogramas de refinanciación.
+
+    Compara `fecha_desembolso` con `fecha_primer_evento` del resumen (mantenido
+    por append_liquidacion_eventos, ver sql/004): basta con el pago más
+    temprano, y la respuesta sigue la fecha que se pasa (p.ej. la de una
+    refinanciación). Si la columna aún no existe, recorre el historial de eventos.
     
     Args:
         proposal_id: ID de la propuesta/factura
-        fecha_desembolso: Fecha original de desembolso
+        fecha_desembolso: Fecha de desembolso contra la que se cuentan los 15 días
         
     Returns:
         True si Int.Min ya fue cobrado, False en caso contrario
     """
     try:
-        eventos = get_liquidacion_eventos(proposal_id)
-        
-        for evento in eventos:
-            fecha_evento_str = evento.get('fecha_evento')
-            if fecha_evento_str:
-                # Parsear fecha del evento
-                try:
-                    if isinstance(fecha_evento_str, str):
-                        fecha_evento = dt.datetime.fromisoformat(fecha_evento_str).date()
-                    else:
-                        fecha_evento = fecha_evento_str
-                    
-                    # Calcular días transcurridos desde desembolso
-                    dias_transcurridos = (fecha_evento - fecha_desembolso).days
-                    
-                    # Si algún pago ocurrió antes del día 15, Int.Min ya fue cobrado
-                    if dias_transcurridos < 15:
-                        return True
-                        
-                except (ValueError, AttributeError) as e:
-                    # Si hay error parseando fecha, continuar con siguiente evento
-                    continue
+        resumen = get_liquidacion_resumen(proposal_id)
+        if not resumen:
+            # Sin resumen no hay pagos registrados
+            return False
+
+        if 'fecha_primer_evento' in resumen:
+            primer_evento = _parse_fecha_evento(resumen['fecha_primer_evento'])
+            return primer_evento is not None and (primer_evento - fecha_desembolso).days < 15
+
+        for evento in get_liquidacion_eventos(proposal_id):
+            fecha_evento = _parse_fecha_evento(evento.get('fecha_evento'))
+            # Si algún pago ocurrió antes del día 15, Int.Min ya fue cobrado
+            if fecha_evento is not None and (fecha_evento - fecha_desembolso).days < 15:
+                return True
         
         # No se encontró ningún pago antes del día 15
         return False
         
     except Exception as e:
         print(f"[ERROR en check_if_int_min_already_charged]: {e}")
+        record_caught_error(e)
         # En caso de error, asumir que NO se cobró (comportamiento conservador)
         return False
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Saldo Favor", sample_rate=0.1)
 def get_saldo_favor_acumulado(proposal_id: str) -> float:
     """
-    Calcula el saldo a favor acumulado consultando el historial de eventos.
+    Obtiene el saldo a favor acumulado de una operación.
     
     El saldo a favor se genera cuando el cliente paga antes del vencimiento
     y los intereses devengados son menores a los facturados originalmente.
     Este saldo debe compensarse automáticamente con nuevos intereses generados
     en cronogramas de refinanciación.
+
+    Lee `saldo_favor_acumulado` del resumen (mantenido por append_liquidacion_eventos,
+    ver sql/004). Si la columna aún no existe, suma el historial de eventos.
     
     Args:
         proposal_id: ID de la propuesta/factura
@@ -319,35 +840,51 @@ def get_saldo_favor_acumulado(proposal_id: str) -> float:
         Saldo a favor acumulado (siempre >= 0)
     """
     try:
-        eventos = get_liquidacion_eventos(proposal_id)
-        
-        saldo_total = 0.0
-        
-        for evento in eventos:
-            resultado_json_str = evento.get('resultado_json', '{}')
-            
-            try:
-                resultado = json.loads(resultado_json_str) if isinstance(resultado_json_str, str) else resultado_json_str
-                
-                # Sumar saldo generado y restar saldo aplicado
-                saldo_generado = float(resultado.get('saldo_favor_generado', 0.0))
-                saldo_aplicado = float(resultado.get('saldo_favor_aplicado', 0.0))
-                
-                saldo_total += (saldo_generado - saldo_aplicado)
-                
-            except (json.JSONDecodeError, ValueError, TypeError) as e:
-                # Si hay error parseando un evento, continuar con el siguiente
-                continue
+        resumen = get_liquidacion_resumen(proposal_id)
+        if not resumen:
+            return 0.0
+
+        if 'saldo_favor_acumulado' in resumen:
+            saldo_total = float(resumen['saldo_favor_acumulado'] or 0.0)
+        else:
+            saldo_total = sum(_saldo_favor_delta(evento) for evento in get_liquidacion_eventos(proposal_id))
         
         # Asegurar que el saldo nunca sea negativo
         return max(0.0, saldo_total)
         
     except Exception as e:
         print(f"[ERROR en get_saldo_favor_acumulado]: {e}")
+        record_caught_error(e)
         # En caso de error, retornar 0 (comportamiento conservador)
         return 0.0
 
-def get_or_create_liquidacion_resumen(proposal_id: str, datos_operacion: Proposal) -> str:
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Rebuild Liquidacion Acumulados")
+def rebuild_liquidacion_acumulados(proposal_ids: Optional[List[str]] = None, aplicar: bool = True) -> List[Dict[str, Any]]:
+    """
+    Recalcula saldo_favor_acumulado y fecha_primer_evento de
+    liquidaciones_resumen desde el historial de eventos (RPC
+    `rebuild_liquidaciones_resumen_acumulados`, sql/004).
+
+    Args:
+        proposal_ids: Propuestas a verificar (None = todas)
+        aplicar: Si es False solo reporta diferencias, sin corregirlas
+
+    Returns:
+        Lista de resúmenes cuyo valor almacenado difería del recalculado
+    """
+    supabase = get_supabase_client()
+    try:
+        response = supabase.rpc('rebuild_liquidaciones_resumen_acumulados', {
+            'p_proposal_ids': proposal_ids,
+            'p_aplicar': aplicar,
+        }).execute()
+        return response.data or []
+    except Exception as e:
+        print(f"[ERROR en rebuild_liquidacion_acumulados]: {e}")
+        raise
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Or Create Liquidacion Resumen")
+def get_or_create_liquidacion_resumen(proposal_id: str, datos_operacion: Union[Proposal, ProposalData]) -> str:
     """Gets or creates a liquidation summary entry and returns its ID."""
     supabase = get_supabase_client()
     existing_resumen = get_liquidacion_resumen(proposal_id)
@@ -355,8 +892,10 @@ def get_or_create_liquidacion_resumen(proposal_id: str, datos_operacion: Proposa
         return existing_resumen['id']
 
     try:
-        recalc_data = json.loads(datos_operacion.get('recalculate_result_json', '{}'))
-        capital = recalc_data.get('calculo_con_tasa_encontrada', {}).get('capital', 0.0)
+        proposal = Proposal.coerce(datos_operacion)
+        if not proposal.has_recalculate_result:
+            load_recalculate_results([proposal])  # Read with a lighter projection
+        capital = proposal.capital
         new_entry = {
             "proposal_id": proposal_id,
             "saldo_actual": capital,
@@ -364,6 +903,9 @@ def get_or_create_liquidacion_resumen(proposal_id: str, datos_operacion: Proposa
         }
         response = supabase.table('liquidaciones_resumen').insert(new_entry).execute()
         if response.data:
+            memo = _ledger_memo.get()
+            if memo is not None:
+                memo[proposal_id] = {'resumen': response.data[0], 'eventos': []}
             return response.data[0]['id']
         else:
             raise Exception(f"Failed to create liquidacion_resumen: {getattr(response, 'error', 'Unknown error')}")
@@ -371,49 +913,86 @@ def get_or_create_liquidacion_resumen(proposal_id: str, datos_operacion: Proposa
         print(f"[ERROR en get_or_create_liquidacion_resumen]: {e}")
         raise
 
-def add_liquidacion_evento(liquidacion_resumen_id: str, tipo_evento: str, fecha_evento: dt.date, monto_recibido: float, dias_diferencia: int, resultado_json: dict) -> None:
-    """Adds a new event to the liquidacion_eventos table."""
+def _append_eventos(rpc_name: str, eventos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sends events to an append RPC in batches of EVENT_BATCH_SIZE and returns the inserted rows."""
     supabase = get_supabase_client()
+    inserted: List[Dict[str, Any]] = []
+    for start in range(0, len(eventos), EVENT_BATCH_SIZE):
+        batch = eventos[start:start + EVENT_BATCH_SIZE]
+        response = supabase.rpc(rpc_name, {'p_eventos': batch}).execute()
+        inserted.extend(response.data or [])
+    return inserted
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Append Liquidacion Eventos")
+def append_liquidacion_eventos(eventos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Appends liquidation events, possibly for many resúmenes, via the
+    `append_liquidacion_eventos` RPC (sql/003_append_eventos_rpc.sql).
+
+    orden_evento is allocated atomically in the database under a row lock on
+    each resumen, so concurrent liquidations of the same operation never
+    collide. Each batch of EVENT_BATCH_SIZE events is one request and one
+    transaction.
+
+    Args:
+        eventos: Dicts with liquidacion_resumen_id, tipo_evento, fecha_evento (date),
+                 monto_recibido, dias_diferencia and resultado_json (dict)
+
+    Returns:
+        The inserted rows, including their assigned orden_evento
+    """
     try:
-        last_event_response = supabase.table('liquidacion_eventos').select('orden_evento').eq('liquidacion_resumen_id', liquidacion_resumen_id).order('orden_evento', desc=True).limit(1).execute()
-        last_orden = last_event_response.data[0]['orden_evento'] if last_event_response.data else 0
-        
-        new_event = {
-            "liquidacion_resumen_id": liquidacion_resumen_id,
-            "orden_evento": last_orden + 1,
-            "tipo_evento": tipo_evento,
-            "fecha_evento": fecha_evento.isoformat(),
-            "monto_recibido": monto_recibido,
-            "dias_diferencia": dias_diferencia,
-            "resultado_json": json.dumps(resultado_json)
-        }
-        supabase.table('liquidacion_eventos').insert(new_event).execute()
+        payload = [liquidacion_evento_payload(e) for e in eventos]
+        inserted = _append_eventos('append_liquidacion_eventos', payload)
     except Exception as e:
-        print(f"[ERROR en add_liquidacion_evento]: {e}")
+        print(f"[ERROR en append_liquidacion_eventos]: {e}")
         raise
 
+    _forget_memoized_ledgers(evento.get('liquidacion_resumen_id') for evento in inserted)
+    return inserted
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Add Liquidacion Evento")
+def add_liquidacion_evento(liquidacion_resumen_id: str, tipo_evento: str, fecha_evento: dt.date, monto_recibido: float, dias_diferencia: int, resultado_json: dict) -> None:
+    """Adds a new event to the liquidacion_eventos table."""
+    append_liquidacion_eventos([{
+        "liquidacion_resumen_id": liquidacion_resumen_id,
+        "tipo_evento": tipo_evento,
+        "fecha_evento": fecha_evento,
+        "monto_recibido": monto_recibido,
+        "dias_diferencia": dias_diferencia,
+        "resultado_json": resultado_json,
+    }])
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Update Liquidacion Saldo")
 def update_liquidacion_resumen_saldo(liquidacion_resumen_id: str, saldo_actual: float) -> None:
     """Updates the saldo_actual in the liquidaciones_resumen table."""
     supabase = get_supabase_client()
     try:
         supabase.table('liquidaciones_resumen').update({'saldo_actual': saldo_actual}).eq('id', liquidacion_resumen_id).execute()
+
+        ledger = _memoized_ledger_for_resumen(liquidacion_resumen_id)
+        if ledger is not None:
+            ledger['resumen']['saldo_actual'] = saldo_actual
     except Exception as e:
         print(f"[ERROR en update_liquidacion_resumen_saldo]: {e}")
         raise
 
 # --- Disbursement Specific ---
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Desembolso Resumen")
 def get_desembolso_resumen(proposal_id: str) -> Optional[Dict[str, Any]]:
     """Retrieves the disbursement summary for a given proposal_id."""
     supabase = get_supabase_client()
     try:
-        response = supabase.table('desembolsos_resumen').select('*').eq('proposal_id', proposal_id).limit(1).execute()
+        response = execute_read(supabase.table('desembolsos_resumen').select('*').eq('proposal_id', proposal_id).limit(1))
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"[ERROR en get_desembolso_resumen]: {e}")
+        record_caught_error(e)
         return None
 
-def get_or_create_desembolso_resumen(proposal_id: str, datos_operacion: Proposal) -> str:
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Or Create Desembolso Resumen")
+def get_or_create_desembolso_resumen(proposal_id: str, datos_operacion: Union[Proposal, ProposalData]) -> str:
     """Gets or creates a disbursement summary and returns its ID."""
     supabase = get_supabase_client()
     existing_resumen = get_desembolso_resumen(proposal_id)
@@ -421,8 +1000,10 @@ def get_or_create_desembolso_resumen(proposal_id: str, datos_operacion: Proposal
         return existing_resumen['id']
     
     try:
-        recalc_data = json.loads(datos_operacion.get('recalculate_result_json', '{}'))
-        abono = recalc_data.get('desglose_final_detallado', {}).get('abono', {}).get('monto', 0.0)
+        proposal = Proposal.coerce(datos_operacion)
+        if not proposal.has_recalculate_result:
+            load_recalculate_results([proposal])  # Read with a lighter projection
+        abono = proposal.abono
         new_entry = {
             "proposal_id": proposal_id,
             "monto_desembolsado_total": abono,
@@ -436,110 +1017,174 @@ def get_or_create_desembolso_resumen(proposal_id: str, datos_operacion: Proposal
         print(f"[ERROR en get_or_create_desembolso_resumen]: {e}")
         raise
 
-def add_desembolso_evento(desembolso_resumen_id: str, tipo_evento: str, fecha_evento: dt.date, monto_desembolsado: float) -> None:
-    """Adds a new event to the desembolso_eventos table."""
-    supabase = get_supabase_client()
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Append Desembolso Eventos")
+def append_desembolso_eventos(eventos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Appends disbursement events, possibly for many resúmenes, via the
+    `append_desembolso_eventos` RPC. orden_evento is allocated atomically in
+    the database, as in `append_liquidacion_eventos`.
+
+    Args:
+        eventos: Dicts with desembolso_resumen_id, tipo_evento, fecha_evento (date)
+                 and monto_desembolsado
+
+    Returns:
+        The inserted rows, including their assigned orden_evento
+    """
     try:
-        last_event_response = supabase.table('desembolso_eventos').select('orden_evento').eq('desembolso_resumen_id', desembolso_resumen_id).order('orden_evento', desc=True).limit(1).execute()
-        last_orden = last_event_response.data[0]['orden_evento'] if last_event_response.data else 0
-        
-        new_event = {
-            "desembolso_resumen_id": desembolso_resumen_id,
-            "orden_evento": last_orden + 1,
-            "tipo_evento": tipo_evento,
-            "fecha_evento": fecha_evento.isoformat(),
-            "monto_desembolsado": monto_desembolsado,
-        }
-        supabase.table('desembolso_eventos').insert(new_event).execute()
+        payload = [desembolso_evento_payload(e) for e in eventos]
+        return _append_eventos('append_desembolso_eventos', payload)
     except Exception as e:
-        print(f"[ERROR en add_desembolso_evento]: {e}")
+        print(f"[ERROR en append_desembolso_eventos]: {e}")
         raise
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Add Desembolso Evento")
+def add_desembolso_evento(desembolso_resumen_id: str, tipo_evento: str, fecha_evento: dt.date, monto_desembolsado: float) -> None:
+    """Adds a new event to the desembolso_eventos table."""
+    append_desembolso_eventos([{
+        "desembolso_resumen_id": desembolso_resumen_id,
+        "tipo_evento": tipo_evento,
+        "fecha_evento": fecha_evento,
+        "monto_desembolsado": monto_desembolsado,
+    }])
+
 # --- Auditing ---
 
 def add_audit_event(usuario_id: str, entidad_id: str, accion: str, estado_anterior: str, estado_nuevo: str, detalles_adicionales: dict) -> None:
     """Adds a new event to the auditoria_eventos table."""
-    supabase = get_supabase_client()
+    add_audit_events([audit_row(usuario_id, entidad_id, accion, estado_anterior, estado_nuevo, detalles_adicionales)])
+
+def _insert_audit_rows(eventos: List[Dict[str, Any]]) -> None:
+    """Batch insert used by the audit writer (raises so failed batches get spooled)."""
+    get_supabase_client().table('auditoria_eventos').insert(eventos).execute()
+
+# Audit events are written behind the user's action, in batches, and spooled
+# locally while Supabase is unreachable (see AuditWriter). The writer (thread,
+# spool, atexit hook) is created on the first audit event, not at import.
+_AUDIT_WRITER: Optional[AuditWriter] = None
+_AUDIT_WRITER_LOCK = threading.Lock()
+
+def _get_audit_writer() -> AuditWriter:
+    global _AUDIT_WRITER
+    writer = _AUDIT_WRITER
+    if writer is not None:
+        return writer
+    with _AUDIT_WRITER_LOCK:
+        if _AUDIT_WRITER is None:
+            client = get_supabase_client()
+            # The local backend lives in memory: its spool must not outlive (or be shared across) processes
+            project = getattr(client, 'supabase_url', None) or f"local-{os.getpid()}"
+            _AUDIT_WRITER = AuditWriter(_insert_audit_rows, spool_path_for(project))
+        return _AUDIT_WRITER
+
+def add_audit_events(eventos: List[Dict[str, Any]]) -> None:
+    """
+    Queues several auditoria_eventos rows (built with `audit_row`).
+    Returns immediately; the background writer inserts them in batches.
+    Never raises, so an audit problem cannot roll back the main operation.
+    """
+    if not eventos:
+        return
     try:
-        new_event = {
-            "usuario_id": usuario_id,
-            "entidad_id": entidad_id,
-            "accion": accion,
-            "estado_anterior": estado_anterior,
-            "estado_nuevo": estado_nuevo,
-            "detalles_adicionales": json.dumps(detalles_adicionales),
-            "timestamp": dt.datetime.now().isoformat()
-        }
-        supabase.table('auditoria_eventos').insert(new_event).execute()
+        writer = _get_audit_writer()
     except Exception as e:
-        print(f"[ERROR en add_audit_event]: {e}")
-        # Not raising exception here to avoid rolling back the main operation if audit fails
-        pass
+        # Misconfigured writer (e.g. no AUDIT_SPOOL_PATH in production): insert synchronously
+        print(f"[ERROR en add_audit_events]: {e}")
+        try:
+            _insert_audit_rows(eventos)
+        except Exception as insert_error:
+            print(f"[ERROR en add_audit_events]: {insert_error}")
+        return
+    try:
+        writer.enqueue(eventos)
+    except Exception as e:
+        print(f"[ERROR en add_audit_events]: {e}")
+
+def flush_audit_events(timeout: Optional[float] = None) -> bool:
+    """Blocks until queued audit events are inserted (or spooled). False on timeout."""
+    writer = _AUDIT_WRITER
+    return writer.flush(timeout) if writer is not None else True
 
 # --- Functions for User Management & Access Control ---
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get User By Email")
 def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
     """Retrieves a user's record from 'authorized_users' by email."""
     supabase = get_supabase_client()
     try:
-        response = supabase.table('authorized_users').select('*').eq('email', email).limit(1).execute()
+        response = execute_read(supabase.table('authorized_users').select('*').eq('email', email).limit(1))
         return response.data[0] if response.data else None
     except Exception as e:
         # print(f"[ERROR in get_user_by_email]: {e}") # Suppress noise for checks
+        record_caught_error(e)
         return None
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Add Authorized User")
 def add_new_authorized_user(email: str) -> Optional[Dict[str, Any]]:
     """Adds a new user to 'authorized_users'."""
     supabase = get_supabase_client()
     try:
         response = supabase.table('authorized_users').insert({'email': email}).execute()
+        invalidate_permission_cache()
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"[ERROR in add_new_authorized_user]: {e}")
+        record_caught_error(e)
         return None
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Module By Name")
 def get_module_by_name(module_name: str) -> Optional[Dict[str, Any]]:
     """Retrieves a module's record from 'modules' by name."""
     supabase = get_supabase_client()
     try:
-        response = supabase.table('modules').select('*').eq('name', module_name).single().execute()
+        response = execute_read(supabase.table('modules').select('*').eq('name', module_name).single())
         return response.data if response.data else None
     except Exception as e:
         print(f"[ERROR in get_module_by_name]: {e}")
+        record_caught_error(e)
         return None
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get User Module Access")
 def get_user_module_access(user_id: int, module_id: int) -> Optional[Dict[str, Any]]:
     """Retrieves a user's access record for a specific module from 'user_module_access'."""
     supabase = get_supabase_client()
     try:
-        response = supabase.table('user_module_access').select('*').eq('user_id', user_id).eq('module_id', module_id).single().execute()
+        response = execute_read(supabase.table('user_module_access').select('*').eq('user_id', user_id).eq('module_id', module_id).single())
         return response.data if response.data else None
     except Exception as e:
         print(f"[ERROR in get_user_module_access]: {e}")
+        record_caught_error(e)
         return None
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Add User Module Access")
 def add_user_module_access(user_id: int, module_id: int, hierarchy_level: str = 'viewer') -> Optional[Dict[str, Any]]:
     """Grants a user access to a module with a specified hierarchy level."""
     supabase = get_supabase_client()
     try:
         response = supabase.table('user_module_access').insert({'user_id': user_id, 'module_id': module_id, 'hierarchy_level': hierarchy_level}).execute()
+        invalidate_permission_cache()
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"[ERROR in add_user_module_access]: {e}")
+        record_caught_error(e)
         return None
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Add Module")
 def add_module(name: str, description: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """Adds a new module to the 'modules' table."""
     supabase = get_supabase_client()
     try:
         response = supabase.table('modules').insert({'name': name, 'description': description}).execute()
+        invalidate_permission_cache()
         return response.data[0] if response.data else None
     except Exception as e:
         print(f"[ERROR in add_module]: {e}")
+        record_caught_error(e)
         return None
 
 # --- Functions for Registro de Clientes Module ---
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Create Emisor Deudor")
 def create_emisor_deudor(data: Dict[str, Any]) -> tuple[bool, str]:
     """
     Crea un nuevo emisor o deudor en la tabla EMISORES.ACEPTANTES.
@@ -578,12 +1223,16 @@ def create_emisor_deudor(data: Dict[str, Any]) -> tuple[bool, str]:
         
         # Insertar
         response = supabase.table('EMISORES.ACEPTANTES').insert(data).execute()
+        EMISOR_CACHE.invalidate(str(data['RUC']).strip())
+        _refresh_emisor_search_entry(response.data[0] if response.data else data)
         return True, f"Registro creado exitosamente: {data['Razon Social']}"
     except Exception as e:
         print(f"[ERROR en create_emisor_deudor]: {e}")
+        record_caught_error(e)
         return False, f"Error al crear registro: {str(e)}"
 
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Update Emisor Deudor")
 def update_emisor_deudor(ruc: str, data: Dict[str, Any]) -> tuple[bool, str]:
     """
     Actualiza un emisor o deudor existente.
@@ -614,12 +1263,16 @@ def update_emisor_deudor(ruc: str, data: Dict[str, Any]) -> tuple[bool, str]:
         # Actualizar (no permitir cambiar RUC)
         data_to_update = {k: v for k, v in data.items() if k != 'RUC'}
         response = supabase.table('EMISORES.ACEPTANTES').update(data_to_update).eq('RUC', ruc).execute()
+        EMISOR_CACHE.invalidate(str(ruc).strip())
+        _refresh_emisor_search_entry(response.data[0] if response.data else {**existing.data[0], **data_to_update})
         return True, "Registro actualizado exitosamente"
     except Exception as e:
         print(f"[ERROR en update_emisor_deudor]: {e}")
+        record_caught_error(e)
         return False, f"Error al actualizar registro: {str(e)}"
 
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List Emisores Deudores")
 def get_all_emisores_deudores(tipo: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Obtiene todos los emisores/deudores, opcionalmente filtrados por tipo.
@@ -635,16 +1288,77 @@ def get_all_emisores_deudores(tipo: Optional[str] = None) -> List[Dict[str, Any]
         query = supabase.table('EMISORES.ACEPTANTES').select('*')
         if tipo:
             query = query.eq('tipo', tipo)
-        response = query.execute()
+        response = execute_read(query)
         return response.data if response.data else []
     except Exception as e:
         print(f"[ERROR en get_all_emisores_deudores]: {e}")
+        record_caught_error(e)
         return []
 
 
+def _get_emisor_search() -> Dict[str, Any]:
+    """Returns the emisor search index, (re)building it when missing or stale."""
+    global _emisor_search
+    current = _emisor_search
+    if current is not None and time.monotonic() - current['loaded_at'] < _EMISOR_SEARCH_TTL_SECONDS:
+        return current
+
+    with _emisor_search_lock:
+        current = _emisor_search
+        if current is not None and time.monotonic() - current['loaded_at'] < _EMISOR_SEARCH_TTL_SECONDS:
+            return current
+
+        index = TextSearchIndex()
+        rows: Dict[str, Dict[str, Any]] = {}
+        for row in (row for page in iter_table_pages('EMISORES.ACEPTANTES', key='RUC') for row in page):
+            ruc = str(row.get('RUC') or '').strip()
+            if not ruc:
+                continue
+            rows[ruc] = row
+            index.add(ruc, row.get('Razon Social'), codes=[ruc])
+
+        _emisor_search = {'index': index, 'rows': rows, 'loaded_at': time.monotonic()}
+        return _emisor_search
+
+def _refresh_emisor_search_entry(row: Optional[Dict[str, Any]]) -> None:
+    """Re-indexes a created/updated registro, if the search index is already built."""
+    current = _emisor_search
+    if current is None or not row:
+        return
+    ruc = str(row.get('RUC') or '').strip()
+    if not ruc:
+        return
+    with _emisor_search_lock:
+        current['rows'][ruc] = row
+        current['index'].add(ruc, row.get('Razon Social'), codes=[ruc])
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Search Emisores")
+def search_emisores_ranked(search_term: str, page: int = 0, page_size: int = 20) -> tuple[List[Dict[str, Any]], int]:
+    """
+    Busca emisores/deudores por RUC (prefijo) o Razón Social (tokens sin tildes,
+    prefijos y tolerancia a errores de tipeo) en el índice en memoria.
+    
+    Args:
+        search_term: Término de búsqueda
+        page: Página (desde 0)
+        page_size: Resultados por página
+    
+    Returns:
+        Tuple (registros de la página ordenados por relevancia, total de coincidencias)
+    """
+    try:
+        search = _get_emisor_search()
+        rucs, total = search['index'].search(search_term, limit=page_size, offset=page * page_size)
+        return [dict(search['rows'][ruc]) for ruc in rucs], total
+    except Exception as e:
+        print(f"[ERROR en search_emisores_ranked]: {e}")
+        record_caught_error(e)
+        return [], 0
+
 def search_emisores_deudores(search_term: str) -> List[Dict[str, Any]]:
     """
     Busca emisores/deudores por RUC o Razón Social.
+    Devuelve todas las coincidencias ordenadas por relevancia (ver search_emisores_ranked).
     
     Args:
         search_term: Término de búsqueda
@@ -652,17 +1366,15 @@ def search_emisores_deudores(search_term: str) -> List[Dict[str, Any]]:
     Returns:
         Lista de diccionarios con los registros encontrados
     """
-    supabase = get_supabase_client()
     try:
-        # Buscar por RUC o Razón Social (case insensitive)
-        response = supabase.table('EMISORES.ACEPTANTES').select('*').or_(
-            f'RUC.ilike.%{search_term}%,"Razon Social".ilike.%{search_term}%'
-        ).execute()
-        return response.data if response.data else []
+        search = _get_emisor_search()
+        rucs, _ = search['index'].search(search_term, limit=None)
+        return [dict(search['rows'][ruc]) for ruc in rucs]
     except Exception as e:
         print(f"[ERROR en search_emisores_deudores]: {e}")
         return []
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Financial Conditions")
 def get_financial_conditions(ruc: str) -> Optional[Dict[str, float]]:
     """
     Retrieves default financial conditions for a given RUC from EMISORES.ACEPTANTES.
@@ -670,93 +1382,132 @@ def get_financial_conditions(ruc: str) -> Optional[Dict[str, float]]:
     """
     if not ruc:
         return None
-    supabase = get_supabase_client()
     try:
-        response = supabase.table('EMISORES.ACEPTANTES').select(
-            'tasa_avance, interes_mensual_pen, interes_moratorio_pen, interes_mensual_usd, interes_moratorio_usd, comision_estructuracion_pen, comision_estructuracion_usd, comision_estructuracion_pct, comision_afiliacion_pen, comision_afiliacion_usd, dias_minimos_interes'
-        ).eq('RUC', ruc).single().execute()
-        return response.data if response.data else None
+        row = _get_emisor_row(ruc)
+        return {col: row.get(col) for col in _FINANCIAL_CONDITION_COLUMNS} if row else None
     except Exception as e:
         print(f"[ERROR in get_financial_conditions]: {e}")
+        record_caught_error(e)
         return None
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List Proposals Page")
+def get_proposals_page(
+    emisor_ruc: Optional[str] = None,
+    fecha_inicio: Optional[dt.date] = None,
+    fecha_fin: Optional[dt.date] = None,
+    lote_filter: Optional[str] = None,
+    after_proposal_id: Optional[str] = None,
+    page_size: int = 500,
+    projection: str = 'full'
+) -> tuple[List[Proposal], Optional[str]]:
+    """
+    Fetches one page of proposals matching the filters, newest proposal_id first.
+
+    Uses keyset pagination on proposal_id: pass the returned cursor as
+    `after_proposal_id` to get the next page. The date range runs in the DB
+    against the indexed `fecha_propuesta` column; proposals whose date is unknown
+    (legacy IDs without a YYYYMMDD suffix) are kept, as before.
+
+    A page shorter than `page_size` does not end the scan, since a PostgREST
+    max-rows setting below `page_size` also shortens pages; only an empty page
+    does (one extra request at the end).
+
+    Args:
+        projection: Column profile from PROPOSAL_PROJECTIONS (default 'full');
+                    list screens should use 'list'
+
+    Returns:
+        Tuple (rows, next_cursor). next_cursor is None once a page comes back empty.
+    """
+    supabase = get_supabase_client()
+    query = supabase.table('propuestas').select(proposal_columns(projection))
+
+    if emisor_ruc:
+        query = query.eq('emisor_ruc', emisor_ruc)
+
+    if lote_filter:
+        query = query.ilike('identificador_lote', f"%{lote_filter}%")
+
+    if fecha_inicio or fecha_fin:
+        rango = []
+        if fecha_inicio:
+            rango.append(f"fecha_propuesta.gte.{fecha_inicio.isoformat()}")
+        if fecha_fin:
+            rango.append(f"fecha_propuesta.lte.{fecha_fin.isoformat()}")
+        query = query.or_(f"fecha_propuesta.is.null,and({','.join(rango)})")
+
+    if after_proposal_id:
+        query = query.lt('proposal_id', after_proposal_id)
+
+    response = execute_read(query.order('proposal_id', desc=True).limit(page_size))
+    rows = to_proposals(response.data)
+    next_cursor = rows[-1]['proposal_id'] if rows else None
+    return rows, next_cursor
+
+def iter_proposals_advanced(
+    emisor_ruc: Optional[str] = None,
+    fecha_inicio: Optional[dt.date] = None,
+    fecha_fin: Optional[dt.date] = None,
+    lote_filter: Optional[str] = None,
+    page_size: int = 500,
+    projection: str = 'full'
+) -> Iterator[List[Proposal]]:
+    """Yields successive pages from `get_proposals_page` until the result set is exhausted."""
+    cursor = None
+    while True:
+        rows, cursor = get_proposals_page(emisor_ruc, fecha_inicio, fecha_fin, lote_filter, cursor, page_size, projection)
+        if rows:
+            yield rows
+        if cursor is None:
+            return
+
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Search Proposals")
 def search_proposals_advanced(
     emisor_ruc: Optional[str] = None, 
     fecha_inicio: Optional[dt.date] = None, 
     fecha_fin: Optional[dt.date] = None,
-    lote_filter: Optional[str] = None
+    lote_filter: Optional[str] = None,
+    projection: str = 'full'
 ) -> List[Dict[str, Any]]:
     """
     Search proposals with multiple optional filters.
+    Collects every page from `iter_proposals_advanced`; prefer the iterator for large result sets.
+    Result lists should pass projection='list' (see PROPOSAL_PROJECTIONS).
     """
-    supabase = get_supabase_client()
     try:
-        query = supabase.table('propuestas').select('*')
-        
-        if emisor_ruc:
-            query = query.eq('emisor_ruc', emisor_ruc)
-        
-        if lote_filter:
-            query = query.ilike('identificador_lote', f"%{lote_filter}%")
-            
-        # Execute query without date filters (DB doesn't have reliable created_at)
-        response = query.order('proposal_id', desc=True).execute()
-        data = response.data if response.data else []
-        
-        # Filter by Date in Python (using proposal_id suffix YYYYMMDD)
-        filtered_data = []
-        if fecha_inicio or fecha_fin:
-            for item in data:
-                pid = item.get('proposal_id', '')
-                parts = pid.split('-')
-                if len(parts) >= 3:
-                    date_str = parts[-1] # Expecting YYYYMMDD
-                    if len(date_str) == 8 and date_str.isdigit():
-                        try:
-                            item_date = dt.datetime.strptime(date_str, '%Y%m%d').date()
-                            
-                            if fecha_inicio and item_date < fecha_inicio:
-                                continue
-                            if fecha_fin and item_date > fecha_fin:
-                                continue
-                                
-                            filtered_data.append(item)
-                        except:
-                            filtered_data.append(item) # Keep if cant parse? Or skip? Skip is safer for strict filter
-                    else:
-                        filtered_data.append(item) 
-                else:
-                    filtered_data.append(item)
-            return filtered_data
-        else:
-            return data
-
+        return [row for page in iter_proposals_advanced(emisor_ruc, fecha_inicio, fecha_fin, lote_filter, projection=projection) for row in page]
     except Exception as e:
         print(f"[ERROR in search_proposals_advanced]: {e}")
+        record_caught_error(e)
         return []
 
 # --- Enhanced User Management & Roles ---
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List Modules")
 def get_all_modules() -> List[Dict[str, Any]]:
     """Retrieves all modules from the 'modules' table."""
     supabase = get_supabase_client()
     try:
-        response = supabase.table('modules').select('*').order('id').execute()
+        response = execute_read(supabase.table('modules').select('*').order('id'))
         return response.data if response.data else []
     except Exception as e:
         print(f"[ERROR in get_all_modules]: {e}")
+        record_caught_error(e)
         return []
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="List Authorized Users")
 def get_all_authorized_users() -> List[Dict[str, Any]]:
     """Retrieves all authorized users."""
     supabase = get_supabase_client()
     try:
-        response = supabase.table('authorized_users').select('*').execute()
+        response = execute_read(supabase.table('authorized_users').select('*'))
         return response.data if response.data else []
     except Exception as e:
         print(f"[ERROR in get_all_authorized_users]: {e}")
+        record_caught_error(e)
         return []
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get Permissions Matrix")
 def get_full_permissions_matrix() -> List[Dict[str, Any]]:
     """
     Retrieves a joined Matrix of Modules -> Users per Role.
@@ -765,85 +1516,65 @@ def get_full_permissions_matrix() -> List[Dict[str, Any]]:
         {
             'module_id': 1, 
             'module_name': 'Registro', 
-            'super_user': 'super@example.com', 
-            'principal': 'boss@example.com', 
-            'secondary': 'worker@example.com'
+            'super_user': ['super@example.com'], 
+            'principal': ['boss@example.com'], 
+            'secondary': ['helper@example.com', 'worker@example.com']
         }, ...
     ]
-    Note: For this MVP, if multiple users share a role, we might only show one or comma separate.
-    We will assume SINGLE assignment per role/module for the simplified Matrix UI.
+    Read in one round trip from the `v_permissions_matrix` view (sql/005), which
+    joins and groups by module in the database. Each role is the sorted list of
+    its holders' emails (empty when nobody holds it); join them only for display.
     """
-    modules = get_all_modules()
-    users = get_all_authorized_users()
-    user_map = {u['id']: u['email'] for u in users} # ID -> Email
-    
-    # Get all access records
     supabase = get_supabase_client()
     try:
-        access_response = supabase.table('user_module_access').select('*').execute()
-        access_list = access_response.data if access_response.data else []
+        response = execute_read(supabase.table('v_permissions_matrix').select(
+            'module_id, module_name, super_user, principal, secondary'
+        ).order('module_id'))
+        return response.data if response.data else []
     except Exception as e:
-        print(f"[ERROR getting user_module_access]: {e}")
-        access_list = []
-
-    matrix = []
-    for mod in modules:
-        row = {
-            'module_id': mod['id'],
-            'module_name': mod['name'],
-            'super_user': '',
-            'principal': '',
-            'secondary': ''
-        }
-        
-        # Filter access for this module
-        mod_access = [a for a in access_list if a['module_id'] == mod['id']]
-        
-        for acc in mod_access:
-            role = acc.get('hierarchy_level', '').lower()
-            uid = acc.get('user_id')
-            email = user_map.get(uid, '')
-            
-            if role == 'super_user':
-                row['super_user'] = email # Last one wins if multiple
-            elif role == 'principal':
-                row['principal'] = email
-            elif role == 'secondary':
-                row['secondary'] = email
-                
-        matrix.append(row)
-        
-    return matrix
+        print(f"[ERROR in get_full_permissions_matrix]: {e}")
+        record_caught_error(e)
+        return []
 
-def update_module_access_role(module_id: int, role: str, email: str) -> tuple[bool, str]:
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Update Module Access Role")
+def update_module_access_role(module_id: int, role: str, email: str, remove: bool = False) -> tuple[bool, str]:
     """
-    Updates who holds a specific role (super_user, principal, secondary) for a module.
-    If email is empty, removes the role assignment.
-    If email is new, creates authorized_user if needed (optional) or errors.
-    This Implementation assumes ONE user per role per module (replaces existing).
+    Adds or removes ONE holder of a role (super_user, principal, secondary) for a module.
+
+    A role can have several holders (see get_full_permissions_matrix); the other
+    holders are never touched. Adding an email not yet in authorized_users
+    creates it there first; adding a current holder is a no-op.
+
+    Args:
+        module_id: Module to change
+        role: hierarchy_level to add the user to / remove the user from
+        email: The holder to add or remove
+        remove: Remove this holder instead of adding it
     """
+    if not email or not email.strip():
+        return False, "Indica el email del usuario."
     supabase = get_supabase_client()
-    
-    # 1. Resolve User
-    if not email:
-        # Removal logic: Delete all entries for this module + role
+    clean_email = email.lower().strip()
+    user = get_user_by_email(clean_email)
+
+    if remove:
+        if not user:
+            return True, f"{clean_email} no tenía el rol {role}."
         try:
-            # We need to find IDs to delete? Or just delete by filter
-            supabase.table('user_module_access').delete().eq('module_id', module_id).eq('hierarchy_level', role).execute()
-            return True, f"Rol {role} removido del módulo."
+            supabase.table('user_module_access').delete().eq('module_id', module_id).eq(
+                'hierarchy_level', role
+            ).eq('user_id', user['id']).execute()
+            return True, f"Usuario {clean_email} removido del rol {role}."
         except Exception as e:
+            print(f"[ERROR removing access]: {e}")
+            record_caught_error(e)
             return False, f"Error removiendo rol: {e}"
+        finally:
+            invalidate_permission_cache()
 
-    clean_email = email.lower().strip()
-    user = get_user_by_email(clean_email)
-    
     if not user:
-        # Option: Auto-create user? Let's say yes for smooth UX, or block.
-        # Plan said "Assign Users", implying they might need to exist. 
-        # But 'authorized_users' table feels like the whitelist.
-        # Let's auto-add to authorized_users if not exists?
-        # User prompt: "El secundario podra entrar solo si el principal lo autoriza".
-        # This implies adding them effectively authorizes them.
+        # Adding a user to a module authorizes it ("El secundario podra entrar
+        # solo si el principal lo autoriza"), so unknown emails are whitelisted
         new_user = add_new_authorized_user(clean_email)
         if not new_user:
             return False, f"No se pudo crear/encontrar usuario {clean_email}"
@@ -851,95 +1582,133 @@ def update_module_access_role(module_id: int, role: str, email: str) -> tuple[bo
     else:
         user_id = user['id']
 
-    # 2. Update Access
-    # Strategy: Delete old user for this role/module, Insert new one.
     try:
-        # Remove old holder of this role
-        supabase.table('user_module_access').delete().eq('module_id', module_id).eq('hierarchy_level', role).execute()
-        
-        # Insert new holder
-        new_access = {
+        existing = execute_read(supabase.table('user_module_access').select('user_id').eq(
+            'module_id', module_id
+        ).eq('hierarchy_level', role).eq('user_id', user_id).limit(1))
+        if existing.data:
+            return True, f"Usuario {clean_email} ya es {role}."
+        supabase.table('user_module_access').insert({
             'user_id': user_id,
             'module_id': module_id,
             'hierarchy_level': role
-        }
-        supabase.table('user_module_access').insert(new_access).execute()
+        }).execute()
         return True, f"Usuario {clean_email} asignado como {role}."
     except Exception as e:
         print(f"[ERROR updating access]: {e}")
+        record_caught_error(e)
         return False, f"Error DB: {e}"
+    finally:
+        invalidate_permission_cache()
+
+def invalidate_permission_cache() -> None:
+    """Drops the permission snapshot so the next access check reloads it."""
+    global _permission_snapshot
+    with _permission_snapshot_lock:
+        _permission_snapshot = None
+
+def _get_permission_snapshot() -> Dict[str, Any]:
+    """
+    Returns the current permission snapshot, reloading it when missing or older
+    than _PERMISSION_TTL_SECONDS:
+        {'module_ids': {name: id}, 'user_ids': {email: id},
+         'access': {module_id: {user_id: hierarchy_level}}}
+    Raises if Supabase cannot be reached (nothing is cached in that case).
+    """
+    global _permission_snapshot
+    snapshot = _permission_snapshot
+    if snapshot is not None and time.monotonic() - snapshot['loaded_at'] < _PERMISSION_TTL_SECONDS:
+        return snapshot
+
+    with _permission_snapshot_lock:
+        # Another thread may have refreshed it while we waited
+        snapshot = _permission_snapshot
+        if snapshot is not None and time.monotonic() - snapshot['loaded_at'] < _PERMISSION_TTL_SECONDS:
+            return snapshot
+
+        supabase = get_supabase_client()
+        modules = execute_read(supabase.table('modules').select('id, name')).data or []
+        users = execute_read(supabase.table('authorized_users').select('id, email')).data or []
+        access_rows = execute_read(supabase.table('user_module_access').select('user_id, module_id, hierarchy_level')).data or []
+
+        access: Dict[Any, Dict[Any, str]] = {}
+        for row in access_rows:
+            access.setdefault(row['module_id'], {}).setdefault(row['user_id'], row.get('hierarchy_level'))
+
+        snapshot = {
+            'loaded_at': time.monotonic(),
+            'module_ids': {},
+            'user_ids': {},
+            'access': access,
+        }
+        for mod in modules:
+            snapshot['module_ids'].setdefault(mod['name'], mod['id'])
+        for user in users:
+            snapshot['user_ids'].setdefault(user['email'], user['id'])
+
+        _permission_snapshot = snapshot
+        return snapshot
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Check User Access", sample_rate=0.1)
 def check_user_access(module_name: str, user_email: str) -> bool:
     """
     Checks if a user has access to a specific module.
     Logic:
     1. If module has NO roles assigned (empty matrix for this module) -> Allow All (Default Open).
     2. If module HAS roles assigned -> Only allow if user is in [Super, Principal, Secondary].
+    Answered from the in-process permission snapshot (no queries while it is fresh).
     """
-    supabase = get_supabase_client()
     try:
+        snapshot = _get_permission_snapshot()
+
         # Get Module ID
-        mod = get_module_by_name(module_name)
-        if not mod:
+        module_id = snapshot['module_ids'].get(module_name)
+        if module_id is None:
             return True # Module doesn't exist? Fail open or closed? Let's say Open for dev.
         
-        module_id = mod['id']
-        
         # Get all access entries for this module
-        # We can optimize this by query count, but let's just fetch
-        access_response = supabase.table('user_module_access').select('user_id').eq('module_id', module_id).execute()
-        access_list = access_response.data if access_response.data else []
+        module_access = snapshot['access'].get(module_id, {})
         
         # RULE 1: Default Open
-        if not access_list:
+        if not module_access:
             return True
             
         # RULE 2: Strict Check
         if not user_email:
             return False # No email, no access if restricted
             
-        user = get_user_by_email(user_email)
-        if not user:
+        user_id = snapshot['user_ids'].get(user_email)
+        if user_id is None:
             return False
             
-        user_id = user['id']
-        
-        # Check if user_id is in access_list
-        allowed_ids = [a['user_id'] for a in access_list]
-        return user_id in allowed_ids
+        return user_id in module_access
         
     except Exception as e:
         print(f"[ERROR check_user_access]: {e}")
+        record_caught_error(e)
         return True # Fail Open to avoid locking everyone out on error? Or False? Safer is False but for this project maybe True? Let's stick to True (Open) for stability.
 
+@measure_latency(source="MiniERP", destination="Supabase DB", operation_name="Get User Role", sample_rate=0.1)
 def get_user_role(module_name: str, user_email: str) -> Optional[str]:
     """
     Returns the role ('super_user', 'principal', 'secondary') for a user in a module.
     Returns None if no specific role found (or module/user not found).
+    Answered from the in-process permission snapshot.
     """
     if not user_email: return None
     
-    supabase = get_supabase_client()
     try:
-        # Get User ID
-        # Reuse existing function if possible or query
-        user_resp = supabase.table('authorized_users').select('id').eq('email', user_email).single().execute()
-        if not user_resp.data: return None
-        user_id = user_resp.data['id']
-        
-        # Get Module ID
-        mod_resp = supabase.table('app_modules').select('id').eq('name', module_name).single().execute()
-        if not mod_resp.data: return None
-        module_id = mod_resp.data['id']
-        
-        # Get Access
-        acc_resp = supabase.table('user_module_access').select('hierarchy_level').eq('user_id', user_id).eq('module_id', module_id).limit(1).execute()
+        snapshot = _get_permission_snapshot()
+
+        user_id = snapshot['user_ids'].get(user_email)
+        if user_id is None: return None
         
-        if acc_resp.data:
-            return acc_resp.data[0]['hierarchy_level']
+        module_id = snapshot['module_ids'].get(module_name)
+        if module_id is None: return None
         
-        return None
+        return snapshot['access'].get(module_id, {}).get(user_id)
         
     except Exception as e:
         print(f"[ERROR in get_user_role]: {e}")
+        record_caught_error(e)
         return None
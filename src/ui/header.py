@@ -2,6 +2,11 @@ import streamlit as st
 import os
 import base64
 
+from src.utils.query_stats import last_rerun_stats, start_rerun
+from src.utils.tracing import last_rerun_trace, start_rerun_trace
+from src.ui.query_stats_panel import query_stats_panel_enabled, render_query_stats_panel
+from src.ui.trace_panel import render_trace_waterfall
+
 def get_base64_image(image_path):
     """Encodes an image file to a base64 string."""
     try:
@@ -19,7 +24,21 @@ def render_header(title: str):
     - Left: Geesoft Logo
     - Center: Page Title
     - Right: Logout Button (Top) + Inandes Logo (Bottom)
+
+    Also starts the per-rerun Supabase query counters and trace and, when
+    enabled, shows the previous run's query summary and waterfall in the sidebar.
     """
+    start_rerun()
+    start_rerun_trace()
+    if query_stats_panel_enabled():
+        previous = last_rerun_stats()
+        previous_trace = last_rerun_trace()
+        with st.sidebar:
+            if previous is not None:
+                render_query_stats_panel(previous, title="🔎 Consultas (ejecución anterior)")
+            if previous_trace is not None:
+                render_trace_waterfall(previous_trace, title="⏱️ Traza (ejecución anterior)")
+
     # Calculate project root relative to this file (src/ui/header.py -> project_root)
     current_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.abspath(os.path.join(current_dir, "..", ".."))
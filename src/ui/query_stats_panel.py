@@ -0,0 +1,42 @@
+import os
+from typing import Optional
+
+import streamlit as st
+
+from src.utils.query_stats import QueryStats, current_query_stats, last_rerun_stats
+
+
+def query_stats_panel_enabled() -> bool:
+    """The panel is shown when QUERY_STATS_PANEL=1 (env var) or st.session_state['show_query_stats'] is set."""
+    if os.environ.get("QUERY_STATS_PANEL", "").lower() in ("1", "true", "yes"):
+        return True
+    return bool(st.session_state.get("show_query_stats"))
+
+def render_query_stats_panel(stats: Optional[QueryStats] = None, title: str = "🔎 Consultas a Supabase") -> None:
+    """
+    Renders round trips, bytes, DB time, per-table breakdown and N+1 warnings.
+
+    Without `stats`, shows the current run when called at the end of a page,
+    or the previous complete run when called before the page's own queries
+    (as render_header does).
+    """
+    if stats is None:
+        current = current_query_stats()
+        stats = current if current.round_trips else last_rerun_stats()
+    if stats is None:
+        return
+
+    summary = stats.summary()
+    label = f"{title} · {summary['round_trips']} llamadas · {summary['db_time_ms']:.0f} ms"
+    with st.expander(label, expanded=bool(summary['findings'])):
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Round trips", summary['round_trips'])
+        c2.metric("KB recibidos", summary['kb_received'])
+        c3.metric("KB enviados", summary['kb_sent'])
+        c4.metric("Tiempo BD (ms)", summary['db_time_ms'])
+        if summary['errors']:
+            st.error(f"{summary['errors']} respuestas con error HTTP")
+        for finding in summary['findings']:
+            st.warning(finding)
+        if summary['tables']:
+            st.dataframe(summary['tables'], use_container_width=True, hide_index=True)
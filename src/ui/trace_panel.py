@@ -0,0 +1,52 @@
+import json
+from typing import Optional
+
+import altair as alt
+import pandas as pd
+import streamlit as st
+
+from src.utils.tracing import Trace, current_trace, last_rerun_trace
+
+
+def render_trace_waterfall(trace: Optional[Trace] = None, title: str = "⏱️ Traza de la ejecución") -> None:
+    """
+    Renders the spans of a rerun as a waterfall (one bar per span, nested
+    spans indented under their parent) plus a table with total and self time.
+
+    Without `trace`, shows the current run when it has spans, otherwise the
+    previous complete run (as render_header does).
+    """
+    if trace is None:
+        current = current_trace()
+        trace = current if current.spans else last_rerun_trace()
+    if trace is None:
+        return
+
+    rows = trace.waterfall()
+    if not rows:
+        return
+    total_ms = max(row["offset_ms"] + row["duration_ms"] for row in rows)
+    label = f"{title} · {len(rows)} spans · {total_ms:.0f} ms"
+    with st.expander(label, expanded=False):
+        df = pd.DataFrame(rows)
+        df["orden"] = range(len(df))
+        df["fin_ms"] = df["offset_ms"] + df["duration_ms"]
+        chart = alt.Chart(df).mark_bar().encode(
+            x=alt.X("offset_ms:Q", title="ms desde el inicio"),
+            x2="fin_ms:Q",
+            # One row per span (same-name spans would share a row on y="span");
+            # the axis labels show the span names
+            y=alt.Y(
+                "orden:O", title=None,
+                axis=alt.Axis(labelLimit=320, labelExpr=f"{json.dumps(df['span'].tolist())}[datum.value]"),
+            ),
+            color=alt.Color("status:N", scale=alt.Scale(domain=["OK", "ERROR"], range=["#4c78a8", "#e45756"]), legend=None),
+            tooltip=["span", "duration_ms", "self_ms", "offset_ms", "status"],
+        ).properties(height=max(120, 18 * len(df)))
+        st.altair_chart(chart, use_container_width=True)
+        st.dataframe(
+            df[["span", "duration_ms", "self_ms", "offset_ms", "status"]],
+            use_container_width=True, hide_index=True,
+        )
+        if trace.dropped:
+            st.caption(f"{trace.dropped} spans adicionales no se registraron (límite por ejecución).")
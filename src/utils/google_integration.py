@@ -7,6 +7,7 @@ import os
 # import streamlit_google_picker.uploaded_file as lib_upl # Import for monkeypatching
 import uuid  # Para generar keys únicas por sesión
 import io
+from src.utils.latency import measure_latency, record_caught_error
 
 # --- HELPER FUNCTION FOR SA CREDENTIALS ---
 def get_sa_credentials_dict():
@@ -111,6 +112,7 @@ def patch_picker_flatten():
 # --------------------------
 
 # --- HELPER: Listar Carpetas con Service Account (Backend del Browser Nativo) ---
+@measure_latency(source="MiniERP", destination="Google Drive API", operation_name="List Folders (SA)")
 def list_folders_with_sa(parent_id, sa_creds):
     """
     Lista las subcarpetas dentro de parent_id usando credenciales de Service Account.
@@ -138,11 +140,13 @@ def list_folders_with_sa(parent_id, sa_creds):
         
         return results.get('files', [])
     except Exception as e:
+        record_caught_error(e)
         st.error(f"Error listando carpetas: {e}")
         return []
 
 # ---------------------------------------------------------
 
+@measure_latency(source="MiniERP", destination="Google Drive API", operation_name="Get SA Token")
 def get_service_account_token():
     """
     Genera un access_token FRESCO del Service Account para usar en el Google Picker.
@@ -172,12 +176,14 @@ def get_service_account_token():
         return creds.token
         
     except Exception as e:
+        record_caught_error(e)
         st.error(f"❌ Error generando token del Service Account: {e}")
         import traceback
         st.code(traceback.format_exc())  # Mostrar stack trace completo
         return None
 # --------------------------
 
+@measure_latency(source="MiniERP", destination="Google Drive API", operation_name="Upload File (Token)")
 def upload_file_to_drive(file_data, file_name, folder_id, access_token):
     """
     Uploads a file (bytes) to a specific Google Drive folder using the Drive API v3 (REST).
@@ -210,6 +216,7 @@ def upload_file_to_drive(file_data, file_name, folder_id, access_token):
             return False, f"Error {response.status_code}: {response.text}"
             
     except Exception as e:
+        record_caught_error(e)
         return False, str(e)
 
 def render_drive_picker_uploader(key, file_data, file_name, label="Guardar en Google Drive"):
@@ -374,7 +381,6 @@ def render_drive_picker_uploader(key, file_data, file_name, label="Guardar en Go
             st.error(f"Error procesando la selección del picker: {e}")
 
 from googleapiclient.http import MediaIoBaseUpload
-from src.utils.latency import measure_latency
 
 @measure_latency(source="MiniERP", destination="Google Drive API", operation_name="Upload File (SA)")
 def upload_file_with_sa(file_bytes, file_name, folder_id, sa_credentials):
@@ -427,6 +433,7 @@ def upload_file_with_sa(file_bytes, file_name, folder_id, sa_credentials):
         return True, file.get('id')
         
     except Exception as e:
+        record_caught_error(e)
         # Debugging Info Propagation
         debug_msg = str(e)
         if isinstance(sa_credentials, dict) and 'private_key' in sa_credentials:
@@ -718,6 +725,7 @@ def _render_folder_brick(folder, key, nav_key_history, nav_key_id, nav_key_name,
 # --- EXTENSION FOR REPOSITORIO (BROWSER + FILES + CREATE FOLDER) ---
 # -----------------------------------------------------------------------------
 
+@measure_latency(source="MiniERP", destination="Google Drive API", operation_name="List Files (SA)")
 def list_all_files_with_sa(parent_id, sa_creds):
     """
     Lista TODO (Carpetas + Archivos) dentro de parent_id.
@@ -745,9 +753,11 @@ def list_all_files_with_sa(parent_id, sa_creds):
         
         return results.get('files', [])
     except Exception as e:
+        record_caught_error(e)
         st.error(f"Error listando archivos: {e}")
         return []
 
+@measure_latency(source="MiniERP", destination="Google Drive API", operation_name="Create Folder (SA)")
 def create_folder_with_sa(parent_id, folder_name, sa_creds):
     """Crea una subcarpeta."""
     try:
@@ -777,6 +787,7 @@ def create_folder_with_sa(parent_id, folder_name, sa_creds):
         
         return True, file.get('id')
     except Exception as e:
+        record_caught_error(e)
         return False, str(e)
 
 
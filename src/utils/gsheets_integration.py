@@ -5,6 +5,7 @@ Funciones para leer datos desde Google Sheets usando Service Account.
 import gspread
 from google.oauth2 import service_account
 from src.utils.google_integration import get_sa_credentials_dict
+from src.utils.latency import measure_latency
 
 
 def get_gsheets_client():
@@ -34,6 +35,7 @@ def get_gsheets_client():
     return gspread.authorize(creds)
 
 
+@measure_latency(source="MiniERP", destination="Google Sheets API", operation_name="Read Sheet")
 def read_sheet_data(spreadsheet_id, worksheet_name=None, worksheet_gid=None):
     """
     Lee todos los datos de una pestaña específica de Google Sheets.
@@ -119,6 +121,7 @@ def read_sheet_data(spreadsheet_id, worksheet_name=None, worksheet_gid=None):
     }
 
 
+@measure_latency(source="MiniERP", destination="Google Sheets API", operation_name="List Worksheets")
 def list_worksheets(spreadsheet_id):
     """
     Lista todas las pestañas disponibles en un Google Spreadsheet.
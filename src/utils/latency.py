@@ -1,106 +1,462 @@
+import contextvars
+import math
+import os
+import random
+import threading
 import time
 import functools
+import inspect
 import datetime
+from collections import deque
 import pandas as pd
 import streamlit as st
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Deque, Tuple
+
+from src.utils.latency_archive import archive_from_env
+from src.utils.latency_metrics import process_metrics, start_exporters_from_env
+from src.utils.tracing import record_span, span
+
+# Raw events kept per session (oldest dropped first); summaries come from the histograms
+_DEFAULT_MAX_EVENTS = 1000
+# Histogram bucket growth: each bucket is 5% wider than the previous one,
+# so percentiles are exact to within ~2.5% with a few hundred buckets at most
+_BUCKET_GROWTH = 1.05
+_MIN_TRACKED_MS = 0.001
+
+_EVENT_COLUMNS = ["timestamp", "source", "destination", "operation", "duration_ms", "status", "details"]
+_SUMMARY_COLUMNS = ["source", "destination", "operation", "count", "error_rate", "p50_ms", "p95_ms", "p99_ms", "max_ms", "mean_ms"]
+
+
+class LatencyHistogram:
+    """
+    Streaming log-bucketed histogram of durations (ms).
+
+    Memory is bounded by the number of distinct buckets (logarithmic in the
+    max/min ratio), not by the number of recorded values.
+    """
+
+    _LOG_GROWTH = math.log(_BUCKET_GROWTH)
+
+    def __init__(self):
+        self.count = 0.0
+        self.errors = 0.0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._buckets: Dict[int, float] = {}
+
+    def record(self, duration_ms: float, error: bool = False, weight: float = 1.0) -> None:
+        """`weight` is the number of calls this one stands for (1/sample rate when sampled)."""
+        index = math.floor(math.log(max(duration_ms, _MIN_TRACKED_MS)) / self._LOG_GROWTH)
+        self._buckets[index] = self._buckets.get(index, 0) + weight
+        self.count += weight
+        self.errors += weight if error else 0
+        self.total_ms += duration_ms * weight
+        if duration_ms > self.max_ms:
+            self.max_ms = duration_ms
+
+    def percentile(self, q: float) -> float:
+        """Approximate q-th percentile (0-100): midpoint of the bucket holding that rank, capped at max."""
+        if not self.count:
+            return 0.0
+        rank = self.count * q / 100
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                lower = _BUCKET_GROWTH ** index
+                return min(lower * (1 + _BUCKET_GROWTH) / 2, self.max_ms)
+        return self.max_ms
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": round(self.count),
+            "error_rate": round(self.errors / self.count, 4) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 2),
+            "p95_ms": round(self.percentile(95), 2),
+            "p99_ms": round(self.percentile(99), 2),
+            "max_ms": round(self.max_ms, 2),
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+        }
+
+
+# Event sinks: called for every event as sink(timestamp, source, destination,
+# operation, duration_ms, status, details, weight), beside the per-session store.
+# `weight` is the number of calls the event stands for (see measure_latency sampling).
+# The process-wide aggregator (src/utils/latency_metrics.py) is always registered.
+LatencySink = Callable[[float, str, str, str, float, str, str, float], None]
+_sinks: List[LatencySink] = [process_metrics]
+_sinks_lock = threading.Lock()
+
+def register_sink(sink: LatencySink) -> None:
+    """Adds a sink for every latency event of the process (idempotent)."""
+    global _sinks
+    with _sinks_lock:
+        if sink not in _sinks:
+            _sinks = _sinks + [sink]  # Copy-on-write: log_event iterates without locking
+
+def unregister_sink(sink: LatencySink) -> None:
+    global _sinks
+    with _sinks_lock:
+        _sinks = [s for s in _sinks if s is not sink]
+
+
+class _LatencyStore:
+    """Per-session storage: ring buffer of raw events + one histogram per (source, destination, operation)."""
+
+    def __init__(self, max_events: int):
+        self.events: Deque[Tuple[float, str, str, str, float, str, str]] = deque(maxlen=max_events)
+        self.histograms: Dict[Tuple[str, str, str], LatencyHistogram] = {}
+        self.lock = threading.Lock()
+
+    def add(self, timestamp: float, source: str, destination: str, operation: str, duration_ms: float, status: str, details: str, weight: float) -> None:
+        with self.lock:
+            self.events.append((timestamp, source, destination, operation, duration_ms, status, details))
+            key = (source, destination, operation)
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            histogram.record(duration_ms, error=status != "OK", weight=weight)
+
+
+try:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx as _get_script_run_ctx
+except ImportError:
+    _get_script_run_ctx = None
+
+def _in_streamlit_run() -> bool:
+    if _get_script_run_ctx is None:
+        return False
+    try:
+        return _get_script_run_ctx(suppress_warning=True) is not None
+    except Exception:
+        return False
+
 
 class LatencyMonitor:
     """
     Singleton class to collect latency metrics.
-    Stores logs in st.session_state to ensure persistence across page navigation.
+    Stores them in st.session_state to ensure persistence across page navigation:
+    the last LATENCY_MAX_EVENTS raw events (default 1000) plus per-operation
+    histograms, so memory stays constant in long-lived sessions.
     """
     _instance = None
-    _KEY = "latency_monitor_logs"
-    
+    _KEY = "latency_monitor_store"
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(LatencyMonitor, cls).__new__(cls)
+            cls._instance._fallback_store = None
+            cls._instance._fallback_lock = threading.Lock()
         return cls._instance
 
-    def _get_storage(self) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _max_events() -> int:
+        try:
+            return max(1, int(os.environ.get("LATENCY_MAX_EVENTS", _DEFAULT_MAX_EVENTS)))
+        except ValueError:
+            return _DEFAULT_MAX_EVENTS
+
+    def _get_store(self) -> _LatencyStore:
         """Helper to get storage from session state safely."""
-        # Check if we are in a streamlit context context
-        if hasattr(st, "session_state"):
-            if self._KEY not in st.session_state:
-                st.session_state[self._KEY] = []
-            return st.session_state[self._KEY]
-        else:
-            # Fallback for testing outside streamlit
-            if not hasattr(self, "_fallback_logs"):
-                self._fallback_logs = []
-            return self._fallback_logs
-
-    def log_event(self, source: str, destination: str, operation: str, duration_ms: float, status: str = "OK", details: str = ""):
+        # Check if we are in a streamlit script run
+        if _in_streamlit_run():
+            store = st.session_state.get(self._KEY)
+            if store is None:
+                store = st.session_state[self._KEY] = _LatencyStore(self._max_events())
+            return store
+        # Fallback for scripts and tests outside streamlit
+        with self._fallback_lock:
+            if self._fallback_store is None:
+                self._fallback_store = _LatencyStore(self._max_events())
+            return self._fallback_store
+
+    def log_event(self, source: str, destination: str, operation: str, duration_ms: float, status: str = "OK", details: str = "", weight: float = 1.0):
         """
-        Record a latency event.
+        Record a latency event. `weight` is the number of calls it represents
+        (1/sample rate for a sampled call, 1 otherwise).
         """
-        event = {
-            "timestamp": datetime.datetime.now().isoformat(),
-            "source": source,
-            "destination": destination,
-            "operation": operation,
-            "duration_ms": round(duration_ms, 2),
-            "status": status,
-            "details": details
-        }
-        storage = self._get_storage()
-        storage.append(event)
-    
+        timestamp = time.time()
+        self._get_store().add(timestamp, source, destination, operation, duration_ms, status, details, weight)
+        for sink in _sinks:
+            try:
+                sink(timestamp, source, destination, operation, duration_ms, status, details, weight)
+            except Exception as e:
+                # Instrumentation must never break the measured call
+                print(f"[ERROR en sink de latencia]: {e}")
+
     def get_logs(self) -> List[Dict[str, Any]]:
-        """Return all recorded logs."""
-        return self._get_storage()
+        """Return the retained raw events (most recent LATENCY_MAX_EVENTS), oldest first."""
+        store = self._get_store()
+        with store.lock:
+            events = list(store.events)
+        return [
+            {
+                "timestamp": datetime.datetime.fromtimestamp(ts).isoformat(),
+                "source": source,
+                "destination": destination,
+                "operation": operation,
+                "duration_ms": round(duration_ms, 2),
+                "status": status,
+                "details": details,
+            }
+            for ts, source, destination, operation, duration_ms, status, details in events
+        ]
 
     def get_dataframe(self) -> pd.DataFrame:
-        """Return logs as a pandas DataFrame."""
+        """Return the retained raw events as a pandas DataFrame."""
         logs = self.get_logs()
         if not logs:
-            return pd.DataFrame(columns=["timestamp", "source", "destination", "operation", "duration_ms", "status", "details"])
+            return pd.DataFrame(columns=_EVENT_COLUMNS)
         return pd.DataFrame(logs)
 
+    def get_summary(self) -> List[Dict[str, Any]]:
+        """
+        Per (source, destination, operation): count, error rate and
+        p50/p95/p99/max/mean latency over every event of the session
+        (not just the retained ones). Cost is O(keys), independent of volume.
+        """
+        store = self._get_store()
+        with store.lock:
+            return [
+                {"source": source, "destination": destination, "operation": operation, **histogram.summary()}
+                for (source, destination, operation), histogram in sorted(store.histograms.items())
+            ]
+
+    def get_summary_dataframe(self) -> pd.DataFrame:
+        """Return `get_summary()` as a pandas DataFrame."""
+        return pd.DataFrame(self.get_summary(), columns=_SUMMARY_COLUMNS)
+
+    def get_process_summary(self) -> List[Dict[str, Any]]:
+        """Fleet view: latency per (source, destination, operation, status) across every session of the process."""
+        return process_metrics.summary()
+
     def clear_logs(self):
-        """Clear the current session logs."""
-        if hasattr(st, "session_state"):
-            st.session_state[self._KEY] = []
-        if hasattr(self, "_fallback_logs"):
-            self._fallback_logs = []
+        """Clear the current session logs and histograms."""
+        if _in_streamlit_run():
+            st.session_state[self._KEY] = _LatencyStore(self._max_events())
+        with self._fallback_lock:
+            self._fallback_store = None
 
 # Global instance
 monitor = LatencyMonitor()
+start_exporters_from_env()
+# LATENCY_ARCHIVE_DIR: rotating Parquet history of every event (see latency_archive.py)
+archive = archive_from_env()
+if archive is not None:
+    register_sink(archive)
+
+
+# --- Sampling ---
+# LATENCY_MONITORING=0        -> measure_latency only calls the function (no timing at all)
+# LATENCY_SAMPLE_RATE=0.1     -> head-based sampling: 10% of calls are recorded (default 1.0)
+# LATENCY_SAMPLE_RATES="Op A=0.01;Op B=1" -> per-operation rates (win over the decorator's sample_rate)
+# LATENCY_SLOW_MS=1000        -> calls slower than this are always recorded, as are errors
+# Sampled calls are recorded with weight 1/rate, so counts, error rates and
+# percentiles stay unbiased estimates of every call.
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        print(f"[WARN] Valor inválido para {name}: '{os.environ.get(name)}'. Usando {default}.")
+        return default
+
+def _parse_rates(raw: str) -> Dict[str, float]:
+    rates = {}
+    for item in raw.split(";"):
+        if "=" in item:
+            operation, rate = item.rsplit("=", 1)
+            try:
+                rates[operation.strip()] = min(1.0, max(0.0, float(rate)))
+            except ValueError:
+                print(f"[WARN] Tasa de muestreo inválida para '{operation.strip()}': '{rate}'")
+    return rates
+
+class _SamplingConfig:
+    __slots__ = ("enabled", "default_rate", "rates", "slow_ns")
+
+    def __init__(self, enabled: bool, default_rate: float, rates: Dict[str, float], slow_ms: float):
+        self.enabled = enabled
+        self.default_rate = min(1.0, max(0.0, default_rate))
+        self.rates = rates
+        self.slow_ns = int(slow_ms * 1e6)
+
+    @classmethod
+    def from_env(cls) -> "_SamplingConfig":
+        return cls(
+            enabled=os.environ.get("LATENCY_MONITORING", "1").lower() not in ("0", "false", "no", "off"),
+            default_rate=_env_float("LATENCY_SAMPLE_RATE", 1.0),
+            rates=_parse_rates(os.environ.get("LATENCY_SAMPLE_RATES", "")),
+            slow_ms=_env_float("LATENCY_SLOW_MS", 1000.0),
+        )
+
+# Replaced as a whole (never mutated), so wrappers read it without locking
+_sampling = _SamplingConfig.from_env()
+
+# Bound once: module-level lookups are cheaper than attribute lookups on the hot path
+_random = random.random
+perf_counter_ns = time.perf_counter_ns
 
-def measure_latency(source: str, destination: str, operation_name: Optional[str] = None):
+def configure_latency_sampling(
+    enabled: Optional[bool] = None,
+    sample_rate: Optional[float] = None,
+    operation_rates: Optional[Dict[str, float]] = None,
+    slow_ms: Optional[float] = None
+) -> None:
+    """Overrides the sampling settings at runtime (arguments left as None keep their value)."""
+    global _sampling
+    current = _sampling
+    _sampling = _SamplingConfig(
+        enabled=current.enabled if enabled is None else enabled,
+        default_rate=current.default_rate if sample_rate is None else sample_rate,
+        rates=current.rates if operation_rates is None else {op: min(1.0, max(0.0, r)) for op, r in operation_rates.items()},
+        slow_ms=current.slow_ns / 1e6 if slow_ms is None else slow_ms,
+    )
+
+# Most instrumented functions catch their own exceptions (print + return a
+# default). They report them with record_caught_error(), and the innermost
+# measure_latency call in progress picks the error up and records the call
+# as failed (errors are always captured, sampled or not).
+_caught_error: contextvars.ContextVar[Optional[BaseException]] = contextvars.ContextVar("latency_caught_error", default=None)
+_get_caught_error = _caught_error.get
+
+def record_caught_error(error: BaseException) -> None:
+    """Marks the measure_latency call in progress as failed with an error the function handled itself."""
+    if _sampling.enabled:
+        _caught_error.set(error)
+
+def _take_caught_error() -> Optional[BaseException]:
+    error = _get_caught_error()
+    if error is not None:
+        _caught_error.set(None)
+    return error
+
+def measure_latency(source: str, destination: str, operation_name: Optional[str] = None, sample_rate: Optional[float] = None):
     """
     Decorator to measure the execution time of a function.
-    
+    Each recorded call is also a tracing span (src/utils/tracing.py).
+
+    Calls are sampled head-based (see LATENCY_SAMPLE_RATE): an unsampled call
+    is only timed, and still recorded if it fails (raises, or reports a handled
+    error with record_caught_error) or exceeds LATENCY_SLOW_MS.
+    With LATENCY_MONITORING=0 the wrapper just calls the function.
+    Coroutine functions get an async wrapper that times the awaited call.
+
     Args:
         source (str): The origin of the request (e.g., 'App').
         destination (str): The target system (e.g., 'Supabase', 'RUC API').
         operation_name (str, optional): Custom name for the operation. Defaults to function name.
+        sample_rate (float, optional): Fraction of calls recorded for this operation (default LATENCY_SAMPLE_RATE).
     """
     def decorator(func):
+        op_name = operation_name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            # Same flow as `wrapper` below, awaiting the coroutine inside the timing
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                config = _sampling
+                if not config.enabled:
+                    return await func(*args, **kwargs)
+                rate = config.rates.get(op_name, config.default_rate if sample_rate is None else sample_rate)
+                if rate >= 1.0 or _random() < rate:
+                    with span(op_name, source=source, destination=destination) as timed:
+                        try:
+                            result = await func(*args, **kwargs)
+                        except Exception as e:
+                            _take_caught_error()
+                            _log_measured(timed, source, destination, op_name, str(e), rate, config.slow_ns)
+                            raise e
+                        _log_measured(timed, source, destination, op_name, None, rate, config.slow_ns)
+                        return result
+
+                start_ns = perf_counter_ns()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    _take_caught_error()
+                    _record_unsampled(source, destination, op_name, start_ns, "ERROR", str(e))
+                    raise e
+                _finish_unsampled(source, destination, op_name, start_ns, config.slow_ns)
+                return result
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            op_name = operation_name or func.__name__
-            start_time = time.time()
-            status = "OK"
-            details = ""
+            config = _sampling
+            if not config.enabled:
+                return func(*args, **kwargs)
+            rate = config.rates.get(op_name, config.default_rate if sample_rate is None else sample_rate)
+            if rate >= 1.0 or _random() < rate:
+                return _measured_call(func, args, kwargs, source, destination, op_name, rate, config.slow_ns)
+
+            # Not sampled: time only; errors and slow calls are still recorded
+            start_ns = perf_counter_ns()
             try:
                 result = func(*args, **kwargs)
-                return result
             except Exception as e:
-                status = "ERROR"
-                details = str(e)
+                _take_caught_error()
+                _record_unsampled(source, destination, op_name, start_ns, "ERROR", str(e))
                 raise e
-            finally:
-                end_time = time.time()
-                duration_ms = (end_time - start_time) * 1000
-                monitor.log_event(
-                    source=source,
-                    destination=destination,
-                    operation=op_name,
-                    duration_ms=duration_ms,
-                    status=status,
-                    details=details
-                )
+            _finish_unsampled(source, destination, op_name, start_ns, config.slow_ns)
+            return result
         return wrapper
     return decorator
+
+def _measured_call(func, args, kwargs, source: str, destination: str, op_name: str, rate: float, slow_ns: int):
+    # The span nests this call under the caller's span in the rerun waterfall
+    with span(op_name, source=source, destination=destination) as timed:
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            _take_caught_error()
+            _log_measured(timed, source, destination, op_name, str(e), rate, slow_ns)
+            raise e
+        _log_measured(timed, source, destination, op_name, None, rate, slow_ns)
+        return result
+
+def _log_measured(timed, source: str, destination: str, op_name: str, raised: Optional[str], rate: float, slow_ns: int) -> None:
+    """Records a sampled call; `raised` is the message of the exception it raised, if any."""
+    status = "OK"
+    details = ""
+    if raised is not None:
+        status = "ERROR"
+        details = raised
+    else:
+        caught = _take_caught_error()
+        if caught is not None:
+            status = "ERROR"
+            details = str(caught)
+            timed.status = "ERROR"
+            timed.attributes["error"] = details
+    duration_ms = timed.duration_ms
+    # Errors and slow calls are recorded whether sampled or not, so they weigh 1
+    always_kept = status != "OK" or duration_ms * 1e6 > slow_ns
+    monitor.log_event(
+        source=source,
+        destination=destination,
+        operation=op_name,
+        duration_ms=duration_ms,
+        status=status,
+        details=details,
+        weight=1.0 if always_kept or rate <= 0 else 1.0 / rate
+    )
+
+def _finish_unsampled(source: str, destination: str, op_name: str, start_ns: int, slow_ns: int) -> None:
+    # An unsampled call that returned is recorded only if it reported an error or was slow
+    if _get_caught_error() is not None:
+        _record_unsampled(source, destination, op_name, start_ns, "ERROR", str(_take_caught_error()))
+    elif perf_counter_ns() - start_ns > slow_ns:
+        _record_unsampled(source, destination, op_name, start_ns, "OK", "")
+
+def _record_unsampled(source: str, destination: str, op_name: str, start_ns: int, status: str, details: str) -> None:
+    end_ns = perf_counter_ns()
+    record_span(op_name, start_ns, end_ns, status=status, source=source, destination=destination)
+    monitor.log_event(
+        source=source,
+        destination=destination,
+        operation=op_name,
+        duration_ms=(end_ns - start_ns) / 1e6,
+        status=status,
+        details=details
+    )
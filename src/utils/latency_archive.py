@@ -0,0 +1,307 @@
+import atexit
+import datetime as dt
+import glob
+import os
+import re
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+# --- Latency event archive ---
+# With LATENCY_ARCHIVE_DIR set, every latency event (see LatencyMonitor sinks
+# in src/utils/latency.py) is buffered and appended in batches to compressed
+# Parquet files, so weeks of history survive sessions and clear_logs() without
+# being held in memory. Files rotate every LATENCY_ARCHIVE_ROTATE_MINUTES
+# (default 60) or LATENCY_ARCHIVE_ROTATE_MB (default 64) and are deleted after
+# LATENCY_ARCHIVE_RETENTION_DAYS (default 30). load_latency_events() reads a
+# time range back as a DataFrame.
+#
+# A file is written as '<name>.parquet.inprogress' and renamed when it is
+# closed, so readers only ever see complete files; its name records the
+# time range it covers: latency_<first event>_<last event>_<pid>.parquet
+
+_COLUMNS = ("timestamp", "source", "destination", "operation", "duration_ms", "status", "details", "weight")
+_TIME_FORMAT = "%Y%m%dT%H%M%S"
+_FILE_PATTERN = re.compile(r"^latency_(\d{8}T\d{6})_(\d{8}T\d{6})_\d+(?:_\d+)?\.parquet$")
+_IN_PROGRESS_SUFFIX = ".inprogress"
+
+Event = Tuple[float, str, str, str, float, str, str, float]
+
+
+def _schema():
+    import pyarrow as pa
+    return pa.schema([
+        pa.field("timestamp", pa.timestamp("us", tz="UTC")),
+        pa.field("source", pa.string()),
+        pa.field("destination", pa.string()),
+        pa.field("operation", pa.string()),
+        pa.field("duration_ms", pa.float64()),
+        pa.field("status", pa.string()),
+        pa.field("details", pa.string()),
+        pa.field("weight", pa.float64()),
+    ])
+
+
+class LatencyArchive:
+    """
+    LatencyMonitor sink that appends events to rotating zstd-compressed Parquet files.
+
+    Events are buffered in memory and written as one row group per flush
+    (every `flush_interval` seconds, or sooner once `batch_size` are waiting)
+    by a daemon thread. The open file is closed and renamed at rotation and at
+    interpreter exit; a crash loses at most the open file.
+
+    Example:
+        archive = LatencyArchive('/var/lib/crm/latency')
+        register_sink(archive)
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        batch_size: int = 1000,
+        flush_interval: float = 30.0,
+        rotate_seconds: float = 3600.0,
+        rotate_bytes: int = 64 * 1024 * 1024,
+        retention_days: float = 30.0,
+        compression: str = "zstd"
+    ):
+        import pyarrow.parquet  # noqa: F401  (fail at construction, not in the writer thread)
+
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rotate_seconds = rotate_seconds
+        self.rotate_bytes = rotate_bytes
+        self.retention_days = retention_days
+        self.compression = compression
+        os.makedirs(directory, exist_ok=True)
+
+        self._buffer: List[Event] = []
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()       # One flush at a time (thread, flush(), close())
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._writer = None
+        self._path: Optional[str] = None
+        self._opened_at = 0.0
+        self._first_ts: Optional[float] = None
+        self._last_ts: Optional[float] = None
+        self._sequence = 0
+        self._retention_checked_at = 0.0
+        self.written = 0
+        self.last_error: Optional[str] = None
+        atexit.register(self.close)
+        self.apply_retention()
+        self._retention_checked_at = time.time()
+
+    # --- Sink ---
+
+    def __call__(self, timestamp: float, source: str, destination: str, operation: str, duration_ms: float, status: str, details: str, weight: float = 1.0) -> None:
+        """Buffers one event; never blocks on disk."""
+        with self._condition:
+            if self._stopping:
+                return
+            self._buffer.append((timestamp, source, destination, operation, duration_ms, status, details, weight))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="latency-archive", daemon=True)
+                self._thread.start()
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+
+    # --- Public API ---
+
+    def flush(self, rotate: bool = False) -> None:
+        """Writes buffered events now; with `rotate`, also closes the current file so it becomes readable."""
+        with self._condition:
+            events, self._buffer = self._buffer, []
+        with self._write_lock:
+            self._write(events)
+            if rotate:
+                self._close_file()
+
+    def close(self) -> None:
+        """Flushes and closes the current file (registered with atexit)."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self.flush(rotate=True)
+
+    def apply_retention(self) -> int:
+        """Deletes archive files older than `retention_days`; returns how many were removed."""
+        cutoff = time.time() - self.retention_days * 86400
+        removed = 0
+        for path in glob.glob(os.path.join(self.directory, "latency_*.parquet*")):
+            if path == self._path:
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass  # Removed concurrently by another process
+        return removed
+
+    # --- Writer thread ---
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._stopping and len(self._buffer) < self.batch_size:
+                    self._condition.wait(self._wait_timeout())
+                if self._stopping:
+                    return  # close() writes what is left
+                events, self._buffer = self._buffer, []
+            try:
+                with self._write_lock:
+                    self._write(events)
+                    self._maintain()
+                self.last_error = None
+            except Exception as e:
+                # Instrumentation must never break the app; the batch is dropped
+                self.last_error = str(e)
+                print(f"[ERROR en LatencyArchive]: {e}")
+
+    def _wait_timeout(self) -> float:
+        # Wake up when the open file is due for rotation, even if no event arrives
+        if self._writer is None:
+            return self.flush_interval
+        return max(0.0, min(self.flush_interval, self._opened_at + self.rotate_seconds - time.time()))
+
+    def _maintain(self) -> None:
+        # Runs on every wake-up, with or without new events: an idle process
+        # still closes its file on time and deletes expired ones
+        now = time.time()
+        if self._writer is not None and now - self._opened_at >= self.rotate_seconds:
+            self._close_file()
+        if now - self._retention_checked_at >= self.flush_interval:
+            self._retention_checked_at = now
+            self.apply_retention()
+
+    def _write(self, events: Sequence[Event]) -> None:
+        if not events:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = list(zip(*events))
+        table = pa.Table.from_arrays([
+            pa.array([int(ts * 1_000_000) for ts in columns[0]], type=pa.timestamp("us", tz="UTC")),
+            *(pa.array(values, type=pa.string()) for values in columns[1:4]),
+            pa.array(columns[4], type=pa.float64()),
+            pa.array(columns[5], type=pa.string()),
+            pa.array([str(details) for details in columns[6]], type=pa.string()),
+            pa.array(columns[7], type=pa.float64()),
+        ], schema=_schema())
+
+        if self._writer is None:
+            self._sequence += 1
+            self._path = os.path.join(self.directory, f"latency_open_{os.getpid()}_{self._sequence}.parquet{_IN_PROGRESS_SUFFIX}")
+            self._writer = pq.ParquetWriter(self._path, _schema(), compression=self.compression)
+            self._opened_at = time.time()
+            self._first_ts = None
+        self._writer.write_table(table)
+        self.written += len(events)
+        first, last = min(columns[0]), max(columns[0])
+        self._first_ts = first if self._first_ts is None else min(self._first_ts, first)
+        self._last_ts = last if self._last_ts is None else max(self._last_ts, last)
+
+        if os.path.getsize(self._path) >= self.rotate_bytes:
+            self._close_file()
+
+    def _close_file(self) -> None:
+        if self._writer is None:
+            return
+        self._writer.close()
+        start = dt.datetime.fromtimestamp(self._first_ts, dt.timezone.utc).strftime(_TIME_FORMAT)
+        # Rounded up so the name's range always contains every event of the file
+        end = dt.datetime.fromtimestamp(int(self._last_ts) + 1, dt.timezone.utc).strftime(_TIME_FORMAT)
+        final = os.path.join(self.directory, f"latency_{start}_{end}_{os.getpid()}_{self._sequence}.parquet")
+        os.replace(self._path, final)
+        self._writer = None
+        self._path = None
+
+
+def _as_utc(value: dt.datetime) -> dt.datetime:
+    return value.replace(tzinfo=dt.timezone.utc) if value.tzinfo is None else value.astimezone(dt.timezone.utc)
+
+def load_latency_events(
+    start: dt.datetime,
+    end: dt.datetime,
+    directory: Optional[str] = None,
+    operations: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Reads archived latency events with start <= timestamp < end (naive datetimes are UTC).
+
+    Only files whose name range overlaps the interval are opened, and the
+    time/operation filters are pushed down to the Parquet reader. Events still
+    buffered or in the open file are not included (see LatencyArchive.flush(rotate=True)).
+
+    Args:
+        start, end: Time range
+        directory: Archive directory (default LATENCY_ARCHIVE_DIR)
+        operations: Keep only these operation names
+
+    Returns:
+        DataFrame with columns timestamp (UTC), source, destination, operation,
+        duration_ms, status, details, weight; sorted by timestamp.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    directory = directory or os.environ.get("LATENCY_ARCHIVE_DIR")
+    if not directory:
+        raise ValueError("Falta el directorio del archivo de latencias (LATENCY_ARCHIVE_DIR).")
+    start, end = _as_utc(start), _as_utc(end)
+
+    paths = []
+    for path in sorted(glob.glob(os.path.join(directory, "latency_*.parquet"))):
+        match = _FILE_PATTERN.match(os.path.basename(path))
+        if not match:
+            continue
+        file_start = dt.datetime.strptime(match.group(1), _TIME_FORMAT).replace(tzinfo=dt.timezone.utc)
+        file_end = dt.datetime.strptime(match.group(2), _TIME_FORMAT).replace(tzinfo=dt.timezone.utc)
+        if file_start < end and file_end >= start:
+            paths.append(path)
+
+    if not paths:
+        return pd.DataFrame(columns=list(_COLUMNS))
+
+    filters = [("timestamp", ">=", pa.scalar(start, type=pa.timestamp("us", tz="UTC"))),
+               ("timestamp", "<", pa.scalar(end, type=pa.timestamp("us", tz="UTC")))]
+    if operations:
+        filters.append(("operation", "in", list(operations)))
+    tables = [pq.read_table(path, filters=filters) for path in paths]
+    df = pa.concat_tables(tables).to_pandas()
+    return df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+
+
+def archive_from_env() -> Optional[LatencyArchive]:
+    """Builds the archive configured through LATENCY_ARCHIVE_* (None when disabled or pyarrow is missing)."""
+    directory = os.environ.get("LATENCY_ARCHIVE_DIR")
+    if not directory:
+        return None
+
+    def setting(name: str, default: float) -> float:
+        try:
+            return float(os.environ.get(name, default))
+        except ValueError:
+            print(f"[WARN] Valor inválido para {name}: '{os.environ.get(name)}'. Usando {default}.")
+            return default
+
+    try:
+        return LatencyArchive(
+            directory,
+            flush_interval=setting("LATENCY_ARCHIVE_FLUSH_SECONDS", 30.0),
+            rotate_seconds=setting("LATENCY_ARCHIVE_ROTATE_MINUTES", 60.0) * 60,
+            rotate_bytes=int(setting("LATENCY_ARCHIVE_ROTATE_MB", 64.0) * 1024 * 1024),
+            retention_days=setting("LATENCY_ARCHIVE_RETENTION_DAYS", 30.0),
+        )
+    except ImportError:
+        print("[WARN] LATENCY_ARCHIVE_DIR requiere pyarrow (pip install pyarrow); archivo de latencias desactivado.")
+    except OSError as e:
+        print(f"[WARN] No se pudo usar LATENCY_ARCHIVE_DIR='{directory}': {e}")
+    return None
@@ -0,0 +1,209 @@
+import http.server
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# --- Process-wide latency metrics ---
+# LatencyMonitor (src/utils/latency.py) keeps per-session views; every event
+# is also forwarded here, to one aggregator shared by all sessions of the
+# server process. It is exported in the Prometheus text format:
+#   LATENCY_METRICS_PORT=9464        -> GET http://host:9464/metrics
+#   LATENCY_METRICS_FILE=/path.prom  -> rewritten every LATENCY_METRICS_FLUSH_SECONDS (default 15)
+#                                       (node_exporter textfile collector format)
+
+METRIC_NAME = "crm_operation_latency_seconds"
+# Upper bounds (seconds) of the cumulative histogram buckets
+BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_LabelKey = Tuple[str, str, str, str]  # (source, destination, operation, status)
+
+
+class _Series:
+    __slots__ = ("bucket_counts", "count", "sum_seconds")
+
+    def __init__(self):
+        # Weighted counts (sampled calls stand for 1/rate calls); last bucket is +Inf
+        self.bucket_counts = [0.0] * (len(BUCKETS_SECONDS) + 1)
+        self.count = 0.0
+        self.sum_seconds = 0.0
+
+
+class ProcessLatencyAggregator:
+    """Thread-safe latency histograms per (source, destination, operation, status) for the whole process."""
+
+    def __init__(self):
+        self._series: Dict[_LabelKey, _Series] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def record(self, source: str, destination: str, operation: str, duration_ms: float, status: str, weight: float = 1.0) -> None:
+        seconds = duration_ms / 1000
+        index = next((i for i, bound in enumerate(BUCKETS_SECONDS) if seconds <= bound), len(BUCKETS_SECONDS))
+        key = (source, destination, operation, status)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series()
+            series.bucket_counts[index] += weight
+            series.count += weight
+            series.sum_seconds += seconds * weight
+
+    def __call__(self, timestamp: float, source: str, destination: str, operation: str, duration_ms: float, status: str, details: str, weight: float = 1.0) -> None:
+        """LatencyMonitor sink signature."""
+        self.record(source, destination, operation, duration_ms, status, weight)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Per label set: count, mean and bucket-interpolated p50/p95/p99 (ms)."""
+        with self._lock:
+            items = [(key, list(s.bucket_counts), s.count, s.sum_seconds) for key, s in sorted(self._series.items())]
+        return [
+            {
+                "source": source, "destination": destination, "operation": operation, "status": status,
+                "count": round(count),
+                "mean_ms": round(sum_seconds / count * 1000, 2) if count else 0.0,
+                **{f"p{q}_ms": round(_bucket_quantile(buckets, count, q / 100) * 1000, 2) for q in (50, 95, 99)},
+            }
+            for (source, destination, operation, status), buckets, count, sum_seconds in items
+        ]
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            items = [(key, list(s.bucket_counts), s.count, s.sum_seconds) for key, s in sorted(self._series.items())]
+        lines = [
+            f"# HELP {METRIC_NAME} Latency of instrumented operations (measure_latency).",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        for (source, destination, operation, status), buckets, count, sum_seconds in items:
+            labels = f'source="{_escape(source)}",destination="{_escape(destination)}",operation="{_escape(operation)}",status="{_escape(status)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS_SECONDS, buckets):
+                cumulative += bucket_count
+                lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {_number(cumulative)}')
+            lines.append(f'{METRIC_NAME}_bucket{{{labels},le="+Inf"}} {_number(count)}')
+            lines.append(f"{METRIC_NAME}_sum{{{labels}}} {_number(sum_seconds)}")
+            lines.append(f"{METRIC_NAME}_count{{{labels}}} {_number(count)}")
+        lines.append("# HELP crm_process_start_time_seconds Start time of the aggregator (unix seconds).")
+        lines.append("# TYPE crm_process_start_time_seconds gauge")
+        lines.append(f"crm_process_start_time_seconds {self.started_at:.3f}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value: float) -> str:
+    """Full-precision sample value ('{:g}' keeps 6 digits: 1234567 -> 1.23457e+06, breaking rate())."""
+    return repr(float(value))
+
+def _bucket_quantile(buckets: List[float], count: float, q: float) -> float:
+    """Linear interpolation inside the bucket holding the rank (like PromQL histogram_quantile)."""
+    if not count:
+        return 0.0
+    rank = q * count
+    seen = 0
+    for i, bucket_count in enumerate(buckets):
+        if seen + bucket_count >= rank and bucket_count:
+            if i == len(BUCKETS_SECONDS):
+                return BUCKETS_SECONDS[-1]  # +Inf bucket: highest finite bound
+            lower = BUCKETS_SECONDS[i - 1] if i else 0.0
+            return lower + (BUCKETS_SECONDS[i] - lower) * (rank - seen) / bucket_count
+        seen += bucket_count
+    return BUCKETS_SECONDS[-1]
+
+
+# Shared by every session of the process
+process_metrics = ProcessLatencyAggregator()
+
+
+# --- Exporters ---
+
+_exporters_lock = threading.Lock()
+_metrics_server: Optional[http.server.ThreadingHTTPServer] = None
+_flush_thread: Optional[threading.Thread] = None
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = process_metrics.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the server log
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> bool:
+    """Serves /metrics on a daemon thread (once per process). Returns False if the port is unavailable."""
+    global _metrics_server
+    with _exporters_lock:
+        if _metrics_server is not None:
+            return True
+        try:
+            server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            print(f"[WARN] No se pudo abrir el endpoint de métricas en el puerto {port}: {e}")
+            return False
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="latency-metrics-server", daemon=True).start()
+        _metrics_server = server
+        print(f"Métricas de latencia en http://{host}:{port}/metrics")
+        return True
+
+def write_metrics_file(path: str) -> None:
+    """Writes the current metrics atomically (readers never see a partial file)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, tmp_path = tempfile.mkstemp(prefix=".latency_metrics_", dir=directory)
+    try:
+        with os.fdopen(handle, "w", encoding="utf-8") as tmp:
+            tmp.write(process_metrics.render_prometheus())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def start_metrics_file_flush(path: str, interval_seconds: float = 15.0) -> None:
+    """Rewrites `path` every `interval_seconds` on a daemon thread (once per process)."""
+    global _flush_thread
+
+    def loop():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                write_metrics_file(path)
+            except Exception as e:
+                print(f"[ERROR en write_metrics_file]: {e}")
+
+    with _exporters_lock:
+        if _flush_thread is None:
+            _flush_thread = threading.Thread(target=loop, name="latency-metrics-flush", daemon=True)
+            _flush_thread.start()
+
+def start_exporters_from_env() -> None:
+    """Starts the exporters configured through LATENCY_METRICS_PORT / LATENCY_METRICS_FILE."""
+    port = os.environ.get("LATENCY_METRICS_PORT")
+    if port:
+        try:
+            start_metrics_server(int(port))
+        except ValueError:
+            print(f"[WARN] LATENCY_METRICS_PORT inválido: '{port}'")
+    path = os.environ.get("LATENCY_METRICS_FILE")
+    if path:
+        try:
+            interval = float(os.environ.get("LATENCY_METRICS_FLUSH_SECONDS", 15))
+        except ValueError:
+            interval = 15.0
+        start_metrics_file_flush(path, interval)
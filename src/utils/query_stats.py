@@ -0,0 +1,222 @@
+import contextvars
+import threading
+import time
+import weakref
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from src.utils.tracing import record_span
+
+# --- Per-rerun Supabase query statistics ---
+# Every HTTP round trip made by the Supabase clients is recorded (see the
+# httpx event hooks below, installed by src/data/supabase_client.py) on the
+# QueryStats of the current Streamlit script run. render_header() starts a
+# new one per rerun, so the counters describe a single execution of a page.
+
+_SESSION_KEY = "query_stats_current"
+_LAST_SESSION_KEY = "query_stats_last"
+
+# Same table + same filter column queried with this many distinct values -> N+1
+N_PLUS_ONE_THRESHOLD = 3
+# Identical request (method + URL) repeated this many times -> missing cache
+DUPLICATE_THRESHOLD = 2
+
+# Distinct requests / filter values remembered per QueryStats (the process-wide
+# instance lives as long as the server)
+_MAX_TRACKED = 5000
+
+# PostgREST query parameters that are not row filters
+_NON_FILTER_PARAMS = frozenset({'select', 'order', 'limit', 'offset', 'on_conflict', 'columns'})
+
+# Explicit binding, used where there is no Streamlit context (e.g. the async loop thread)
+_bound_stats: contextvars.ContextVar[Optional["QueryStats"]] = contextvars.ContextVar('query_stats', default=None)
+
+
+class QueryStats:
+    """Round trips, bytes, time and access patterns of one script run."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.round_trips = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.duration_ms = 0.0
+        self.tables: Dict[str, Dict[str, float]] = {}      # resource -> {'calls', 'bytes', 'ms'}
+        self._eq_values: Dict[Tuple[str, str, str], Set[str]] = {}  # (method, resource, column) -> values
+        self._requests: Counter = Counter()                 # (method, url) -> count
+        self._reported: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def record(self, method: str, url: httpx.URL, status_code: int, bytes_sent: int, bytes_received: int, duration_ms: float) -> None:
+        resource = _resource_name(url)
+        findings = []
+        with self._lock:
+            self.round_trips += 1
+            self.errors += status_code >= 400
+            self.bytes_sent += bytes_sent
+            self.bytes_received += bytes_received
+            self.duration_ms += duration_ms
+
+            table = self.tables.setdefault(resource, {'calls': 0, 'bytes': 0, 'ms': 0.0})
+            table['calls'] += 1
+            table['bytes'] += bytes_sent + bytes_received
+            table['ms'] += duration_ms
+
+            for column, value in url.params.multi_items():
+                if column not in _NON_FILTER_PARAMS and value.startswith('eq.'):
+                    values = self._eq_values.setdefault((method, resource, column), set())
+                    if len(values) < _MAX_TRACKED:
+                        values.add(value[3:])
+
+            request_key = (method, str(url))
+            if request_key in self._requests or len(self._requests) < _MAX_TRACKED:
+                self._requests[request_key] += 1
+            for key, finding in self._findings_locked():
+                if key not in self._reported:  # Print each pattern once per run
+                    self._reported.add(key)
+                    findings.append(finding)
+        for finding in findings:
+            print(f"[QUERY STATS] {finding}")
+
+    def _findings_locked(self) -> List[Tuple[Any, str]]:
+        findings = []
+        for (method, resource, column), values in self._eq_values.items():
+            if len(values) >= N_PLUS_ONE_THRESHOLD:
+                findings.append(((method, resource, column), (
+                    f"Posible N+1: {method} {resource} consultado con {len(values)} valores distintos de "
+                    f"'{column}' en una misma ejecución; agrupar con in_()."
+                )))
+        for (method, url), count in self._requests.items():
+            if count >= DUPLICATE_THRESHOLD:
+                findings.append(((method, url), f"Consulta repetida: {method} {_short_url(url)} ejecutada {count} veces; reutilizar el resultado."))
+        return findings
+
+    def findings(self) -> List[str]:
+        """Detected chatty patterns (N+1 lookups, repeated identical requests)."""
+        with self._lock:
+            return [finding for _, finding in self._findings_locked()]
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals plus a per-table breakdown sorted by number of calls."""
+        with self._lock:
+            tables = sorted(
+                ({'recurso': name, 'llamadas': int(t['calls']), 'kb': round(t['bytes'] / 1024, 1), 'ms': round(t['ms'], 1)}
+                 for name, t in self.tables.items()),
+                key=lambda row: -row['llamadas']
+            )
+            return {
+                'round_trips': self.round_trips,
+                'errors': self.errors,
+                'kb_sent': round(self.bytes_sent / 1024, 1),
+                'kb_received': round(self.bytes_received / 1024, 1),
+                'db_time_ms': round(self.duration_ms, 1),
+                'tables': tables,
+                'findings': [finding for _, finding in self._findings_locked()],
+            }
+
+
+# Used outside Streamlit (CLI scripts, background threads without a binding)
+_process_stats = QueryStats()
+
+
+def _script_run_ctx() -> Any:
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        return get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        return None
+
+def current_query_stats() -> QueryStats:
+    """QueryStats of the running script (or of the process when outside Streamlit)."""
+    stats = _bound_stats.get()
+    if stats is not None:
+        return stats
+    if _script_run_ctx() is not None:
+        import streamlit as st
+        stats = st.session_state.get(_SESSION_KEY)
+        if stats is None:
+            stats = st.session_state[_SESSION_KEY] = QueryStats()
+        return stats
+    return _process_stats
+
+def bind_query_stats(stats: QueryStats) -> contextvars.Token:
+    """Makes `stats` current in this context (e.g. inside the async repository loop)."""
+    return _bound_stats.set(stats)
+
+def start_rerun() -> None:
+    """Archives the previous run's stats as 'last' and starts fresh counters (called by render_header)."""
+    if _script_run_ctx() is None:
+        return
+    import streamlit as st
+    previous = st.session_state.get(_SESSION_KEY)
+    if previous is not None and previous.round_trips:
+        st.session_state[_LAST_SESSION_KEY] = previous
+    st.session_state[_SESSION_KEY] = QueryStats()
+
+def last_rerun_stats() -> Optional[QueryStats]:
+    """Stats of the previous complete run of this session, if any."""
+    if _script_run_ctx() is None:
+        return None
+    import streamlit as st
+    return st.session_state.get(_LAST_SESSION_KEY)
+
+
+# --- httpx event hooks ---
+
+def _resource_name(url: httpx.URL) -> str:
+    path = url.path
+    for prefix in ('/rest/v1/', '/storage/v1/', '/auth/v1/', '/functions/v1/'):
+        if path.startswith(prefix):
+            rest = path[len(prefix):]
+            if prefix == '/rest/v1/':
+                return rest  # 'table' or 'rpc/function'
+            return f"{prefix.strip('/').split('/')[0]}:{rest.split('/')[0]}"
+    return path
+
+def _short_url(url: str, limit: int = 120) -> str:
+    tail = url.split('/rest/v1/', 1)[-1]
+    return tail if len(tail) <= limit else tail[:limit] + '…'
+
+# Request -> perf_counter_ns() when it was sent (entries vanish with the request)
+_request_started: "weakref.WeakKeyDictionary[httpx.Request, int]" = weakref.WeakKeyDictionary()
+
+def _record(response: httpx.Response) -> None:
+    request = response.request
+    started = _request_started.pop(request, None)
+    finished = time.perf_counter_ns()
+    try:
+        current_query_stats().record(
+            method=request.method,
+            url=request.url,
+            status_code=response.status_code,
+            bytes_sent=len(request.content or b''),
+            bytes_received=response.num_bytes_downloaded,
+            duration_ms=(finished - started) / 1e6 if started is not None else 0.0,
+        )
+        if started is not None:
+            record_span(f"{request.method} {_resource_name(request.url)}", started, finished,
+                        status="ERROR" if response.status_code >= 400 else "OK", status_code=response.status_code)
+    except Exception as e:
+        # Instrumentation must never break a query
+        print(f"[ERROR en query_stats]: {e}")
+
+def httpx_request_hook(request: httpx.Request) -> None:
+    """Request hook for the sync httpx client."""
+    _request_started[request] = time.perf_counter_ns()
+
+async def async_httpx_request_hook(request: httpx.Request) -> None:
+    """Request hook for the async httpx client."""
+    _request_started[request] = time.perf_counter_ns()
+
+def httpx_response_hook(response: httpx.Response) -> None:
+    """Response hook for the sync httpx client."""
+    response.read()
+    _record(response)
+
+async def async_httpx_response_hook(response: httpx.Response) -> None:
+    """Response hook for the async httpx client."""
+    await response.aread()
+    _record(response)
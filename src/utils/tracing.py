@@ -0,0 +1,221 @@
+import contextvars
+import functools
+import inspect
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# --- Nested tracing spans ---
+# A span times one unit of work with perf_counter_ns and records its parent
+# (the span open in the same context when it started), so a rerun can be
+# shown as a waterfall: "Save Proposal" -> emisor lookup -> GET EMISORES...
+#
+#   with span("Calcular cronograma", proposal_id=pid):
+#       ...
+#
+#   @span("Cargar ledgers")
+#   def load(...): ...        # also works on async functions
+#
+# Parent/child links travel in contextvars, so they follow asyncio tasks.
+# measure_latency opens a span per decorated call, and every Supabase round
+# trip is recorded as a child span (src/utils/query_stats.py). Spans land in
+# the Trace of the current Streamlit script run; render_header() starts a
+# new one per rerun.
+
+_SESSION_KEY = "trace_current"
+_LAST_SESSION_KEY = "trace_last"
+
+# Spans kept per Trace (later ones are counted but dropped)
+_MAX_SPANS = 2000
+
+_span_ids = itertools.count(1)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+# Explicit binding, used where there is no Streamlit context (e.g. the async loop thread)
+_bound_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+
+
+class Span:
+    """One timed unit of work (times in perf_counter_ns)."""
+
+    __slots__ = ("name", "span_id", "parent_id", "depth", "start_ns", "end_ns", "status", "attributes")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any], start_ns: Optional[int] = None):
+        self.name = name
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.start_ns = time.perf_counter_ns() if start_ns is None else start_ns
+        self.end_ns: Optional[int] = None
+        self.status = "OK"
+        self.attributes = attributes
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.perf_counter_ns()) - self.start_ns) / 1e6
+
+
+class Trace:
+    """Finished spans of one script run."""
+
+    def __init__(self):
+        self.started_ns = time.perf_counter_ns()
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, finished: Span) -> None:
+        with self._lock:
+            if len(self.spans) < _MAX_SPANS:
+                self.spans.append(finished)
+            else:
+                self.dropped += 1
+
+    def waterfall(self) -> List[Dict[str, Any]]:
+        """
+        Spans in tree order (each parent followed by its children by start time),
+        with offset from the first span, total and self time (total minus children).
+        """
+        with self._lock:
+            spans = list(self.spans)
+        if not spans:
+            return []
+        origin = min(s.start_ns for s in spans)
+        children: Dict[Optional[int], List[Span]] = {}
+        known = {s.span_id for s in spans}
+        for s in spans:
+            # Children whose parent was dropped or is still open are shown as roots
+            children.setdefault(s.parent_id if s.parent_id in known else None, []).append(s)
+
+        rows: List[Dict[str, Any]] = []
+
+        def visit(parent_id: Optional[int], depth: int) -> None:
+            for s in sorted(children.get(parent_id, []), key=lambda c: c.start_ns):
+                child_ms = sum(c.duration_ms for c in children.get(s.span_id, []))
+                rows.append({
+                    "span": ("  " * depth) + s.name,
+                    "depth": depth,
+                    "offset_ms": round((s.start_ns - origin) / 1e6, 2),
+                    "duration_ms": round(s.duration_ms, 2),
+                    "self_ms": round(max(0.0, s.duration_ms - child_ms), 2),
+                    "status": s.status,
+                    "attributes": s.attributes,
+                })
+                visit(s.span_id, depth + 1)
+
+        visit(None, 0)
+        return rows
+
+
+# Used outside Streamlit (CLI scripts, background threads without a binding)
+_process_trace = Trace()
+
+
+def _script_run_ctx() -> Any:
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        return get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        return None
+
+def current_trace() -> Trace:
+    """Trace of the running script (or of the process when outside Streamlit)."""
+    trace = _bound_trace.get()
+    if trace is not None:
+        return trace
+    if _script_run_ctx() is not None:
+        import streamlit as st
+        trace = st.session_state.get(_SESSION_KEY)
+        if trace is None:
+            trace = st.session_state[_SESSION_KEY] = Trace()
+        return trace
+    return _process_trace
+
+def current_span() -> Optional[Span]:
+    """Innermost open span of this context, if any."""
+    return _current_span.get()
+
+def bind_trace(trace: Trace, parent: Optional[Span] = None) -> None:
+    """Makes `trace` (and `parent` as the open span) current in this context, e.g. inside the async loop."""
+    _bound_trace.set(trace)
+    _current_span.set(parent)
+
+def start_rerun_trace() -> None:
+    """Archives the previous run's trace as 'last' and starts a new one (called by render_header)."""
+    if _script_run_ctx() is None:
+        return
+    import streamlit as st
+    previous = st.session_state.get(_SESSION_KEY)
+    if previous is not None and previous.spans:
+        st.session_state[_LAST_SESSION_KEY] = previous
+    st.session_state[_SESSION_KEY] = Trace()
+
+def last_rerun_trace() -> Optional[Trace]:
+    """Trace of the previous complete run of this session, if any."""
+    if _script_run_ctx() is None:
+        return None
+    import streamlit as st
+    return st.session_state.get(_LAST_SESSION_KEY)
+
+def record_span(name: str, start_ns: int, end_ns: int, status: str = "OK", **attributes: Any) -> None:
+    """Records an already finished interval as a child of the current span (e.g. an HTTP round trip)."""
+    finished = Span(name, _current_span.get(), attributes, start_ns=start_ns)
+    finished.end_ns = end_ns
+    finished.status = status
+    current_trace().add(finished)
+
+
+class span:
+    """
+    Context manager (sync and async) and decorator that records a Span.
+
+    Args:
+        name: Label shown in the waterfall (defaults to the function name when decorating)
+        **attributes: Extra data kept with the span
+    """
+
+    def __init__(self, name: Optional[str] = None, **attributes: Any):
+        self.name = name
+        self.attributes = attributes
+        self._span: Optional[Span] = None
+        self._token: Optional[contextvars.Token] = None
+        self._trace: Optional[Trace] = None
+
+    def __enter__(self) -> Span:
+        self._trace = current_trace()
+        self._span = Span(self.name or "span", _current_span.get(), dict(self.attributes))
+        self._token = _current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        finished = self._span
+        finished.end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            finished.status = "ERROR"
+            finished.attributes["error"] = str(exc)
+        _current_span.reset(self._token)
+        self._trace.add(finished)
+        return False
+
+    async def __aenter__(self) -> Span:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        return self.__exit__(exc_type, exc, tb)
+
+    def __call__(self, func: Callable) -> Callable:
+        name = self.name or func.__qualname__
+        attributes = self.attributes
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, **attributes):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper